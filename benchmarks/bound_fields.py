@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Measures what a form instance costs when it is only validated, as on the
+POST path of a view, with bound fields made eagerly (as BaseDataForm used
+to in __init__) and lazily (the first time they are asked for).
+
+Usage::
+
+    # From django-dataforms/
+    python benchmarks/bound_fields.py [fields] [repeat]
+
+Fields default to 300.  Memory is the size of every object reachable from
+the form instance that isn't shared with other instances of the same class.
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'bound_fields.db')
+
+from django.conf import settings
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DATABASE}},
+    INSTALLED_APPS=('django.contrib.contenttypes', 'dataforms'),
+    STATIC_URL='/static/',
+)
+
+from django.core.management import call_command
+from django.test.client import RequestFactory
+from dataforms.forms import create_form
+from dataforms.models import DataForm, DataFormField, Field
+
+
+def create_data_form(fields):
+    data_form = DataForm.objects.create(title='Bound Fields', slug='bound')
+    for i in range(fields):
+        field = Field.objects.create(field_type='TextInput', label='Field %s' % i, slug='field-%s' % i, required=False)
+        DataFormField.objects.create(data_form=data_form, field=field, order=i)
+
+
+def instance_size(form):
+    """
+    The bytes held by objects reachable from the form, but not from its class.
+    """
+
+    shared = set()
+    pending = [type(form)]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in shared:
+            continue
+        shared.add(id(obj))
+        pending.extend(gc.get_referents(obj))
+
+    size = 0
+    seen = set()
+    pending = [form]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or id(obj) in shared or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj, 0)
+        pending.extend(gc.get_referents(obj))
+    return size
+
+
+def validate(data, eager):
+    form = create_form(RequestFactory().post('/', data), form='bound')
+    if eager:
+        # What __init__ did before bound fields were lazy
+        for name in form.fields:
+            form[name]
+    form.is_valid()
+    return form
+
+
+def main(argv):
+    fields = int(argv[0]) if argv else 300
+    repeat = int(argv[1]) if len(argv) > 1 else 50
+
+    call_command('syncdb', interactive=False, verbosity=0)
+    create_data_form(fields)
+    data = dict(('bound__field-%s' % i, 'value %s' % i) for i in range(fields))
+
+    print '%d fields, %d runs' % (fields, repeat)
+    print '%-8s %12s %12s' % ('', 'memory', 'time')
+
+    for name, eager in (('eager', True), ('lazy', False)):
+        # Once to warm the schema and form class caches
+        validate(data, eager)
+
+        start = time.time()
+        for i in range(repeat):
+            form = validate(data, eager)
+        elapsed = (time.time() - start) / repeat
+
+        print '%-8s %10.1fKB %10.2fms' % (name, instance_size(form) / 1024.0, elapsed * 1000)
+
+    os.remove(DATABASE)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
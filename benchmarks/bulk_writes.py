@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Compares dataforms.utils.bulk against the old executemany based
+insert_many/update_many/delete_many on SQLite.
+
+Usage::
+
+    # From django-dataforms/
+    python benchmarks/bulk_writes.py [rows ...]
+
+Rows default to 1000 10000 100000.  A throwaway SQLite file is used, so
+commits cost what they would on a real database.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'bulk_writes.db')
+
+from django.conf import settings
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DATABASE}},
+    INSTALLED_APPS=('django.contrib.contenttypes', 'dataforms'),
+    STATIC_URL='/static/',
+)
+
+from django.core.management import call_command
+from django.db import connection, models, transaction
+from dataforms.models import Choice
+from dataforms.utils import bulk, sql
+
+
+def legacy_insert_many(objects, using="default"):
+    # insert_many before dataforms.utils.bulk: one executemany
+    fields = [f for f in objects[0]._meta.fields if not isinstance(f, models.AutoField)]
+    parameters = [tuple(f.get_db_prep_save(f.pre_save(o, True), connection=connection) for f in fields) for o in objects]
+    connection.cursor().executemany(
+        "insert into %s (%s) values (%s)" % (objects[0]._meta.db_table,
+            ",".join(connection.ops.quote_name(f.column) for f in fields), ",".join(("%s",) * len(fields))),
+        parameters)
+    transaction.commit_unless_managed()
+
+
+def legacy_update_many(objects, fields=[], using="default"):
+    meta = objects[0]._meta
+    fields = [f for f in meta.fields if not isinstance(f, models.AutoField) and (not fields or f.name in fields)]
+    parameters = [tuple(f.get_db_prep_save(f.pre_save(o, True), connection=connection) for f in fields + [meta.pk]) for o in objects]
+    connection.cursor().executemany(
+        "update %s set %s where %s=%%s" % (meta.db_table,
+            ",".join("%s=%%s" % connection.ops.quote_name(f.column) for f in fields),
+            connection.ops.quote_name(meta.pk.column)),
+        parameters)
+    transaction.commit_unless_managed()
+
+
+def legacy_delete_many(objects, table=None, using="default"):
+    meta = objects[0]._meta
+    connection.cursor().executemany(
+        "delete from %s where %s=%%s" % (table or meta.db_table, connection.ops.quote_name(meta.pk.column)),
+        [(o.id,) for o in objects])
+    transaction.commit_unless_managed()
+
+
+IMPLEMENTATIONS = (
+    ('executemany', legacy_insert_many, legacy_update_many, legacy_delete_many),
+    ('bulk', sql.insert_many, sql.update_many, sql.delete_many),
+)
+
+
+def timed(func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+
+def run(rows):
+    results = []
+
+    for name, insert, update, delete in IMPLEMENTATIONS:
+        Choice.objects.all().delete()
+        choices = [Choice(title='choice-%s' % i, value='value-%s' % i) for i in range(rows)]
+
+        insert_time = timed(insert, choices)
+
+        choices = list(Choice.objects.all())
+        for choice in choices:
+            choice.value = choice.value.upper()
+        update_time = timed(update, choices, fields=['value'])
+
+        delete_time = timed(delete, choices)
+        assert not Choice.objects.exists()
+
+        results.append((name, insert_time, update_time, delete_time))
+
+    return results
+
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or [1000, 10000, 100000]
+
+    call_command('syncdb', interactive=False, verbosity=0)
+
+    print 'SQLite %s' % '.'.join(map(str, bulk.sqlite_version_info()))
+    print '%8s  %-12s %10s %10s %10s' % ('rows', 'method', 'insert', 'update', 'delete')
+
+    for rows in sizes:
+        for name, insert_time, update_time, delete_time in run(rows):
+            print '%8d  %-12s %9.3fs %9.3fs %9.3fs' % (rows, name, insert_time, update_time, delete_time)
+
+    os.remove(DATABASE)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
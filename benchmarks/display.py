@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Compares dataforms.display against rendering a readonly form from
+create_form, for showing the answers of one submission.
+
+Usage::
+
+    # From django-dataforms/
+    python benchmarks/display.py [fields] [repeat]
+
+Fields default to 100 (a third of them choice fields) and each method is
+run 200 times.  Schemas are cached, as they are in production, so this
+times the per-request work only.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'display.db')
+
+from django.conf import settings
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': DATABASE}},
+    INSTALLED_APPS=('django.contrib.contenttypes', 'dataforms'),
+    STATIC_URL='/static/',
+    MEDIA_URL='/media/',
+)
+
+from django.core.management import call_command
+from django.test.client import RequestFactory
+from dataforms.display import render_display
+from dataforms.forms import create_form
+from dataforms.models import DataForm, DataFormField, Field, FieldChoice, Choice, Submission, Answer, AnswerChoice
+
+
+def create_submission(fields):
+    data_form = DataForm.objects.create(title='Display', slug='display')
+    submission = Submission.objects.create(slug='display-submission')
+    choices = [Choice.objects.create(title='Choice %s' % i, value='choice-%s' % i) for i in range(10)]
+
+    for i in range(fields):
+        field_type = ('TextInput', 'Select', 'Textarea')[i % 3]
+        field = Field.objects.create(field_type=field_type, label='Field %s' % i, slug='field-%s' % i, required=False)
+        DataFormField.objects.create(data_form=data_form, field=field, order=i)
+
+        if field_type == 'Select':
+            for order, choice in enumerate(choices):
+                FieldChoice.objects.create(field=field, choice=choice, order=order)
+            answer = Answer.objects.create(submission=submission, data_form=data_form, field=field, value='')
+            AnswerChoice.objects.create(answer=answer, choice=choices[i % 10])
+        else:
+            Answer.objects.create(submission=submission, data_form=data_form, field=field, value='Answer %s' % i)
+
+
+def readonly_form(request):
+    form = create_form(request, form='display', submission='display-submission', readonly=True)
+    return u''.join(unicode(field) for field in form)
+
+
+def display(request):
+    return render_display('display', 'display-submission')
+
+
+def timed(func, repeat, request):
+    # Once to warm the schema and form class caches
+    func(request)
+
+    start = time.time()
+    for i in range(repeat):
+        func(request)
+    return (time.time() - start) / repeat
+
+
+def main(argv):
+    fields = int(argv[0]) if argv else 100
+    repeat = int(argv[1]) if len(argv) > 1 else 200
+
+    call_command('syncdb', interactive=False, verbosity=0)
+    create_submission(fields)
+    request = RequestFactory().get('/')
+
+    readonly_time = timed(readonly_form, repeat, request)
+    display_time = timed(display, repeat, request)
+
+    print '%d fields, %d runs' % (fields, repeat)
+    print '%-16s %8.2fms' % ('readonly form', readonly_time * 1000)
+    print '%-16s %8.2fms' % ('render_display', display_time * 1000)
+    print '%-16s %8.1fx' % ('speedup', readonly_time / display_time)
+
+    os.remove(DATABASE)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -37,6 +37,22 @@ FILE_UPLOAD_PATH = getattr(settings, "DATAFORMS_FILE_UPLOAD_PATH", "uploads/")
 
 MAX_UPLOAD_SIZE = getattr(settings, "DATAFORMS_MAX_UPLOAD_SIZE", 10485760)
 
+# Dotted path of the Storage class uploads are kept in, Django's default storage if None
+FILE_STORAGE = getattr(settings, "DATAFORMS_FILE_STORAGE", None)
+
+# Store uploads under the hash of their contents, so identical files are kept once
+CONTENT_ADDRESSED_UPLOADS = getattr(settings, "DATAFORMS_CONTENT_ADDRESSED_UPLOADS", False)
+# Content addressed uploads younger than this (in seconds) are never garbage collected
+UPLOAD_GC_GRACE = getattr(settings, "DATAFORMS_UPLOAD_GC_GRACE", 86400)
+
+# The largest chunk a resumable upload may send at a time, in bytes
+CHUNKED_UPLOAD_SIZE = getattr(settings, "DATAFORMS_CHUNKED_UPLOAD_SIZE", 1048576)
+# Resumable uploads that receive nothing for this long (in seconds) are deleted
+CHUNKED_UPLOAD_EXPIRY = getattr(settings, "DATAFORMS_CHUNKED_UPLOAD_EXPIRY", 86400)
+# Dotted path of a function of the request saying whether it may use the resumable
+# upload views; None lets in authenticated users only
+UPLOAD_PERMISSION = getattr(settings, "DATAFORMS_UPLOAD_PERMISSION", None)
+
 UPLOAD_FIELDS = getattr(settings, "DATAFORMS_UPLOAD_FIELDS", ()) + ('FileInput', 'ImageFileInput')
 BOOLEAN_FIELDS = getattr(settings, "DATAFORMS_BOOLEAN_FIELDS", ()) + ('CheckboxInput',)
 SINGLE_CHOICE_FIELDS = getattr(settings, "DATAFORMS_SINGLE_CHOICE_FIELDS", ()) + ('Select', 'RadioSelect')
@@ -51,8 +67,19 @@ FIELD_DELIMITER = getattr(settings, "DATAFORMS_FIELD_DELIMITER", "__")
 VALIDATION_MODULE = getattr(settings, "DATAFORMS_VALIDATION_MODULE", "validation")
 
 CHOICES_MODULE = getattr(settings, "DATAFORMS_CHOICES_MODULE", "choices")
-
-FIELD_TYPE_CHOICES = tuple([(field,field) for field in FIELD_MAPPINGS])
+# Choice functions in the CHOICES_MODULE whose results are cached, as
+# {function name: {'ttl': seconds, 'max_size': results, 'key': function of the request}}
+CHOICES_CACHE = getattr(settings, "DATAFORMS_CHOICES_CACHE", {})
+
+# Keep compiled form classes in memory between requests
+FORM_CACHE = getattr(settings, "DATAFORMS_FORM_CACHE", True)
+# Share form cache invalidation between processes through the Django cache.  Without
+# it, other processes keep serving a changed form's old definition until they restart.
+FORM_CACHE_SHARED = getattr(settings, "DATAFORMS_FORM_CACHE_SHARED", True)
+# How long (in seconds) the {% cacheform %} tag keeps rendered forms
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, "DATAFORMS_FRAGMENT_CACHE_TIMEOUT", 3600)
+# How long (in seconds) browsers may keep the bindings of a form; their url changes with them
+BINDINGS_CACHE_TIMEOUT = getattr(settings, "DATAFORMS_BINDINGS_CACHE_TIMEOUT", 31536000)
 
 REMOTE_JQUERY_JS = (
 	'https://ajax.googleapis.com/ajax/libs/jquery/1.6.4/jquery.min.js',
@@ -0,0 +1,167 @@
+"""
+Dataforms Display
+=================
+
+Shows the answers of a submission without building a form: the labels come
+from the cached schema, the answers are read by get_answers, and choice
+values are turned into their titles through a lookup built once per schema.
+Use it for read-only pages instead of create_form(..., readonly=True).
+
+Usage::
+
+    from dataforms.display import get_display, render_display
+
+    for field in get_display(form="personal-information", submission="myForm"):
+        print field.label, field.value
+
+    html = render_display(form="personal-information", submission="myForm")
+"""
+from collections import namedtuple
+from django.utils.safestring import mark_safe
+from app_settings import CHOICE_FIELDS, BOOLEAN_FIELDS, UPLOAD_FIELDS, FIELD_DELIMITER
+from schema import get_schema
+from utils.choices import get_choices
+from utils.file import get_storage
+
+
+# Field types that hold nothing to display
+HIDDEN_FIELDS = ('HiddenInput',)
+
+BOOLEAN_TITLES = {True: u'Yes', False: u'No'}
+
+
+class DisplayField(namedtuple('DisplayField', 'slug name label field_type value raw_value url')):
+    """
+    The answer to one field, ready to show.
+
+    :attr name: the form field name, form-slug__field-slug
+    :attr value: the answer as text; choice titles are joined with commas
+    :attr raw_value: the answer as from get_answers
+    :attr url: the url of an uploaded file, or None
+    """
+    __slots__ = ()
+
+
+# Choice titles, keyed on DataForm slug, as (schema, lookup)
+_choice_title_cache = {}
+
+
+def get_choice_titles(schema):
+    """
+    Map every choice value of a form to its title.
+
+    :return: a dictionary of {value: title} dictionaries, keyed on field slug
+    """
+
+    cached = _choice_title_cache.get(schema.slug)
+    if cached and cached[0] is schema:
+        return cached[1]
+
+    titles = dict((field.slug, dict(field.choices)) for field in schema.fields if field.field_type in CHOICE_FIELDS)
+    _choice_title_cache[schema.slug] = (schema, titles)
+    return titles
+
+
+def get_display(form, submission=None, answers=None, request=None):
+    """
+    Get the answers to a form as labels and values, in form order.
+
+    :param form: a DataForm slug or object
+    :param submission: a Submission slug or object
+    :param answers: *optional*; the answers to the form, as from get_answers(submission, form=form),
+        if they are already loaded
+    :param request: *optional*; passed on to choice functions from the CHOICES_MODULE
+    :rtype: a list of DisplayField
+    """
+
+    return _get_display(get_schema(form), submission, answers, request)
+
+
+def _get_display(schema, submission, answers, request=None):
+    # Avoid a circular import, the form API may use us
+    from forms import choices_module
+
+    if answers is None:
+        answers = _get_answers(schema, submission) if submission else {}
+
+    titles = get_choice_titles(schema)
+    display = []
+
+    for field in schema.fields:
+        if field.field_type in HIDDEN_FIELDS:
+            continue
+
+        raw_value = answers.get(field.slug)
+        url = None
+
+        if field.field_type in CHOICE_FIELDS:
+            field_titles = titles[field.slug]
+
+            # Choices from the CHOICES_MODULE aren't in the schema
+            choices_func = getattr(choices_module, field.slug.replace('-', '_'), None)
+            if choices_func:
+                field_titles = dict(field_titles)
+                field_titles.update(get_choices(choices_func, request))
+
+            values = raw_value if isinstance(raw_value, list) else [raw_value] if raw_value else []
+            value = u', '.join(unicode(field_titles.get(choice, choice)) for choice in values)
+        elif field.field_type in BOOLEAN_FIELDS:
+            value = BOOLEAN_TITLES[bool(raw_value) and raw_value not in ('0', 'False')]
+        elif field.field_type in UPLOAD_FIELDS:
+            value = raw_value.split('/')[-1] if raw_value else u''
+            url = get_storage().url(raw_value) if raw_value else None
+        else:
+            value = raw_value if raw_value is not None else u''
+
+        display.append(DisplayField(
+            slug=field.slug,
+            name=FIELD_DELIMITER.join([schema.slug, field.slug]),
+            label=field.label,
+            field_type=field.field_type,
+            value=value,
+            raw_value=raw_value,
+            url=url,
+        ))
+
+    return display
+
+
+def _get_answers(schema, submission):
+    """
+    The answers of a submission to a form, from get_answers, so they are
+    read and folded exactly as the form API does.
+    """
+
+    # Avoid a circular import, the form API may use us
+    from forms import get_answers
+
+    return get_answers(submission, form=schema.id)
+
+
+def _escape(value):
+    # Like django.utils.html.escape, without the lazy and safe string handling
+    return (value.replace(u'&', u'&amp;').replace(u'<', u'&lt;').replace(u'>', u'&gt;')
+        .replace(u'"', u'&quot;').replace(u"'", u'&#39;'))
+
+
+def render_display(form, submission=None, answers=None, request=None):
+    """
+    Render the answers to a form as a definition list.  Labels are trusted,
+    as on the form itself, and values are escaped.
+
+    Takes the same arguments as get_display.
+    """
+
+    schema = get_schema(form)
+    html = [u'<dl class="dataform-display" id="%s">' % _escape(schema.slug)]
+
+    for field in _get_display(schema, submission, answers, request):
+        html.append(u'<dt>%s</dt>' % (field.label or u''))
+
+        if field.url:
+            html.append(u'<dd><a href="%s">%s</a></dd>' % (_escape(field.url), _escape(unicode(field.value))))
+        else:
+            html.append(u'<dd>%s</dd>' % _escape(unicode(field.value)))
+
+    html.append(u'</dl>')
+    return mark_safe(u''.join(html))
@@ -0,0 +1,214 @@
+"""
+Dataforms Export
+================
+
+Streams every submission to a DataForm or Collection out as CSV or JSON
+lines, one record per submission.  Submissions are read a chunk at a time,
+so memory use stays the same however many answers there are.
+
+Usage::
+
+    from dataforms.export import export_answers
+
+    with open('answers.csv', 'w') as output:
+        for line in export_answers(form="personal-information", format="csv"):
+            output.write(line)
+"""
+from django.db import connection
+from django.utils import simplejson as json
+from django.utils.datastructures import SortedDict
+from django.utils.encoding import smart_str
+from models import DataForm, Collection, CollectionDataForm, DataFormField, Answer, Submission
+from app_settings import FIELD_DELIMITER, MULTI_CHOICE_FIELDS
+from utils.sql import max_query_params
+from itertools import groupby
+import csv
+
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# How many submissions are read from the database at a time
+EXPORT_CHUNK_SIZE = 500
+
+
+class ExportColumn(object):
+    """
+    A column of the export: the answer to one field on one form.
+    """
+
+    def __init__(self, name, data_form_id, field_id, field_type):
+        self.name = name
+        self.data_form_id = data_form_id
+        self.field_id = field_id
+        self.field_type = field_type
+
+
+def export_answers(form=None, collection=None, format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Export the answers to a form or a collection.
+
+    :param form: a DataForm slug or object
+    :param collection: a Collection slug or object; columns are named
+        form-slug__field-slug since a field may be on more than one form.
+    :param format: 'csv' or 'jsonl'
+    :return: a generator of encoded lines
+    """
+
+    if format not in EXPORT_FORMATS:
+        raise ValueError('Export format must be one of %s.' % ', '.join(EXPORT_FORMATS))
+
+    columns = get_export_columns(form=form, collection=collection)
+    records = iter_export_records(columns, chunk_size=chunk_size)
+
+    if format == 'csv':
+        return _csv_lines(columns, records)
+    return _jsonl_lines(records)
+
+
+def get_export_columns(form=None, collection=None):
+    """
+    Get the export columns of a form, or of every form in a collection,
+    in DataFormField order.
+
+    :rtype: a list of ExportColumn
+    """
+
+    if bool(form) == bool(collection):
+        raise ValueError('Export either a form or a collection.')
+
+    if collection:
+        # Slightly evil, do type checking to see if collection is a Collection object or string
+        if isinstance(collection, str) or isinstance(collection, unicode):
+            collection = Collection.objects.get(slug=collection)
+
+        form_ids = []
+        for data_form_id in (CollectionDataForm.objects.filter(collection=collection)
+                             .order_by('order').values_list('data_form', flat=True)):
+            # A form may be in more than one section
+            if data_form_id not in form_ids:
+                form_ids.append(data_form_id)
+    else:
+        if isinstance(form, str) or isinstance(form, unicode):
+            form = DataForm.objects.get(slug=form)
+        form_ids = [form.id]
+
+    mappings = (DataFormField.objects.filter(data_form__in=form_ids)
+                .order_by('order', 'id')
+                .values_list('data_form', 'data_form__slug', 'field', 'field__slug', 'field__field_type'))
+
+    by_form = dict((data_form_id, []) for data_form_id in form_ids)
+    for data_form_id, data_form_slug, field_id, field_slug, field_type in mappings:
+        name = FIELD_DELIMITER.join([data_form_slug, field_slug]) if collection else field_slug
+        by_form[data_form_id].append(ExportColumn(name, data_form_id, field_id, field_type))
+
+    return [column for data_form_id in form_ids for column in by_form[data_form_id]]
+
+
+def iter_export_records(columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Pivot the answers to the given columns into one record per submission.
+
+    :return: a generator of SortedDicts, keyed on 'submission', 'last_modified'
+        and then the column names.  Multiple choice answers are lists.
+    """
+
+    if not columns:
+        return
+
+    form_ids = sorted(set(column.data_form_id for column in columns))
+    columns_by_key = dict(((column.data_form_id, column.field_id), column) for column in columns)
+    chunk_size = max(1, min(chunk_size, max_query_params(connection) - len(form_ids) - 1))
+    answered = Answer.objects.filter(data_form__in=form_ids).values('submission')
+
+    last_submission_id = 0
+
+    while True:
+        # Walk the submissions by id, a chunk at a time.  Slicing leaves the
+        # row limit to the backend (LIMIT, or ROWNUM on Oracle).
+        submissions = list(Submission.objects
+            .filter(id__in=answered, id__gt=last_submission_id)
+            .order_by('id')
+            .values_list('id', 'slug', 'last_modified')[:chunk_size])
+
+        if not submissions:
+            return
+
+        for record in _iter_chunk_records(submissions, form_ids, columns, columns_by_key):
+            yield record
+
+        last_submission_id = submissions[-1][0]
+
+
+def _iter_chunk_records(submissions, form_ids, columns, columns_by_key):
+    records = dict((submission_id, _empty_record(slug, last_modified, columns))
+                   for submission_id, slug, last_modified in submissions)
+    answers = Answer.objects.iter_answer_data([row[0] for row in submissions], data_form_id=form_ids)
+
+    # Answers come in submission order, so each record is finished when the next starts
+    for submission_id, group in groupby(answers, lambda answer: answer['submission_id']):
+        record = records[submission_id]
+
+        for answer in group:
+            column = columns_by_key.get((answer['data_form_id'], answer['field_id']))
+            if column is None:
+                continue
+
+            if answer['choice_id']:
+                # Choices saved as AnswerChoice rows
+                choice_values = answer['choice_value']
+                if isinstance(choice_values, list) or column.field_type in MULTI_CHOICE_FIELDS:
+                    record[column.name] = choice_values if isinstance(choice_values, list) else [choice_values]
+                else:
+                    record[column.name] = choice_values
+            elif column.field_type in MULTI_CHOICE_FIELDS:
+                # Multiple choices are saved comma delimited in the answer value
+                record[column.name] = answer['value'].split(',') if answer['value'] else []
+            else:
+                record[column.name] = answer['value']
+
+        yield record
+
+
+def _empty_record(slug, last_modified, columns):
+    record = SortedDict()
+    record['submission'] = slug
+    record['last_modified'] = last_modified
+    for column in columns:
+        record[column.name] = None
+    return record
+
+
+class _Echo(object):
+    """
+    A file-like object that hands back what is written to it, so the csv
+    module can format one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, records):
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(['submission', 'last_modified'] + [smart_str(column.name) for column in columns])
+
+    for record in records:
+        yield writer.writerow([_csv_value(value) for value in record.values()])
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = ','.join(value)
+    elif not isinstance(value, basestring):
+        value = unicode(value)
+    return smart_str(value)
+
+
+def _jsonl_lines(records):
+    for record in records:
+        if record['last_modified'] is not None:
+            record['last_modified'] = unicode(record['last_modified'])
+        yield json.dumps(record) + '\n'
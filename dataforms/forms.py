@@ -8,18 +8,27 @@ http://readthedocs.org/docs/django-dataforms/en/latest/
 from collections import defaultdict
 from django import forms
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.urlresolvers import reverse, NoReverseMatch
+from django.db import connection
 from django.forms.forms import BoundField
-from django.template.defaultfilters import safe, force_escape
+from django.template.defaultfilters import safe, filesizeformat
 from django.utils import simplejson as json
 from django.utils.datastructures import SortedDict
 from django.utils.safestring import mark_safe
 from models import DataForm, Collection, Field, FieldChoice, Choice, Answer, \
     AnswerChoice, Submission, CollectionDataForm, Section, Binding
-from app_settings import FIELD_MAPPINGS, SINGLE_CHOICE_FIELDS, MULTI_CHOICE_FIELDS, \
+from app_settings import SINGLE_CHOICE_FIELDS, MULTI_CHOICE_FIELDS, \
     CHOICE_FIELDS, UPLOAD_FIELDS, FIELD_DELIMITER, STATIC_CHOICE_FIELDS, FORM_MEDIA, \
-    VALIDATION_MODULE, CHOICES_MODULE
-from utils.file import handle_upload, DataFormFile
-from utils.sql import update_many, insert_many
+    VALIDATION_MODULE, CHOICES_MODULE, FORM_CACHE, MAX_UPLOAD_SIZE
+from registry import field_types
+from schema import FieldSchema, get_schema, get_schemas, load_schema, clear_schema_cache, check_visible
+from uploadhandler import install_upload_handler, pop_upload_limit
+from utils.cache import get_schema_generation
+from utils.choices import get_choice_provider, get_choices
+from utils.file import handle_upload, DataFormFile, LazyDataFormFile
+from utils.sql import chunked, max_query_params
+from utils.unitofwork import UnitOfWork
 import datetime
 import os
 
@@ -33,30 +42,97 @@ except ImportError: validation_module = None
 try: choices_module = __import__(CHOICES_MODULE, fromlist=['*'])
 except ImportError: choices_module = None
 
+# Compiled form classes, keyed on (slug, title, description)
+_form_class_cache = {}
+
+class QueryData(dict):
+    """
+    The query data returned with a form class, as ``form.query_data``.
+
+    Forms are built from a cached FormSchema (``schema``), so
+    ``dataform_query`` is an unsaved DataForm carrying the schema's values
+    and ``fields_list`` holds its FieldSchema tuples.  The ``field_query``
+    and ``choice_query`` querysets forms used to be built from are still
+    there: a fresh, unevaluated one on every lookup, since the query data
+    is cached with the class.
+    """
+
+    def __missing__(self, key):
+        schema = dict.__getitem__(self, 'schema')
+
+        if key == 'field_query':
+            return Field.objects.filter(
+                dataformfield__data_form__id=schema.id,
+                visible=True
+            ).order_by('dataformfield__order')
+
+        if key == 'choice_query':
+            return FieldChoice.objects.select_related('choice', 'field').filter(
+                field__dataformfield__data_form__id=schema.id,
+                field__visible=True
+            ).order_by('order')
+
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 class BaseDataForm(forms.BaseForm):
 
-    def __init__(self, readonly=False, *args, **kwargs):
+    # The answers (as from get_answers) that this form was created with.
+    # save() only writes the answers that differ from these.
+    initial_answers = None
+
+    # Uploads the upload handler dropped for being too large, as
+    # {field name: limit in bytes}
+    rejected_uploads = {}
+
+    def __init__(self, readonly=False, request=None, *args, **kwargs):
         super(BaseDataForm, self).__init__(*args, **kwargs)
-        self._generate_bound_fields()
+
+        self.readonly = readonly
+        self.request = request
+
+        # The class (and its meta) may be shared between requests,
+        # so give every instance its own copy to write into.
+        self.meta = dict(self.meta)
+
+        # Choices from the CHOICES_MODULE are evaluated per instance
+        for name, (choices_func, choices) in self.choice_providers.items():
+            self.fields[name].choices = choices + get_choices(choices_func, request)
+
+        # Bound fields are made the first time they are asked for.  The field
+        # order is kept from now on, so fields removed later (like the
+        # bindings field, when validating) are still rendered.
+        self._bound_field_order = self.fields.items()
+        self.bound_fields = {}
 
         #set fields as readonly if property is true
         if readonly:
             self._readonly_fields()
 
 
-    def __getattr__(self, name):
-        if 'clean_' in name:
-            # Remove the form-name__ from clean_form-name__textbox
-            # and make all dashes underscores (so that clean_some_field_slug will be called)
-            validation_func_name = name.replace("".join([self.slug, FIELD_DELIMITER]), "").replace("-", "_")
+    def _post_clean(self):
+        super(BaseDataForm, self)._post_clean()
 
-            # Have to use dir() here instead of hasattr because hasattr calls getattr and catches exceptions :)
-            if validation_func_name not in dir(self):
-                raise AttributeError(validation_func_name)
-            return getattr(self, validation_func_name)
-        else:
-            raise AttributeError("%s doesn't exist in %s" % (name, repr(self)))
+        for name, field in self.fields.items():
+            if name in self.rejected_uploads:
+                limit = self.rejected_uploads[name]
+            else:
+                # Uploads that got past without the upload handler
+                upload = self.files.get(name)
+                limit = getattr(field, 'max_upload_size', None)
+                if (not limit or upload is None or isinstance(upload, DataFormFile)
+                        or not upload.size > limit):
+                    continue
 
+            self._errors[name] = self.error_class(
+                ['Please keep filesize under %s.' % filesizeformat(limit)])
+            self.cleaned_data.pop(name, None)
 
 
     def __iter__(self):
@@ -66,8 +142,23 @@ class BaseDataForm(forms.BaseForm):
         persist the next time that the form is iterated over.
         """
 
-        for name in self.bound_fields:
-            yield self.bound_fields[name]
+        for name, field in self._bound_field_order:
+            yield self._get_bound_field(name, field)
+
+
+    def __getitem__(self, name):
+        """
+        Returns the same BoundField for a name every time, like __iter__.
+        """
+
+        bound_field = self.bound_fields.get(name)
+        if bound_field is None:
+            try:
+                field = self.fields[name]
+            except KeyError:
+                raise KeyError('Key %r not found in Form' % name)
+            bound_field = self._get_bound_field(name, field)
+        return bound_field
 
 
     def is_valid(self, check_required=True, *args, **kwargs):
@@ -86,12 +177,22 @@ class BaseDataForm(forms.BaseForm):
         return super(BaseDataForm, self).is_valid()
 
 
-    def save(self, collection=None):
+    def save(self, collection=None, uow=None):
         """
         Saves the validated, cleaned form data. If a submission already exists,
         the new data will be merged over the old data.
+
+        Only answers that changed are written.  Afterwards, the slugs of the
+        fields whose answers changed are available as ``form.changed_answers``.
+
+        :param uow: *optional* (UnitOfWork); queue the writes on this unit of work
+            instead of writing them straight away, to save many forms in one transaction.
         """
 
+        if uow is None:
+            with UnitOfWork() as uow:
+                return self.save(collection=collection, uow=uow)
+
         # TODO: think about adding an "overwrite" argument to this function, default of False,
         # which will determine if an error should be thrown if the submission object already
         # exists, or if we should trust the data and overwrite the previous submission.
@@ -109,84 +210,88 @@ class BaseDataForm(forms.BaseForm):
         if isinstance(self.submission, str) or isinstance(self.submission, unicode):
             submission_slug = self.submission
 
-            # Get or create the object
+            # Get or create the object, and go back to the slug if the writes are rolled back
+            uow.remember(self, 'submission')
             self.submission, was_created = Submission.objects.get_or_create(slug=submission_slug, collection=collection)
 
+            if was_created:
+                uow.submission_created(self.submission)
+
         # Otherwise it should be a submission model object, if not raise
         elif not isinstance(self.submission, Submission):
             raise AttributeError('Submission %s is not a valid submission object.' % self.submission)
 
+        schema = self.query_data['schema']
+        answers = []
+        changed_choice_fields = []
+        self.changed_answers = set()
 
-        # We now have a submission object, so let's update the last_modified field
-        self.submission.last_modified = datetime.datetime.now()
-        self.submission.save()
-
-        # Get the existing answers
-        answers = Answer.objects.select_related(
-            'submission',
-            'data_from',
-            'field').filter(
-                        data_form__slug=self.slug,
-                        submission=self.submission)
-
-        # Get the fields from the form post
-        field_keys = []
-        for key in self.fields:
-            # Mangle the key into the DB form, then get the right Field
-            field_keys.append(_field_for_db(key))
-
-        # Get all fields that pertian to this dataform (from db)
-        fields_from_db = self.query_data['field_query']
-
-        # Check for fields that aren't in the database and create a list of them
-        fields_to_insert = []
-        for field in fields_from_db:
-            has_answer = filter(lambda a: a.field.slug == field.slug, answers)
-            if has_answer:
+        for field in schema.fields:
+            key = _field_for_form(field.slug, self.slug)
+
+            # save the answer only if the field is in the form
+            if key not in self.fields:
                 continue
-            else:
-                fields_to_insert.append(field)
-
-        # For these new fields, create answer objects for insertion, if any
-        if fields_to_insert:
-            new_answers = []
-            for field in fields_to_insert:
-                # save the answer only if the field is in the form POST
-                if field.slug in field_keys:
-                    # Create a new answer object
-                    answer = Answer()
-                    answer.submission = self.submission
-                    answer.data_form = self.query_data['dataform_query']
-                    answer.field = field
-                    new_answers.append(answer)
-
-            # Insert the new objects, if any
-            if new_answers:
-                insert_many(new_answers)
-
-            # Get Answers again so that we have the pks if we had answers that were inserted
-            answers = (Answer.objects.select_related('submission', 'data_from', 'field')
-                       .filter(data_form__slug=self.slug, submission=self.submission))
-
-        # Setup answer list so we can do a bulk update
-        answer_objects = []
-
-        # We know answers exist now, so update them if needed.
-        for answer in answers:
 
-            # Delete the choices so we can re-insert
-            AnswerChoice.objects.filter(answer=answer).delete()
+            answer = Answer(
+                submission=self.submission,
+                data_form_id=schema.id,
+                field_id=field.id,
+            )
+            self._prepare_answer(answer, field)
+
+            # Only write the answers that differ from what the form was created with
+            if not self._answer_changed(key, answer.value, field):
+                continue
+
+            self.changed_answers.add(field.slug)
+            answers.append(answer)
+
+            if field.field_type in CHOICE_FIELDS or field.field_type in STATIC_CHOICE_FIELDS:
+                changed_choice_fields.append(field.id)
 
-            answer_obj = self._prepare_answer(answer)
-            answer_objects.append(answer_obj)
+        # Nothing changed, so leave the submission as it is
+        if not answers:
+            return self.submission
 
-        # Update the answers
-        update_many(answer_objects, fields=['value'])
+        # We now have a submission object, so let's update the last_modified field
+        self.submission.last_modified = datetime.datetime.now()
+        uow.touch_submission(self.submission, self.submission.last_modified)
+
+        # Choices are saved in the answer value, so clear out any choice rows
+        if changed_choice_fields:
+            uow.delete_choices(self.submission.id, schema.id, changed_choice_fields)
+
+        # Insert the new answers and update the existing ones in place.
+        uow.add_answers(answers)
 
         # Return a submission so the collection or form can have this.
         return self.submission
 
 
+    def _answer_changed(self, key, value, field):
+        """
+        Whether a prepared answer value differs from the answer the form was
+        created with.  Without initial answers every value counts as changed.
+        Choices are compared regardless of the order they were posted in.
+        """
+
+        if self.initial_answers is None or key not in self.initial_answers:
+            return True
+
+        initial = self.initial_answers[key]
+
+        if field.field_type in CHOICE_FIELDS or field.field_type in STATIC_CHOICE_FIELDS:
+            if not isinstance(initial, list):
+                initial = initial.split(',') if initial else []
+            return set(initial) != set(value.split(',') if value else [])
+
+        if isinstance(initial, list):
+            initial = ','.join(initial)
+
+        return (initial or '') != (value or '')
+
+
     def _readonly_fields(self):
         """
         Helper function to set read only fields.
@@ -196,11 +301,9 @@ class BaseDataForm(forms.BaseForm):
             self.fields[field].widget.attrs['disabled'] = 'disabled'
 
 
-    #def _prepare_answer(self, answer, choices):
-    def _prepare_answer(self, answer):
+    def _prepare_answer(self, answer, field):
 
-        field = answer.field
-        key = _field_for_form(field, self.slug)
+        key = _field_for_form(field.slug, self.slug)
 
         # Because Choices are m2m relations, we need to do this after the save.
         if field.field_type in CHOICE_FIELDS or field.field_type in STATIC_CHOICE_FIELDS:
@@ -257,14 +360,32 @@ class BaseDataForm(forms.BaseForm):
             del self.fields[binding_key]
 
 
-    def _generate_bound_fields(self):
-        self.bound_fields = SortedDict([(name, BoundField(self, field, name)) for name, field in self.fields.items()])
+    def _get_bound_field(self, name, field):
+        bound_field = self.bound_fields.get(name)
+        if bound_field is None:
+            bound_field = self.bound_fields[name] = BoundField(self, field, name)
+        return bound_field
 
     @property
     def media(self):
         return get_form_media()
 
 
+class CollectionForm(object):
+    """
+    A form in a collection that has not been built yet.  BaseCollection
+    builds it the first time it is iterated, indexed or validated.
+    """
+
+    def __init__(self, data_form=None, section=None, form=None):
+        self.data_form = data_form
+        self.section = section
+        self.form = form
+
+    def __repr__(self):
+        return '<CollectionForm: %s (%s)>' % (self.data_form, self.section)
+
+
 class BaseCollection(object):
     """
     You shouldn't need to instantiate this object directly, use create_collection.
@@ -275,16 +396,38 @@ class BaseCollection(object):
         collection.current_section
         collection.next_section
         collection.prev_section
+
+    Forms are only built when they are used, and only the forms in the
+    current section are ever built.
     """
 
-    def __init__(self, collection, forms, sections, current_section):
+    def __init__(self, collection, forms, sections, current_section, request=None,
+                 submission=None, readonly=False, force_bind=False):
         self.collection = collection
         self.submission = None
         self.title = str(collection.title)
         self.description = str(collection.description)
         self.slug = str(collection.slug)
-        self.forms = forms
         self.sections = sections
+
+        # Already built forms are accepted too
+        self._descriptors = [form if isinstance(form, CollectionForm)
+                             else CollectionForm(section=form.meta['section'], form=form)
+                             for form in forms]
+        self._form_kwargs = {
+            'request': request,
+            'submission': submission,
+            'readonly': readonly,
+            'force_bind': force_bind,
+        }
+        self._answers = {}
+        self._answered_forms = set()
+
+        # Index the forms by section once, rather than scanning on every lookup
+        self._section_indexes = defaultdict(list)
+        for index, descriptor in enumerate(self._descriptors):
+            self._section_indexes[descriptor.section.pk if descriptor.section else None].append(index)
+
         self.current_section = current_section
         # Set the previous and next sections
         self._set_next_previous_sections(self.current_section)
@@ -297,17 +440,9 @@ class BaseCollection(object):
             collection[2]
         """
 
-        # The true index to the form the user is asking for is the normal index
-        # into self.forms, but excluding forms masked out by __form_existence[] == False
-
         # Only for sequence, so self can be called.
         if isinstance(name, int):
-            fake_index = -1
-            for i in range(0, len(self.forms) + 1):
-                if self.__form_existence[i]:
-                    fake_index += 1
-                if fake_index == name:
-                    return self.forms[i]
+            return self._build_forms([self._visible[name]])[0]
         else:
             return getattr(self, name)
 
@@ -317,13 +452,18 @@ class BaseCollection(object):
         Make a new collection with the given subset of forms
         """
 
-        return BaseCollection(
+        sliced = BaseCollection(
             collection=self.collection,
-            forms=self.forms[start:end],
+            forms=[self._descriptors[index] for index in self._visible[start:end]],
             # FIXME: does this need to be limited to the sections of the forms in the slice?
             sections=self.sections,
-            current_section=self.current_section
+            current_section=self.current_section,
+            **self._form_kwargs
         )
+        sliced._answers = self._answers
+        sliced._answered_forms = self._answered_forms
+
+        return sliced
 
 
     def __len__(self):
@@ -331,19 +471,98 @@ class BaseCollection(object):
         :return: the number of contained forms (that are visible)
         """
 
-        return len([truth for truth in self.__form_existence if truth])
+        return len(self._visible)
 
 
-    def save(self):
+    def __iter__(self):
         """
-        Save all contained forms
+        Iterate over the visible forms, building them if needed
         """
 
+        return iter(self._build_forms(self._visible))
+
+
+    def _forms(self):
+        """
+        Every form in the collection, whatever its section.
+        Using this builds all of them.
+        """
+        return self._build_forms(range(len(self._descriptors)))
+    forms = property(_forms)
+
+
+    def _build_forms(self, indexes):
+        """
+        Build the forms at the given indexes of the collection.
+
+        The first time forms are built, the schemas of every visible form
+        are loaded together, and the answers for them are read in one query.
+        Forms outside of the current section are only built if asked for.
+        """
+
+        descriptors = [self._descriptors[index] for index in indexes]
+        unbuilt = [descriptor for descriptor in descriptors if descriptor.form is None]
+
+        if unbuilt:
+            wanted = dict((id(descriptor), descriptor) for descriptor in unbuilt)
+            for index in self._visible:
+                descriptor = self._descriptors[index]
+                if descriptor.form is None:
+                    wanted[id(descriptor)] = descriptor
+            wanted = wanted.values()
+
+            schemas = get_schemas([descriptor.data_form for descriptor in wanted])
+
+            unanswered = [descriptor.data_form for descriptor in wanted
+                          if descriptor.data_form.pk not in self._answered_forms]
+            if unanswered:
+                self._answers.update(self._get_answers(unanswered))
+                self._answered_forms.update(data_form.pk for data_form in unanswered)
+
+            for descriptor in unbuilt:
+                descriptor.form = create_form(form=descriptor.data_form, section=descriptor.section,
+                                              answers=self._answers, schema=schemas[descriptor.data_form.slug],
+                                              **self._form_kwargs)
+
+        return [descriptor.form for descriptor in descriptors]
+
+
+    def _get_answers(self, data_forms):
+        """
+        Get the answers for some forms of the collection
+        """
+
+        submission = self._form_kwargs['submission']
+
+        if not submission:
+            return {}
+
+        return get_answers(submission=submission, for_form=True, form=data_forms)
+
+
+    def save(self, uow=None):
+        """
+        Save all contained forms, in one transaction.  If any form fails
+        to save, none of them are saved.
+
+        :param uow: *optional* (UnitOfWork); queue the writes on this unit of work
+        """
+
+        if uow is None:
+            with UnitOfWork() as uow:
+                return self.save(uow=uow)
+
+        # Go back to the submissions we were given if the writes are rolled back
+        uow.remember(self, 'submission')
+
         for form in self:
             if not self.submission:
-                self.submission = form.save(collection=self.collection)
+                self.submission = form.save(collection=self.collection, uow=uow)
             else:
-                form.save(collection=self.collection)
+                # The first form already got or created the submission
+                uow.remember(form, 'submission')
+                form.submission = self.submission
+                form.save(collection=self.collection, uow=uow)
 
 
     def is_valid(self, check_required=True, *args, **kwargs):
@@ -392,11 +611,11 @@ class BaseCollection(object):
 
 
         if section is None:
-            self.__form_existence = [True for form in self.forms]
+            self._visible = range(len(self._descriptors))
         else:
-            self.__form_existence = [True if form.meta['section'] == section else False for form in self.forms]
+            self._visible = self._section_indexes.get(section.pk, [])
 
-        if True not in self.__form_existence:
+        if not self._visible:
             raise SectionDoesNotExist(section)
 
         # Set the indexes
@@ -439,43 +658,28 @@ def create_collection(request, collection, submission, readonly=False, section=N
         except Collection.DoesNotExist:
             raise Collection.DoesNotExist('Collection %s does not exist. Make sure the slug name is correct and the collection is visible.' % collection)
 
-    # Get queryset for all the forms that are needed
-    try:
-        kwargs = {}
-        kwargs['collection'] = collection
-        kwargs['collection__visible'] = True
-        if section:
-            if isinstance(section, str) or isinstance(section, unicode):
-                section = Section.objects.get(slug=section)
-            kwargs['section'] = section
-
-        forms = CollectionDataForm.objects.select_related('section', 'collection', 'data_form').filter(**kwargs).order_by('order')
-    except:
-        raise CollectionDataForm.DoesNotExist('Dataforms for collection %s do not exist. Make sure the slug name for the collection and section are correct and the forms are visible.' % collection)
+    if isinstance(section, str) or isinstance(section, unicode):
+        section = Section.objects.get(slug=section)
 
+    # Get every form mapping in the collection at once.  The sections are
+    # worked out from these rows, and nothing else is loaded until the
+    # collection's forms are used.
+    collection_forms = list(CollectionDataForm.objects.select_related('section', 'data_form')
+                            .filter(collection=collection, collection__visible=True).order_by('order'))
 
     # Get the sections for this collection
-    sections = create_sections(collection)
-
-    # Initialize a list to contain all the form classes
-    form_list = []
+    sections = _sections_from_rows(collection_forms)
 
-    # Get answers for this submission so we can pass this to our form(s)
-    # This avoids extra queries on our create_form object
-    answers = get_answers(submission=submission, for_form=True)
-
-    # Populate the list
-    for form in forms:
-        temp_form = create_form(request, form=form.data_form, submission=submission, section=form.section,
-                                readonly=readonly, answers=answers, force_bind=force_bind)
-        form_list.append(temp_form)
-
-    # Pass our collection info and our form list to the dictionary
+    # Pass our collection info and our forms to the dictionary
     collection = BaseCollection(
         collection=collection,
-        forms=form_list,
+        forms=[CollectionForm(data_form=row.data_form, section=row.section) for row in collection_forms],
         sections=sections,
-        current_section=section
+        current_section=section,
+        request=request,
+        submission=submission,
+        readonly=readonly,
+        force_bind=force_bind,
     )
 
     return collection
@@ -483,7 +687,7 @@ def create_collection(request, collection, submission, readonly=False, section=N
 
 def create_form(request, form, submission=None, title=None,
             description=None, section=None, readonly=False, answers=None,
-            return_class=False, force_bind=False):
+            return_class=False, force_bind=False, schema=None):
     """
     Instantiate and return a dynamic form object, optionally already populated from an
     already submitted form.
@@ -510,10 +714,11 @@ def create_form(request, form, submission=None, title=None,
         It should follow the same format os get_answers().
     :param return_class: *optional* (boolean); returns only the form class and decouples database saves
         Usefull for when you want to save the form somewhere else.
+    :param schema: *optional* (FormSchema); the already loaded schema of the form.
     """
 
     # Create our form class and get the querys we used
-    FormClass, query_data = _create_form(form=form, title=title, description=description)
+    FormClass, query_data = _get_form_class(form=form, title=title, description=description, schema=schema)
 
     # Return just the class object if a Form Class is only needed
     # This will de-couple the database integration allowing the developer
@@ -522,18 +727,25 @@ def create_form(request, form, submission=None, title=None,
     if return_class:
         return FormClass
 
+    # Check upload sizes while the body is read, if it hasn't been read yet
+    if request.method == 'POST':
+        install_upload_handler(request)
+
     # Get all existing answers and submission objects.
     # We do this now because we have to check for existing file uploads
     # So that we can merge request.FILES with existing files since we always
     # have to pass files on POST for them to validate.
 
-    if answers:
+    if answers is not None:
         data = answers
     elif submission:
         data = get_answers(submission=submission, for_form=True)
     else:
         data = []
 
+    # Keep the answers as they are in the database, so save() can tell what changed
+    initial_answers = dict(data) if submission else None
+
     # Parse Upload Fields into list
     upload_fields = []
     form_fields = FormClass.declared_fields
@@ -541,18 +753,21 @@ def create_form(request, form, submission=None, title=None,
         if form_fields[field].dataform_key in UPLOAD_FIELDS:
             upload_fields.append(field)
 
-    # Check for existing uploaded fields
+    # Attach the existing uploaded files.  These don't touch the filesystem
+    # until something needs the file's contents or size.
     existing_files = {}
     for item in data:
         if item in upload_fields and data[item]:
-            # Try to attach the existing uploaded files.  If this fails
-            # we assume it was deleted and will pass nothing.
-            try:
-                dataform_file = open(''.join([settings.MEDIA_ROOT, data[item]]), 'rb')
-                data[item] = DataFormFile(dataform_file, name=data[item])
-                existing_files[item] = data[item]
-            except:
-                pass
+            if not isinstance(data[item], DataFormFile):
+                data[item] = LazyDataFormFile(data[item])
+            existing_files[item] = data[item]
+
+    # Only binding needs to know whether the files are still there.
+    # If one is missing we assume it was deleted and will pass nothing.
+    if request.POST or force_bind:
+        for item in existing_files.keys():
+            if not existing_files[item].exists():
+                data[item] = existing_files.pop(item).path_name
 
     # Create the actual form instance, from the dynamic form class
     if request.POST:
@@ -570,7 +785,7 @@ def create_form(request, form, submission=None, title=None,
                 files[field] = existing_files[field]
 
 
-        form = FormClass(data=request.POST, files=files, readonly=readonly)
+        form = FormClass(data=request.POST, files=files, readonly=readonly, request=request)
     else:
         # We populate the initial data of the form from the database answers. Any questions we
         # don't have answers for in the database will use their initial field defaults.
@@ -579,17 +794,18 @@ def create_form(request, form, submission=None, title=None,
         # You can manually bind to force validation wihtout a POST by setting
         # is_bound to True
         if force_bind:
-            form = FormClass(data=data, files=existing_files, readonly=readonly)
+            form = FormClass(data=data, files=existing_files, readonly=readonly, request=request)
         else:
-            form = FormClass(initial=(data), readonly=readonly)
+            form = FormClass(initial=(data), readonly=readonly, request=request)
 
     # Now that we have an instantiated form object, let's add our custom attributes
     # TODO: I now have this in the meta....we should remove these.
     form.submission = submission
+    form.initial_answers = initial_answers
     form.section = section
     form.query_data = query_data
     form.js_include = query_data['dataform_query'].javascript_include
-    form.request = request
+    form.rejected_uploads = getattr(request, 'rejected_uploads', {})
 
     form.meta['submission'] = submission
     form.meta['section'] = section
@@ -607,28 +823,68 @@ def create_sections(collection):
     :param collection: a data form collection object
     """
 
-    # Get the sections from the many-to-many, and then make the elements unique (a set)
-    non_unique_sections = (Section.objects.order_by("collectiondataform__order")
-                        .filter(collectiondataform__collection=collection).distinct())
+    collection_forms = CollectionDataForm.objects.select_related('section').filter(collection=collection).order_by('order')
 
-    # Force the query to evaluate
-    non_unique_sections = list(non_unique_sections)
+    return _sections_from_rows(collection_forms)
+
+
+def _sections_from_rows(collection_forms):
+    """
+    :param collection_forms: CollectionDataForm rows, in order, with their sections
+    :return: the unique sections of the rows, in the order they first appear
+    """
 
-    # OK, this is evil. We have to manually remove duplicates that exist in the Section queryset.
-    # See here for why mixing order_by and distinct returns duplicates.
-    #
-    # http://docs.djangoproject.com/en/dev/ref/models/querysets/#distinct
-    #
-    # Also, using list(set(non_unique_sections)) does not work, unfortunately.
     sections = []
-    for section in non_unique_sections:
-        if section not in sections:
-            sections.append(section)
+    seen = set()
+
+    for row in collection_forms:
+        if row.section_id is not None and row.section_id not in seen:
+            seen.add(row.section_id)
+            sections.append(row.section)
 
     return sections
 
 
-def _create_form(form, title=None, description=None):
+def _get_form_class(form, title=None, description=None, schema=None):
+    """
+    Returns a form class and its query data, re-using a previously compiled
+    class if the form definition has not changed since.
+
+    Form classes are cached per process when DATAFORMS_FORM_CACHE is True.
+    Signals on the definition models invalidate the cache.
+
+    :param schema: optional FormSchema, if the caller has already loaded it
+    """
+
+    if not FORM_CACHE:
+        return _create_form(form=form, title=title, description=description, schema=schema)
+
+    slug = form.slug if isinstance(form, DataForm) else form
+    key = (slug, title, description)
+    generation = get_schema_generation()
+
+    cached = _form_class_cache.get(key)
+    if cached and cached[0] == generation:
+        # A hidden form compiled from a DataForm object stays hidden from slugs
+        check_visible(form, cached[2]['schema'])
+        return cached[1], cached[2]
+
+    FormClass, query_data = _create_form(form=form, title=title, description=description,
+                                         schema=schema or get_schema(form))
+    _form_class_cache[key] = (generation, FormClass, query_data)
+
+    return FormClass, query_data
+
+
+def clear_form_cache():
+    """
+    Throw away every compiled form class and schema in this process.
+    """
+    _form_class_cache.clear()
+    clear_schema_cache()
+
+
+def _create_form(form, title=None, description=None, schema=None):
     """
     Creates a form class object.
 
@@ -640,32 +896,23 @@ def _create_form(form, title=None, description=None):
     :param form: a data form slug or object
     :param title: optional title; pulled from DB by default
     :param description: optional description; pulled from DB by default
-    :param readonly: optional readonly; converts form fields to be readonly.
-        Usefull for display only logic.
+    :param schema: optional FormSchema; loaded from the DB by default
     """
 
     # Make sure the form definition exists before continuing
-    # Slightly evil, do type checking to see if form is a DataForm object or string
-    # If form object is a slug then get the form object and reassign
-    if isinstance(form, str) or isinstance(form, unicode):
-        try:
-            form = DataForm.objects.get(visible=True, slug=form)
-        except DataForm.DoesNotExist:
-            raise DataForm.DoesNotExist('DataForm %s does not exist. Make sure the slug name is correct and the form is visible.' % form)
-
-    # Otherwise it should be a form model object, if not raise
-    elif not isinstance(form, DataForm):
-        raise AttributeError('Dataform %s is not a valid data form object.' % form)
+    if schema is None:
+        schema = load_schema(form)
 
     meta = {}
-    slug = form if isinstance(form, str) or isinstance(form, unicode) else form.slug
+    slug = schema.slug
     final_fields = SortedDict()
-    choices_dict = defaultdict(tuple)
+    choice_providers = {}
     attrs = {
         'declared_fields' : final_fields,
         'base_fields' : final_fields,
         'meta' : meta,
         'slug' : slug,
+        'choice_providers' : choice_providers,
     }
 
     # Parse the slug and create a class title
@@ -673,113 +920,80 @@ def _create_form(form, title=None, description=None):
 
 
     # Set the title and/or the description from the DB (but only if it wasn't given)
-    meta['title'] = safe(form.title if not title else title)
-    meta['description'] = safe(form.description if not description else description)
-    meta['slug'] = form.slug
-
-    # Get all the fields
-    fields_qs = Field.objects.filter(
-        dataformfield__data_form__slug=slug,
-        visible=True
-    ).order_by('dataformfield__order')
-
-    fields = [field for field in fields_qs.values()]
-
-    if not fields:
-        raise Field.DoesNotExist('Field for %s do not exist. Make sure the slug name is correct and the fields are visible.' % slug)
-
-    # Get all the choices associated to fields
-    choices_qs = (
-        FieldChoice.objects.select_related('choice', 'field').filter(
-            field__dataformfield__data_form__slug=slug,
-            field__visible=True
-        ).order_by('order')
-    )
-
+    meta['title'] = safe(schema.title if not title else title)
+    meta['description'] = safe(schema.description if not description else description)
+    meta['slug'] = slug
 
-    # Get the bindings for use in the Field Loop
-    bindings = get_bindings(form=form)
+    fields = list(schema.fields)
 
     # Add a hidden field used for passing information to the JavaScript bindings function
-    fields.append({
-        'field_type': 'HiddenInput',
-        'slug': 'js_dataform_bindings',
-        'initial': safe(force_escape(json.dumps(bindings))),
-        'required': False,
-    })
-
-    # Populate our choices dictionary
-    for row in choices_qs:
-        choices_dict[row.field.pk] += (row.choice.value, safe(row.choice.title)),
-
-    # Process the field mappings and import any modules specified by string name
-    for key in FIELD_MAPPINGS:
-        # Replace the string arguments with the actual modules or classes
-        for sub_key in ('class', 'widget'):
-            if not FIELD_MAPPINGS[key].has_key(sub_key):
-                continue
-
-            value = FIELD_MAPPINGS[key][sub_key]
-
-            if isinstance(value, str) or isinstance(value, unicode):
-                names = value.split(".")
-                module_name = ".".join(names[:-1])
-                class_name = names[-1]
-                module = __import__(module_name, fromlist=[class_name])
-                # Replace the string with a class pointer
-                FIELD_MAPPINGS[key][sub_key] = getattr(module, class_name)
-
-        # Handle widget arguments
-        if not FIELD_MAPPINGS[key].has_key('widget_kwargs'):
-            # Initialize all field-mappings that don't have a 'widget_kwargs' key
-            FIELD_MAPPINGS[key]['widget_kwargs'] = {}
+    fields.append(FieldSchema(
+        id=None,
+        slug='js_dataform_bindings',
+        field_type='HiddenInput',
+        label=None,
+        help_text=None,
+        initial=_get_bindings_reference(schema),
+        classes=None,
+        arguments=None,
+        required=False,
+        choices=(),
+    ))
 
     # ----- Field Loop -----
     # Populate our fields dictionary for this form
     for row in fields:
-        form_field_name = _field_for_form(name=row['slug'], form=slug)
+        form_field_name = _field_for_form(name=row.slug, form=slug)
 
         field_kwargs = {}
-        field_map = FIELD_MAPPINGS[row['field_type']]
-        widget_attrs = field_map.get('widget_attrs', {})
-
-        if row.has_key('label'):
-            field_kwargs['label'] = safe(row['label'])
-        if row.has_key('help_text'):
-            field_kwargs['help_text'] = safe(row['help_text'])
-        if row.has_key('initial'):
-            field_kwargs['initial'] = row['initial']
-        if row.has_key('required'):
-            field_kwargs['required'] = row['required']
+        field_type = field_types.get(row.field_type)
+        if field_type is None:
+            raise ImproperlyConfigured("Dataforms field '%s' has the field type '%s', which is not in DATAFORMS_FIELD_MAPPINGS." % (row.slug, row.field_type))
+        # Copy so that per-field classes don't leak into the shared mappings
+        widget_attrs = dict(field_type.widget_attrs)
+
+        if row.label is not None:
+            field_kwargs['label'] = safe(row.label)
+        if row.help_text is not None:
+            field_kwargs['help_text'] = safe(row.help_text)
+        if row.initial is not None:
+            field_kwargs['initial'] = row.initial
+        field_kwargs['required'] = row.required
 
         additional_field_kwargs = {}
-        if row.has_key('arguments') and row['arguments'].strip():
+        if row.arguments and row.arguments.strip():
             # Parse any additional field arguments as JSON and include them in field_kwargs
-            temp_args = json.loads(str(row['arguments']))
+            temp_args = json.loads(str(row.arguments))
             for arg in temp_args:
                 additional_field_kwargs[str(arg)] = temp_args[arg]
 
+        # The upload size limit is enforced by the upload handler, not the field
+        max_upload_size = None
+        if row.field_type in UPLOAD_FIELDS:
+            max_upload_size, additional_field_kwargs = pop_upload_limit(additional_field_kwargs)
+
         # Update the field arguments with the "additional arguments" JSON in the DB
         field_kwargs.update(additional_field_kwargs)
 
         # Get the choices for single and multiple choice fields
-        if row['field_type'] in CHOICE_FIELDS:
+        if row.field_type in CHOICE_FIELDS:
             choices = ()
 
             # We add a separator for select boxes
-            if row['field_type'] == 'Select':
+            if row.field_type == 'Select':
                 choices += ('', '--------'),
 
-            choices_func = getattr(choices_module, row['slug'].replace('-', '_'), None)
+            choices_func = getattr(choices_module, row.slug.replace('-', '_'), None)
 
-            # Populate our choices tuple
+            # Populate our choices tuple.  Choice functions are called when the
+            # form is instantiated, since the class itself may be cached.
             if choices_func:
-                choices += choices_func()
+                choice_providers[form_field_name] = (get_choice_provider(choices_func), choices)
             else:
-                choices += choices_dict[row['id']]
+                choices += tuple((value, safe(title)) for value, title in row.choices)
             field_kwargs['choices'] = choices
 
-            if row['field_type'] in MULTI_CHOICE_FIELDS:
+            if row.field_type in MULTI_CHOICE_FIELDS:
                 # Get all of the specified default selected values (as a list, even if one element)
                 field_kwargs['initial'] = (
                     field_kwargs['initial'].split(',')
@@ -793,26 +1007,23 @@ def _create_form(form, title=None, description=None):
                 field_kwargs['initial'] = ''.join(field_kwargs['initial'])
 
         # Add our additional css classes
-        if row.has_key('classes'):
+        if row.classes is not None:
             existing_widget_attrs = widget_attrs.get('class', '')
-            widget_attrs['class'] = existing_widget_attrs + ' '.join(row['classes'].split(',')).strip()
+            widget_attrs['class'] = existing_widget_attrs + ' '.join(row.classes.split(',')).strip()
             # Add bindings css class
             #FIXME: Should we be adding this on the widget or field?
-            if row['field_type'] != 'HiddenInput':
+            if row.field_type != 'HiddenInput':
                 if not 'dataform-field' in widget_attrs['class']:
                     widget_attrs['class'] += " dataform-field"
 
-        # Instantiate the widget that this field will use
+        # Add this field, including its widget and any additional arguments
+        # (initial, label, required, help_text, etc)
         # TODO: Possibly create logic that passes submissionid to file upload widget to handle file
         # paths without enforcing a redirect.
-        if field_map.has_key('widget'):
-            field_kwargs['widget'] = field_map['widget'](attrs=widget_attrs, **field_map['widget_kwargs'])
-
-        # Add this field, including any widgets and additional arguments
-        # (initial, label, required, help_text, etc)
-        final_field = field_map['class'](**field_kwargs)
-        final_field.is_checkbox = (row['field_type'] == 'CheckboxInput')
-        final_field.dataform_key = row['field_type']
+        final_field = field_type.build(widget_attrs=widget_attrs, **field_kwargs)
+        final_field.is_checkbox = (row.field_type == 'CheckboxInput')
+        final_field.dataform_key = row.field_type
+        final_field.max_upload_size = min(max_upload_size or MAX_UPLOAD_SIZE, MAX_UPLOAD_SIZE)
         final_fields[form_field_name] = final_field
 
     # Grab the dynamic validation function from validation.py
@@ -826,16 +1037,23 @@ def _create_form(form, title=None, description=None):
                 if attr_name.startswith('clean'):
                     attrs[attr_name] = getattr(validate, attr_name)
 
+            # Django looks for clean_form-name__field-name, so give the
+            # clean_field_name functions those names as well
+            prefix = len(_field_for_form(name='', form=slug))
+            for form_field_name in final_fields:
+                validation_func_name = 'clean_%s' % form_field_name[prefix:].replace('-', '_')
+                if validation_func_name in attrs:
+                    attrs['clean_%s' % form_field_name] = attrs[validation_func_name]
+
     # Return a class object of this form with all attributes
     DataFormClass = type(form_class_title, (BaseDataForm,), attrs)
 
-    # Also return the querysets so that they can be re-used
-    query_data = {
-        'dataform_query' : form,
-        'choice_query' : choices_qs,
-        'field_query' : fields_qs,
-        'fields_list' : fields,
-    }
+    # Also return the schema so that it can be re-used
+    query_data = QueryData({
+        'dataform_query' : schema.get_data_form(),
+        'schema' : schema,
+        'fields_list' : schema.fields,
+    })
 
     return DataFormClass, query_data
 
@@ -874,7 +1092,7 @@ def get_answers(submission, for_form=False, form=None, field=None):
         the form's slug. This can be annoying when just wanting to inspect
         answers from a submission, so it is set to False by default, but needs
         to be True when used the keys will be used as form element names.
-    :param form: Only get the answer for a specific form. Also accepts a data_form slug.
+    :param form: Only get the answer for a specific form. Also accepts a data_form slug, or a list of forms.
     :param field: Only get the answer for a specific field. Also accepts a list of field_slugs.
     :rtype: a dictionary of answers.
     """
@@ -893,66 +1111,143 @@ def get_answers(submission, for_form=False, form=None, field=None):
         raise AttributeError('Submission %s is not a valid submission object.' % submission)
 
     submission_id = submission.id
-
-    if form:
-        if isinstance(form, str) or isinstance(form, unicode):
-            form = DataForm.objects.get(slug=form).id
-        elif isinstance(form, DataForm):
-            form = form.id
-    else:
-        form = None
-
-    # Think in terms of always handling requests for multiple field_slugs, to keep DRY
-    field_slugs = field
-
-    # Rid ourselves of ORM objects and just use field slug strings
-    if field_slugs:
-        # Convert to list of not one
-        if not isinstance(field_slugs, (list, tuple)):
-            field_slugs = [field_slugs]
-
-        field_slugs = [(field.slug if isinstance(field, Field) else field) for field in field_slugs]
-        # Transform prepended slugs: personal-information__some-field --> some-field
-        field_slugs = [
-            (_field_for_db(name=slug) if FIELD_DELIMITER in slug else slug)
-            for slug in field_slugs
-        ]
-    else:
-        field_slugs = None
+    form = _get_form_id(form)
+    field_slugs = _get_field_slugs(field)
 
     # Populate the query into answers
-    answers = Answer.objects.get_answer_data(submission_id, field_slugs, form)
+    answers = Answer.objects.iter_answer_data([submission_id], field_slugs, form)
 
     # For every answer, do some magic and get it into our data dictionary
     for answer in answers:
+        _add_answer(data, answer, for_form)
 
-        # TODO: Refactor the answer field name to be globally unique (so
-        # that a field can be in multiple forms in the same POST)
-        if for_form:
-            #answer_key = _field_for_form(name=str(answer['field_slug']), form=answer['dataform_slug'])
-            answer_key = _field_for_form(name=answer.field_slug, form=answer.data_form_slug)
+    # Return the answers and the submission back
+    return dict(data)
+
+
+def get_answers_many(submissions, form=None, fields=None, for_form=False):
+    """
+    Get the answers for many submissions at once.  Submission slugs are
+    resolved in bulk and the answers are read in one query (chunked to
+    the database's parameter limit).
+
+    :param submissions: a list of Submission objects or slugs
+    :param form: Only get the answers for a specific form. Also accepts a data_form slug.
+    :param fields: Only get the answers for specific fields. Also accepts a list of field_slugs.
+    :param for_form: whether or not to prepend the form's slug to every field slug,
+        as with get_answers.
+    :rtype: a dictionary of answer dictionaries (as returned by get_answers),
+        keyed on submission slug.
+    """
+
+    submission_slugs = {}
+    slugs = []
+
+    for submission in submissions:
+        # Slightly evil, do type checking to see if submission is a Submission object or string
+        if isinstance(submission, str) or isinstance(submission, unicode):
+            slugs.append(submission)
+        elif isinstance(submission, Submission):
+            submission_slugs[submission.id] = submission.slug
         else:
-            answer_key = answer.field_slug
+            raise AttributeError('Submission %s is not a valid submission object.' % submission)
+
+    # Unknown slugs just get no answers, like get_answers
+    results = dict((slug, defaultdict(list)) for slug in slugs)
+    results.update((slug, defaultdict(list)) for slug in submission_slugs.values())
+
+    for chunk in chunked(slugs, max_query_params(connection)):
+        submission_slugs.update(Submission.objects.filter(slug__in=chunk).values_list('id', 'slug'))
+
+    if submission_slugs:
+        answers = Answer.objects.iter_answer_data(submission_slugs.keys(),
+            _get_field_slugs(fields), _get_form_id(form))
+
+        for answer in answers:
+            _add_answer(results[submission_slugs[answer['submission_id']]], answer, for_form)
+
+    return dict((slug, dict(data)) for slug, data in results.items())
+
+
+def _get_form_id(form):
+    """
+    :param form: a DataForm object, slug or id, or a list of them
+    :return: the id of the form (or a list of ids), or None when no form is given
+    """
+
+    if not form:
+        return None
+    if isinstance(form, (list, tuple)):
+        return [_get_form_id(f) for f in form]
+    if isinstance(form, str) or isinstance(form, unicode):
+        return DataForm.objects.get(slug=form).id
+    elif isinstance(form, DataForm):
+        return form.id
+    return form
+
+
+def _get_field_slugs(field):
+    """
+    Think in terms of always handling requests for multiple field_slugs, to keep DRY
+
+    :param field: a Field object or slug, or a list of them
+    :return: a list of field slugs, or None when no fields are given
+    """
+
+    if not field:
+        return None
 
-        # Pass the answer to the Dict Key
-        if answer.choice_id:
+    # Convert to list of not one
+    if not isinstance(field, (list, tuple)):
+        field = [field]
 
-            # TODO: Need to check to make sure all Fields are covered.
-            # Are there more then string or list?
+    # Rid ourselves of ORM objects and just use field slug strings
+    field_slugs = [(f.slug if isinstance(f, Field) else f) for f in field]
+
+    # Transform prepended slugs: personal-information__some-field --> some-field
+    return [
+        (_field_for_db(name=slug) if FIELD_DELIMITER in slug else slug)
+        for slug in field_slugs
+    ]
+
+
+def _add_answer(data, answer, for_form=False):
+    """
+    Put an answer from AnswerManager.iter_answer_data into an answer dictionary.
+
+    :param data: a defaultdict(list) of answers
+    """
+
+    # TODO: Refactor the answer field name to be globally unique (so
+    # that a field can be in multiple forms in the same POST)
+    if for_form:
+        answer_key = _field_for_form(name=answer['field_slug'], form=answer['data_form_slug'])
+    else:
+        answer_key = answer['field_slug']
+
+    # Pass the answer to the Dict Key
+    if answer['choice_id']:
+        choice_values = answer['choice_value']
+        if not isinstance(choice_values, list):
+            choice_values = [choice_values]
+
+        # TODO: Need to check to make sure all Fields are covered.
+        # Are there more then string or list?
+        for choice_value in choice_values:
             if data[answer_key]:
                 if not isinstance(data[answer_key], list):
                     data[answer_key] = [data[answer_key]]
-                data[answer_key].append(answer.choice_value)
+                data[answer_key].append(choice_value)
             else:
-                if answer.field_type in MULTI_CHOICE_FIELDS:
-                    data[answer_key] = [answer.choice_value]
+                if answer['field_type'] in MULTI_CHOICE_FIELDS:
+                    data[answer_key] = [choice_value]
                 else:
-                    data[answer_key] = answer.choice_value
-        else:
-            data[answer_key] = answer.value
-
-    # Return the answers and the submission back
-    return dict(data)
+                    data[answer_key] = choice_value
+    elif answer['field_type'] in MULTI_CHOICE_FIELDS:
+        # Multiple choices are saved comma delimited in the answer value
+        data[answer_key] = answer['value'].split(',') if answer['value'] else []
+    else:
+        data[answer_key] = answer['value']
 
 
 def get_form_media():
@@ -966,42 +1261,23 @@ def get_bindings(form):
     :return: list of dictionaries, where each dictionary is a single binding.
     """
 
-    if isinstance(form, str) or isinstance(form, unicode):
-        form = DataForm.objects.get(slug=form)
-
-    bindings = list(Binding.objects.filter(data_form=form).values(
-        'id', 'action', 'field', 'field__slug', 'value', 'operator',
-        'data_form', 'data_form__slug', 'field_choice', 'field_choice__field__slug',
-        'field_choice__choice__value', 'true_field', 'true_choice',
-        'false_field', 'false_choice', 'function', 'additional_rules'))
-    bindings_list = []
-
-    for binding in bindings:
+    return get_schema(form).get_bindings()
 
-        #if binding['field__slug']:
-        binding['selector'] = _field_for_form(name=binding['field__slug'], form=form.slug)
-#        else:
-#            binding['selector'] = _field_for_form(
-#                name='%s___%s' % (binding['field_choice__field__slug'], binding['field_choice__choice__value']),
-#                form=form.slug)
 
-        for key, value in binding.iteritems():
-            if key in ['true_field', 'true_choice', 'false_field', 'false_choice', 'additional_rules']:
-                if value:
-                    binding[key] = binding[key].split(',')
-
-                    # Additional split on choice field and its value
-                    if key != 'additional_rules':
-                        for index, value in enumerate(binding[key]):
-                            binding[key][index] = binding[key][index].split('___')
-
-
-            if not value:
-                binding[key] = None
+def _get_bindings_reference(schema):
+    """
+    The value of the hidden bindings field: the url of the form's bindings,
+    or the bindings themselves if there are none or dataforms.urls isn't
+    included.
+    """
 
-        bindings_list.append(binding)
+    if not schema.bindings:
+        return schema.bindings_html
 
-    return bindings_list
+    try:
+        return reverse('dataforms_bindings', kwargs={'form': schema.slug, 'bindings_hash': schema.bindings_hash})
+    except NoReverseMatch:
+        return schema.bindings_html
 
 
 def create_form_class_title(slug):
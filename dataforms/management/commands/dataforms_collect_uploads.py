@@ -0,0 +1,30 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from dataforms.app_settings import UPLOAD_GC_GRACE, CHUNKED_UPLOAD_EXPIRY
+from dataforms.utils.chunked import expire_upload_sessions
+from dataforms.utils.file import collect_upload_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete content addressed uploads that no answer refers to, and stale resumable uploads.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help='List the files that would be deleted, without deleting them.'),
+        make_option('--grace', dest='grace', type='int', default=UPLOAD_GC_GRACE,
+            help='Keep files modified in the last GRACE seconds. Defaults to %d.' % UPLOAD_GC_GRACE),
+        make_option('--expiry', dest='expiry', type='int', default=CHUNKED_UPLOAD_EXPIRY,
+            help='Delete resumable uploads idle for EXPIRY seconds. Defaults to %d.' % CHUNKED_UPLOAD_EXPIRY),
+    )
+
+    def handle(self, *args, **options):
+        deleted = collect_upload_garbage(grace=options['grace'], dry_run=options['dry_run'])
+        expired = expire_upload_sessions(max_age=options['expiry'], dry_run=options['dry_run'])
+
+        for path in deleted:
+            self.stdout.write('%s\n' % path)
+
+        if int(options.get('verbosity', 1)) > 0:
+            action = 'Would delete' if options['dry_run'] else 'Deleted'
+            self.stdout.write('%s %d file(s).\n' % (action, len(deleted)))
+            self.stdout.write('%s %d resumable upload(s).\n' % (action, len(expired)))
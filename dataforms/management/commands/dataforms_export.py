@@ -0,0 +1,45 @@
+import sys
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from dataforms.export import export_answers, EXPORT_FORMATS
+from dataforms.models import DataForm, Collection
+
+
+class Command(BaseCommand):
+    args = '<form or collection slug>'
+    help = 'Export every submission to a DataForm (or Collection) as CSV or JSON lines.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--collection', action='store_true', dest='collection', default=False,
+            help='Export a collection rather than a single form.'),
+        make_option('--format', dest='format', default='csv',
+            help='Export format: %s. Defaults to csv.' % ', '.join(EXPORT_FORMATS)),
+        make_option('--output', dest='output', default=None,
+            help='File to write to. Defaults to stdout.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Give the slug of one form or collection to export.')
+
+        if options['format'] not in EXPORT_FORMATS:
+            raise CommandError('Format must be one of %s.' % ', '.join(EXPORT_FORMATS))
+
+        if options['collection']:
+            kwargs = {'collection': args[0]}
+        else:
+            kwargs = {'form': args[0]}
+
+        try:
+            lines = export_answers(format=options['format'], **kwargs)
+        except (DataForm.DoesNotExist, Collection.DoesNotExist):
+            raise CommandError('%s does not exist.' % args[0])
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout
+
+        try:
+            for line in lines:
+                output.write(line)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,148 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Removing duplicate answers, keeping the newest one, so the unique index can be built.
+        # The derived tables keep MySQL from refusing to delete from a table it selects from.
+        db.execute('''
+            DELETE FROM dataforms_answerchoice WHERE answer_id NOT IN (
+                SELECT keep.id FROM (
+                    SELECT MAX(id) AS id FROM dataforms_answer
+                    GROUP BY submission_id, data_form_id, field_id
+                ) keep
+            )
+        ''')
+        db.execute('''
+            DELETE FROM dataforms_answer WHERE id NOT IN (
+                SELECT keep.id FROM (
+                    SELECT MAX(id) AS id FROM dataforms_answer
+                    GROUP BY submission_id, data_form_id, field_id
+                ) keep
+            )
+        ''')
+
+        # Adding unique constraint on 'Answer', fields ['submission', 'data_form', 'field']
+        db.create_unique('dataforms_answer', ['submission_id', 'data_form_id', 'field_id'])
+
+
+    def backwards(self, orm):
+        
+        # Removing unique constraint on 'Answer', fields ['submission', 'data_form', 'field']
+        db.delete_unique('dataforms_answer', ['submission_id', 'data_form_id', 'field_id'])
+
+
+    models = {
+        'dataforms.answer': {
+            'Meta': {'unique_together': "(('submission', 'data_form', 'field'),)", 'object_name': 'Answer'},
+            'choice': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'to': "orm['dataforms.Choice']", 'null': 'True', 'through': "orm['dataforms.AnswerChoice']", 'blank': 'True'}),
+            'data_form': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.DataForm']"}),
+            'field': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Field']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'submission': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Submission']"}),
+            'value': ('django.db.models.fields.TextField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'dataforms.answerchoice': {
+            'Meta': {'object_name': 'AnswerChoice'},
+            'answer': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Answer']"}),
+            'choice': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Choice']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        },
+        'dataforms.binding': {
+            'Meta': {'object_name': 'Binding'},
+            'action': ('django.db.models.fields.CharField', [], {'default': "'show-hide'", 'max_length': '255'}),
+            'additional_rules': ('django.db.models.fields.CommaSeparatedIntegerField', [], {'max_length': '200', 'blank': 'True'}),
+            'data_form': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.DataForm']"}),
+            'false_choice': ('dataforms.fields.SeparatedValuesField', [], {'blank': 'True'}),
+            'false_field': ('dataforms.fields.SeparatedValuesField', [], {'blank': 'True'}),
+            'field': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Field']"}),
+            'field_choice': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.FieldChoice']", 'null': 'True', 'blank': 'True'}),
+            'function': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'operator': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'true_choice': ('dataforms.fields.SeparatedValuesField', [], {'blank': 'True'}),
+            'true_field': ('dataforms.fields.SeparatedValuesField', [], {'blank': 'True'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'})
+        },
+        'dataforms.choice': {
+            'Meta': {'ordering': "['title']", 'object_name': 'Choice'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        'dataforms.collection': {
+            'Meta': {'object_name': 'Collection'},
+            'data_forms': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['dataforms.DataForm']", 'through': "orm['dataforms.CollectionDataForm']", 'symmetrical': 'False'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        'dataforms.collectiondataform': {
+            'Meta': {'ordering': "['order']", 'unique_together': "(('collection', 'data_form', 'section'),)", 'object_name': 'CollectionDataForm'},
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Collection']", 'null': 'True'}),
+            'data_form': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.DataForm']", 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'section': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Section']", 'null': 'True', 'blank': 'True'})
+        },
+        'dataforms.dataform': {
+            'Meta': {'ordering': "['title']", 'object_name': 'DataForm'},
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'fields': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['dataforms.Field']", 'through': "orm['dataforms.DataFormField']", 'symmetrical': 'False'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'javascript_include': ('django.db.models.fields.CharField', [], {'max_length': '500', 'blank': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        'dataforms.dataformfield': {
+            'Meta': {'ordering': "['order']", 'unique_together': "(('data_form', 'field'),)", 'object_name': 'DataFormField'},
+            'data_form': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.DataForm']", 'null': 'True'}),
+            'field': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Field']", 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'dataforms.field': {
+            'Meta': {'ordering': "['slug']", 'object_name': 'Field'},
+            'arguments': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'choices': ('django.db.models.fields.related.ManyToManyField', [], {'to': "orm['dataforms.Choice']", 'through': "orm['dataforms.FieldChoice']", 'symmetrical': 'False'}),
+            'classes': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'field_type': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'help_text': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'initial': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'label': ('django.db.models.fields.TextField', [], {}),
+            'required': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'}),
+            'visible': ('django.db.models.fields.BooleanField', [], {'default': 'True'})
+        },
+        'dataforms.fieldchoice': {
+            'Meta': {'ordering': "['field', 'order']", 'unique_together': "(('field', 'choice'),)", 'object_name': 'FieldChoice'},
+            'choice': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Choice']", 'null': 'True'}),
+            'field': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Field']", 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'order': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'dataforms.section': {
+            'Meta': {'ordering': "['title']", 'object_name': 'Section'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        'dataforms.submission': {
+            'Meta': {'object_name': 'Submission'},
+            'collection': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['dataforms.Collection']", 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_modified': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'unique': 'True', 'max_length': '255', 'db_index': 'True'})
+        }
+    }
+
+    complete_apps = ['dataforms']
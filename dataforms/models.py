@@ -1,11 +1,12 @@
 from validators import reserved_delimiter
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connection, models
 from django.db.models.fields import CommaSeparatedIntegerField
 from django.utils.translation import ugettext_lazy as _
 from fields import SeparatedValuesField
-from app_settings import FIELD_TYPE_CHOICES, BINDING_OPERATOR_CHOICES, \
-    BINDING_ACTION_CHOICES
+from utils.sql import chunked, iter_grouped, max_query_params
+from app_settings import BINDING_OPERATOR_CHOICES, BINDING_ACTION_CHOICES
+from registry import FIELD_TYPE_CHOICES
     
 
 class Collection(models.Model):
@@ -251,31 +252,76 @@ class Submission(models.Model):
 
 class AnswerManager(models.Manager):
 
-    def get_answer_data(self, submission_id, field_slugs=None, data_form_id=None):
-        
+    def _answer_sql(self, field_slugs=None, data_form_id=None):
+        """
+        The one answer query, joined to the answer's field, form and choices.
+        It reads every Answer column, so it also works with raw().
+
+        :param data_form_id: a DataForm id, or a list of them
+        :return: a tuple of (sql, params); the sql takes the submission id
+            placeholders through the remaining %s, so its own are doubled
+        """
+
         # When you need many to many, use raw()....its awesome!
         sql = '''
-            SELECT a.*, f.field_type, f.slug AS field_slug, 
-                d.slug AS data_form_slug, c.value as choice_value, ac.choice_id
-                     FROM dataforms_answer a 
+            SELECT a.id, a.submission_id, a.data_form_id, a.field_id, a.value,
+                f.field_type, f.slug AS field_slug, d.slug AS data_form_slug,
+                c.value AS choice_value, ac.choice_id
+                     FROM dataforms_answer a
                      LEFT JOIN dataforms_answerchoice ac ON a.id = ac.answer_id
                      LEFT JOIN dataforms_choice c ON ac.choice_id = c.id
                      INNER JOIN dataforms_field f ON a.field_id = f.id
-                     INNER JOIN dataforms_dataform d ON a.data_form_id = d.id 
-            WHERE a.submission_id = %s
+                     INNER JOIN dataforms_dataform d ON a.data_form_id = d.id
+            WHERE a.submission_id IN (%s)
         '''
-        
-        params = [submission_id]
-        
-        if data_form_id:
-            sql += 'AND a.data_form_id = %s '
+
+        params = []
+
+        if isinstance(data_form_id, (list, tuple)):
+            sql += 'AND a.data_form_id IN (%s) ' % ','.join(["%%s"]*len(data_form_id))
+            params += data_form_id
+        elif data_form_id:
+            sql += 'AND a.data_form_id = %%s '
             params.append(data_form_id)
-            
+
         if field_slugs:
-            sql += 'AND f.slug IN (%s)' % ','.join(["%s"]*len(field_slugs))
+            sql += 'AND f.slug IN (%s) ' % ','.join(["%%s"]*len(field_slugs))
             params += field_slugs
 
-        return self.raw(sql, tuple(params))
+        sql += 'ORDER BY a.submission_id, a.id, ac.id'
+
+        return sql, params
+
+    def get_answer_data(self, submission_id, field_slugs=None, data_form_id=None):
+        """
+        The answers of a submission as raw() Answer objects, a row per
+        AnswerChoice.
+
+        Kept for backwards compatibility, see iter_answer_data.
+        """
+
+        sql, params = self._answer_sql(field_slugs, data_form_id)
+        return self.raw(sql % '%s', tuple([submission_id] + params))
+
+    def iter_answer_data(self, submission_ids, field_slugs=None, data_form_id=None):
+        """
+        Yields a dictionary per answer of many submissions, read from the
+        cursor a chunk at a time.  The submissions are read in as few queries
+        as the database's parameter limit allows.  The choices of answers saved
+        as AnswerChoice rows are merged into lists on choice_value and
+        choice_id.  Answers come in submission order.
+
+        :param data_form_id: a DataForm id, or a list of them
+        """
+
+        sql, params = self._answer_sql(field_slugs, data_form_id)
+        chunk_size = max(1, max_query_params(connection) - len(params))
+
+        for chunk in chunked(submission_ids, chunk_size):
+            cursor = connection.cursor()
+            cursor.execute(sql % ','.join(["%s"]*len(chunk)), list(chunk) + params)
+            for answer in iter_grouped(cursor):
+                yield answer
 
 
 class Answer(models.Model):
@@ -294,11 +340,48 @@ class Answer(models.Model):
 
     objects = AnswerManager()
 
+    class Meta:
+        # Also the index used to look up the answers of a submission
+        unique_together = ('submission', 'data_form', 'field')
+
+
+class AnswerChoiceManager(models.Manager):
+
+    def delete_for_submission(self, submission_id, data_form_id, field_ids=None):
+        """
+        Delete the choices of the answers to a form in a submission, in one query.
+        Nothing is committed, run it in a UnitOfWork or a managed transaction.
+
+        :param field_ids: only delete the choices of answers to these fields
+        """
+
+        sql = '''
+            DELETE FROM dataforms_answerchoice
+            WHERE answer_id IN (
+                SELECT a.id FROM dataforms_answer a
+                WHERE a.submission_id = %s AND a.data_form_id = %s
+        '''
+        params = [submission_id, data_form_id]
+
+        if field_ids:
+            sql += 'AND a.field_id IN (%s)' % ','.join(["%s"]*len(field_ids))
+            params += list(field_ids)
+
+        sql += ')'
+
+        connection.cursor().execute(sql, params)
+
 
 class AnswerChoice(models.Model):
     choice = models.ForeignKey('Choice')
     answer = models.ForeignKey('Answer')
+
+    objects = AnswerChoiceManager()
     
     def __unicode__(self):
         return self.choice.title
 
+
+
+# Connect the cache invalidation signals once all models are defined
+import signals
@@ -0,0 +1,120 @@
+"""
+Dataforms Field Type Registry
+=============================
+
+Resolves DATAFORMS_FIELD_MAPPINGS into field and widget classes once, when
+the app is loaded, so that a broken mapping fails at startup rather than on
+the first request that uses it.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.datastructures import SortedDict
+from django.utils.importlib import import_module
+from app_settings import FIELD_MAPPINGS
+
+
+class FieldType(object):
+    """
+    A resolved field mapping.  Calling build() creates a new form field.
+    """
+
+    def __init__(self, key, field_class, widget_class=None, widget_kwargs=None, widget_attrs=None):
+        self.key = key
+        self.field_class = field_class
+        self.widget_class = widget_class
+        self.widget_kwargs = widget_kwargs or {}
+        self.widget_attrs = widget_attrs or {}
+
+    def build(self, widget_attrs=None, **field_kwargs):
+        """
+        Instantiate a form field of this type.
+
+        :param widget_attrs: attrs for the widget; defaults to the mapping's widget_attrs.
+        :param field_kwargs: keyword arguments for the field class.
+        """
+
+        if self.widget_class:
+            attrs = self.widget_attrs if widget_attrs is None else widget_attrs
+            field_kwargs['widget'] = self.widget_class(attrs=dict(attrs), **self.widget_kwargs)
+
+        return self.field_class(**field_kwargs)
+
+    def __repr__(self):
+        return '<FieldType: %s>' % self.key
+
+
+class FieldTypeRegistry(object):
+    """
+    The field types available to dataforms, keyed on the field type key
+    stored in Field.field_type.
+    """
+
+    def __init__(self, mappings=None):
+        self._types = SortedDict()
+
+        for key in sorted(mappings or {}):
+            self.register(key, mappings[key])
+
+    def register(self, key, mapping):
+        """
+        Add a field type from a FIELD_MAPPINGS style dictionary.  Class and
+        widget paths are imported immediately.
+        """
+
+        if not mapping.has_key('class'):
+            raise ImproperlyConfigured("Dataforms field mapping '%s' has no 'class'." % key)
+
+        self._types[key] = FieldType(
+            key=key,
+            field_class=_resolve(key, mapping['class']),
+            widget_class=_resolve(key, mapping['widget']) if mapping.get('widget') else None,
+            widget_kwargs=dict(mapping.get('widget_kwargs', {})),
+            widget_attrs=dict(mapping.get('widget_attrs', {})),
+        )
+
+        return self._types[key]
+
+    def get(self, key, default=None):
+        return self._types.get(key, default)
+
+    def keys(self):
+        return self._types.keys()
+
+    def choices(self):
+        """
+        :return: a choices tuple of every field type key
+        """
+        return tuple([(key, key) for key in self._types])
+
+    def __getitem__(self, key):
+        return self._types[key]
+
+    def __contains__(self, key):
+        return key in self._types
+
+    def __iter__(self):
+        return iter(self._types)
+
+    def __len__(self):
+        return len(self._types)
+
+
+def _resolve(key, value):
+    """
+    Turn a dotted path string into the object it names.  Anything that isn't
+    a string is assumed to already be a class.
+    """
+
+    if not isinstance(value, basestring):
+        return value
+
+    module_name, _, class_name = value.rpartition('.')
+
+    try:
+        return getattr(import_module(module_name), class_name)
+    except (ImportError, AttributeError, ValueError), e:
+        raise ImproperlyConfigured("Dataforms field mapping '%s' could not import '%s': %s" % (key, value, e))
+
+
+field_types = FieldTypeRegistry(FIELD_MAPPINGS)
+
+FIELD_TYPE_CHOICES = field_types.choices()
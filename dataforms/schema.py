@@ -0,0 +1,457 @@
+"""
+Dataforms Schema
+================
+
+Loads the complete definition of a DataForm (its fields in order, the choices
+of every field and its bindings) in a fixed number of queries, and returns it
+as an immutable object that can be shared between requests and processes.
+
+Bindings are processed for the JavaScript when they are saved, and kept in
+the Django cache per DataForm, so reloading a schema usually skips them.
+"""
+from collections import defaultdict, namedtuple
+from copy import deepcopy
+from django.db import connection
+from django.utils import simplejson as json
+from django.utils.hashcompat import md5_constructor
+from django.utils.html import escape
+from models import DataForm, Field, Binding
+from app_settings import FIELD_DELIMITER, FORM_CACHE, FORM_CACHE_SHARED
+from utils.cache import cache, get_schema_generation
+from utils.sql import FETCH_SIZE
+
+
+FieldSchema = namedtuple('FieldSchema', 'id slug field_type label help_text '
+    'initial classes arguments required choices')
+
+
+class BindingPayload(namedtuple('BindingPayload', 'bindings json html hash')):
+    """
+    The bindings of a single DataForm, processed for the JavaScript.
+
+    :attr bindings: a tuple of binding dictionaries.
+    :attr json: the bindings encoded as JSON.
+    :attr html: the JSON escaped for the hidden bindings field.
+    :attr hash: the MD5 of the JSON, which changes whenever the bindings do.
+    """
+    __slots__ = ()
+
+
+class FormSchema(namedtuple('FormSchema', 'id slug title description '
+    'javascript_include visible fields bindings bindings_json bindings_html bindings_hash')):
+    """
+    The definition of a single DataForm.
+
+    :attr visible: whether the DataForm is visible.  Only forms given as
+        DataForm objects can be hidden; slugs only ever find visible ones.
+
+    :attr fields: a tuple of FieldSchema, in form order.
+    :attr bindings: a tuple of binding dictionaries, as built for the JavaScript.
+        Use get_bindings() for a copy that is safe to modify.
+    :attr bindings_json: the bindings, already encoded as JSON.
+    :attr bindings_html: the JSON, already escaped for the hidden bindings field.
+    :attr bindings_hash: the MD5 of the JSON.
+    """
+    __slots__ = ()
+
+    def get_data_form(self):
+        """
+        :return: an unsaved DataForm instance carrying the schema's values.
+        """
+        return DataForm(id=self.id, slug=self.slug, title=self.title,
+            description=self.description, javascript_include=self.javascript_include,
+            visible=self.visible)
+
+    def get_bindings(self):
+        return deepcopy(list(self.bindings))
+
+
+# Process wide schema cache, keyed on DataForm slug
+_schema_cache = {}
+
+# Every cached BindingPayload is tagged with this, see clear_binding_cache
+BINDINGS_CACHE_TAG = 'dataforms:bindings'
+
+
+def get_schema(form):
+    """
+    Returns the schema for a form, from the cache if the form definition has
+    not changed since it was loaded.
+
+    :param form: a DataForm slug or object
+    """
+
+    if not FORM_CACHE:
+        return load_schema(form)
+
+    slug = form.slug if isinstance(form, DataForm) else form
+    generation = get_schema_generation()
+
+    cached = _schema_cache.get(slug)
+    if cached and cached[0] == generation:
+        return check_visible(form, cached[1])
+
+    schema = None
+    if FORM_CACHE_SHARED:
+        shared_key = _shared_schema_key(slug, generation)
+        schema = cache.get(shared_key)
+
+    if schema is None:
+        schema = load_schema(form)
+        if FORM_CACHE_SHARED:
+            cache.set(shared_key, schema)
+
+    _schema_cache[slug] = (generation, schema)
+    return check_visible(form, schema)
+
+
+def check_visible(form, schema):
+    """
+    Refuse a hidden form's schema to callers who asked for it by slug.  The
+    caches are keyed on slug, and a hidden form may have been loaded from
+    a DataForm object.
+
+    :param form: the DataForm slug or object the schema was asked for by
+    :return: the schema
+    """
+
+    if not schema.visible and not isinstance(form, DataForm):
+        raise DataForm.DoesNotExist('DataForm %s does not exist. Make sure the slug name is correct and the form is visible.' % form)
+    return schema
+
+
+def get_schemas(forms):
+    """
+    Returns the schemas for many forms at once.  Schemas that are not cached
+    are loaded together by load_schemas, so the number of queries doesn't
+    grow with the number of forms.
+
+    :param forms: a list of DataForm slugs or objects
+    :return: a dictionary of FormSchema, keyed on DataForm slug
+    """
+
+    if not FORM_CACHE:
+        return load_schemas(forms)
+
+    generation = get_schema_generation()
+    schemas = {}
+    missing = []
+
+    for form in forms:
+        slug = form.slug if isinstance(form, DataForm) else form
+        cached = _schema_cache.get(slug)
+        if cached and cached[0] == generation:
+            schemas[slug] = cached[1]
+        elif FORM_CACHE_SHARED:
+            schema = cache.get(_shared_schema_key(slug, generation))
+            if schema is None:
+                missing.append(form)
+            else:
+                schemas[slug] = schema
+        else:
+            missing.append(form)
+
+    if missing:
+        loaded = load_schemas(missing)
+        for slug, schema in loaded.iteritems():
+            if FORM_CACHE_SHARED:
+                cache.set(_shared_schema_key(slug, generation), schema)
+        schemas.update(loaded)
+
+    for slug, schema in schemas.iteritems():
+        _schema_cache[slug] = (generation, schema)
+
+    for form in forms:
+        if not isinstance(form, DataForm):
+            check_visible(form, schemas[form])
+
+    return schemas
+
+
+def clear_schema_cache():
+    """
+    Throw away every schema loaded in this process.
+    """
+    _schema_cache.clear()
+
+
+def load_schema(form):
+    """
+    Loads the schema for a form from the database.  This costs three queries
+    when given a slug (DataForm, fields with their choices, bindings), and
+    two when given a DataForm object.  Bindings already in the cache cost
+    nothing.
+
+    :param form: a DataForm slug or object
+    :rtype: a FormSchema
+    """
+
+    # Slightly evil, do type checking to see if form is a DataForm object or string
+    if isinstance(form, str) or isinstance(form, unicode):
+        try:
+            form = DataForm.objects.get(visible=True, slug=form)
+        except DataForm.DoesNotExist:
+            raise DataForm.DoesNotExist('DataForm %s does not exist. Make sure the slug name is correct and the form is visible.' % form)
+
+    # Otherwise it should be a form model object, if not raise
+    elif not isinstance(form, DataForm):
+        raise AttributeError('Dataform %s is not a valid data form object.' % form)
+
+    return load_schemas([form])[form.slug]
+
+
+def load_schemas(forms):
+    """
+    Loads the schemas for many forms from the database, with the same three
+    queries as load_schema no matter how many forms there are.
+
+    :param forms: a list of DataForm slugs or objects
+    :return: a dictionary of FormSchema, keyed on DataForm slug
+    """
+
+    data_forms = []
+    slugs = []
+
+    for form in forms:
+        # Slightly evil, do type checking to see if form is a DataForm object or string
+        if isinstance(form, str) or isinstance(form, unicode):
+            slugs.append(form)
+        elif isinstance(form, DataForm):
+            data_forms.append(form)
+        else:
+            raise AttributeError('Dataform %s is not a valid data form object.' % form)
+
+    if slugs:
+        found = list(DataForm.objects.filter(visible=True, slug__in=slugs))
+        for slug in set(slugs) - set(data_form.slug for data_form in found):
+            raise DataForm.DoesNotExist('DataForm %s does not exist. Make sure the slug name is correct and the form is visible.' % slug)
+        data_forms.extend(found)
+
+    form_ids = list(set(data_form.id for data_form in data_forms))
+    fields = _load_fields(form_ids)
+    bindings = get_binding_payloads(data_forms)
+
+    schemas = {}
+
+    for data_form in data_forms:
+        if not fields.get(data_form.id):
+            raise Field.DoesNotExist('Field for %s do not exist. Make sure the slug name is correct and the fields are visible.' % data_form.slug)
+
+        payload = bindings[data_form.id]
+
+        schemas[data_form.slug] = FormSchema(
+            id=data_form.id,
+            slug=data_form.slug,
+            title=data_form.title,
+            description=data_form.description,
+            javascript_include=data_form.javascript_include,
+            visible=data_form.visible,
+            fields=fields[data_form.id],
+            bindings=payload.bindings,
+            bindings_json=payload.json,
+            bindings_html=payload.html,
+            bindings_hash=payload.hash,
+        )
+
+    return schemas
+
+
+def get_binding_payloads(data_forms):
+    """
+    Returns the processed bindings of forms, from the cache where they were
+    stored when their bindings were last saved.  Missing ones are loaded
+    together, in one query, and cached.
+
+    :param data_forms: a list of DataForm objects
+    :return: a dictionary of BindingPayload, keyed on DataForm id
+    """
+
+    if not FORM_CACHE:
+        return load_binding_payloads(data_forms)
+
+    keys = dict((_binding_payload_key(data_form.id), data_form.id) for data_form in data_forms)
+    payloads = dict((keys[key], payload) for key, payload in cache.get_many(keys.keys()).iteritems())
+
+    missing = [data_form for data_form in data_forms if data_form.id not in payloads]
+    if missing:
+        loaded = load_binding_payloads(missing)
+        for data_form_id, payload in loaded.iteritems():
+            cache.set_with_tags(_binding_payload_key(data_form_id), payload, [BINDINGS_CACHE_TAG])
+        payloads.update(loaded)
+
+    return payloads
+
+
+def load_binding_payloads(data_forms):
+    """
+    Loads and processes the bindings of forms from the database, in one query.
+
+    :param data_forms: a list of DataForm objects
+    :return: a dictionary of BindingPayload, keyed on DataForm id
+    """
+
+    bindings = _load_bindings(list(set(data_form.id for data_form in data_forms)))
+
+    return dict((data_form.id, _binding_payload(
+        [_binding_for_form(binding, data_form.slug) for binding in bindings.get(data_form.id, [])]
+    )) for data_form in data_forms)
+
+
+def refresh_binding_payload(data_form):
+    """
+    Rebuild the cached bindings of a form, after one of them changed.
+
+    :param data_form: a DataForm object
+    :rtype: a BindingPayload
+    """
+
+    payload = load_binding_payloads([data_form])[data_form.id]
+    if FORM_CACHE:
+        cache.set_with_tags(_binding_payload_key(data_form.id), payload, [BINDINGS_CACHE_TAG])
+    return payload
+
+
+def clear_binding_cache():
+    """
+    Throw away the cached bindings of every form.  Bindings refer to forms,
+    fields and choices by slug and value, so a change to any of those can
+    change them.
+    """
+    cache.cache_delete_by_tags([BINDINGS_CACHE_TAG])
+
+
+def _load_fields(data_form_ids):
+    """
+    Get the visible fields of forms in order, with their choices, in one query.
+
+    :return: a dictionary of FieldSchema tuples, keyed on DataForm id
+    """
+
+    if not data_form_ids:
+        return {}
+
+    qn = connection.ops.quote_name
+
+    # Each field comes back once per choice, so fold the choices up per field.
+    sql = '''
+        SELECT df.data_form_id, df.id, f.id, f.slug, f.field_type, f.label, f.help_text,
+            f.initial, f.classes, f.arguments, f.required,
+            c.value AS choice_value, c.title AS choice_title
+        FROM dataforms_dataformfield df
+        INNER JOIN dataforms_field f ON f.id = df.field_id
+        LEFT JOIN dataforms_fieldchoice fc ON fc.field_id = f.id
+        LEFT JOIN dataforms_choice c ON c.id = fc.choice_id
+        WHERE df.data_form_id IN (%(ids)s) AND f.visible = %%s
+        ORDER BY df.data_form_id, df.%(order)s, df.id, fc.%(order)s, fc.id
+    ''' % {'order': qn('order'), 'ids': ','.join(['%s'] * len(data_form_ids))}
+
+    cursor = connection.cursor()
+    cursor.execute(sql, list(data_form_ids) + [True])
+
+    fields = defaultdict(list)
+    current, choices = None, []
+
+    # Read a chunk at a time like iter_grouped, which can't be used here: it
+    # merges each column's distinct values apart, which would pull the value
+    # and title of choices sharing a title out of step.
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+
+        for row in rows:
+            # A new DataFormField mapping starts a new field
+            if current is None or current[1] != row[1]:
+                if current is not None:
+                    fields[current[0]].append(_field_schema(current[2:], choices))
+                current, choices = row, []
+            if row[11] is not None:
+                choices.append((row[11], row[12]))
+
+    if current is not None:
+        fields[current[0]].append(_field_schema(current[2:], choices))
+
+    return dict((data_form_id, tuple(rows)) for data_form_id, rows in fields.iteritems())
+
+
+def _field_schema(row, choices):
+    return FieldSchema(
+        id=row[0],
+        slug=row[1],
+        field_type=row[2],
+        label=row[3],
+        help_text=row[4],
+        initial=row[5],
+        classes=row[6],
+        arguments=row[7],
+        required=bool(row[8]),
+        choices=tuple(choices),
+    )
+
+
+def _load_bindings(data_form_ids):
+    """
+    Get the bindings for forms, in one query.
+
+    :return: a dictionary of binding value dictionaries, keyed on DataForm id
+    """
+
+    bindings = defaultdict(list)
+
+    if not data_form_ids:
+        return bindings
+
+    for binding in Binding.objects.filter(data_form__in=data_form_ids).values(
+            'id', 'action', 'field', 'field__slug', 'value', 'operator',
+            'data_form', 'data_form__slug', 'field_choice', 'field_choice__field__slug',
+            'field_choice__choice__value', 'true_field', 'true_choice',
+            'false_field', 'false_choice', 'function', 'additional_rules'):
+        bindings[binding['data_form']].append(binding)
+
+    return bindings
+
+
+def _binding_for_form(binding, slug):
+    """
+    Process a binding for use by the JavaScript.
+
+    :return: a dictionary for a single binding.
+    """
+
+    binding = dict(binding)
+    binding['selector'] = FIELD_DELIMITER.join([slug, binding['field__slug']])
+
+    for key, value in binding.iteritems():
+        if key in ['true_field', 'true_choice', 'false_field', 'false_choice', 'additional_rules']:
+            if value:
+                binding[key] = binding[key].split(',')
+
+                # Additional split on choice field and its value
+                if key != 'additional_rules':
+                    for index, value in enumerate(binding[key]):
+                        binding[key][index] = binding[key][index].split('___')
+
+
+        if not value:
+            binding[key] = None
+
+    return binding
+
+
+def _binding_payload(bindings):
+    # Sorted, so that the same bindings always have the same hash
+    encoded = json.dumps(bindings, sort_keys=True)
+    return BindingPayload(
+        bindings=tuple(bindings),
+        json=encoded,
+        html=escape(encoded),
+        hash=md5_constructor(encoded).hexdigest(),
+    )
+
+
+def _binding_payload_key(data_form_id):
+    return 'dataforms:bindings:%s' % data_form_id
+
+
+def _shared_schema_key(slug, generation):
+    return 'dataforms:schema:%s:%s' % (generation, slug)
@@ -0,0 +1,64 @@
+"""
+Dataforms Signals
+=================
+
+Keeps cached form definitions in sync with the database.
+"""
+from django.db.models.signals import post_save, post_delete
+from models import DataForm, DataFormField, Field, FieldChoice, Choice, Binding, Submission
+from schema import clear_binding_cache, refresh_binding_payload
+from utils.cache import clear_submission_versions, invalidate_schema_cache
+
+
+def invalidate_form_cache(sender, **kwargs):
+    """
+    Any change to a form definition makes every compiled form class stale.
+    Definitions rarely change, so a full invalidation is cheap enough.
+    """
+    invalidate_schema_cache()
+
+
+def invalidate_bindings(sender, **kwargs):
+    """
+    Bindings name forms, fields and choices by slug and value.
+    """
+    clear_binding_cache()
+
+
+def refresh_bindings(sender, instance, **kwargs):
+    """
+    Process a form's bindings once, when one of them is saved or deleted,
+    rather than whenever its schema is loaded.
+    """
+    try:
+        data_form = instance.data_form
+    except DataForm.DoesNotExist:
+        # Deleted along with its form
+        return
+    refresh_binding_payload(data_form)
+
+
+def invalidate_submission_version(sender, instance, **kwargs):
+    """
+    Cached forms of a submission are keyed on its last save.
+    """
+    clear_submission_versions([instance.slug])
+
+
+for model in (DataForm, DataFormField, Field, FieldChoice, Choice, Binding):
+    post_save.connect(invalidate_form_cache, sender=model,
+        dispatch_uid='dataforms_invalidate_%s_save' % model._meta.object_name.lower())
+    post_delete.connect(invalidate_form_cache, sender=model,
+        dispatch_uid='dataforms_invalidate_%s_delete' % model._meta.object_name.lower())
+
+for model in (DataForm, Field, FieldChoice, Choice):
+    post_save.connect(invalidate_bindings, sender=model,
+        dispatch_uid='dataforms_bindings_%s_save' % model._meta.object_name.lower())
+    post_delete.connect(invalidate_bindings, sender=model,
+        dispatch_uid='dataforms_bindings_%s_delete' % model._meta.object_name.lower())
+
+post_save.connect(refresh_bindings, sender=Binding, dispatch_uid='dataforms_bindings_binding_save')
+post_delete.connect(refresh_bindings, sender=Binding, dispatch_uid='dataforms_bindings_binding_delete')
+
+post_save.connect(invalidate_submission_version, sender=Submission, dispatch_uid='dataforms_submission_version_save')
+post_delete.connect(invalidate_submission_version, sender=Submission, dispatch_uid='dataforms_submission_version_delete')
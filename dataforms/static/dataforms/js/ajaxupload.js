@@ -211,6 +211,187 @@ var getXhr = function(){
 	}
 }();
 
+/**
+ * Whether the browser can send a file input's file in chunks
+ */
+function supportsChunks(input){
+	return !!(input.files && input.files.length && w.XMLHttpRequest && w.JSON &&
+		(w.Blob && (Blob.prototype.slice || Blob.prototype.webkitSlice || Blob.prototype.mozSlice)));
+}
+
+function sliceBlob(blob, start, end){
+	var slice = blob.slice || blob.webkitSlice || blob.mozSlice;
+	return slice.call(blob, start, end);
+}
+
+function getCookie(name){
+	var match = d.cookie.match(new RegExp('(^|;)\\s*' + name + '=([^;]*)'));
+	return match ? decodeURIComponent(match[2]) : null;
+}
+
+/**
+ * Local storage, where it is available, so that an upload can be resumed
+ * after the page is reloaded
+ */
+var store = function(){
+	try {
+		var test = '__ajaxupload__';
+		w.localStorage.setItem(test, test);
+		w.localStorage.removeItem(test);
+		return w.localStorage;
+	} catch (e){
+		var items = {};
+		return {
+			getItem: function(key){ return items.hasOwnProperty(key) ? items[key] : null; },
+			setItem: function(key, value){ items[key] = String(value); },
+			removeItem: function(key){ delete items[key]; }
+		};
+	}
+}();
+
+/**
+ * One file sent to the dataforms resumable upload endpoint:
+ * start a session, send the chunks in order, then finish it.
+ */
+function ChunkedUpload(owner, blob, file){
+	this._owner = owner;
+	this._settings = owner._settings;
+	this._blob = blob;
+	this._file = file;
+	this._failures = 0;
+	this._chunkSize = 0;
+	this._key = 'ajaxupload:' + [this._settings.chunked, this._settings.name,
+		blob.name, blob.size, blob.lastModified || ''].join(':');
+}
+
+ChunkedUpload.prototype = {
+	start : function(){
+		var self = this, id = store.getItem(this._key);
+		
+		if (id){
+			// Carry on from where the last attempt stopped
+			this._request('GET', this._url(id), null, function(status, response){
+				if (status == 200){
+					self._id = id;
+					self._chunkSize = store.getItem(self._key + ':chunk') * 1;
+					self._send(response.offset);
+				} else {
+					store.removeItem(self._key);
+					self.start();
+				}
+			});
+			return;
+		}
+		
+		var data = 'name=' + encodeURIComponent(this._file) + '&size=' + this._blob.size +
+			'&field=' + encodeURIComponent(this._settings.name);
+		
+		this._request('POST', this._settings.chunked, data, function(status, response){
+			if (status != 200){
+				return self._fail(status, response);
+			}
+			self._id = response.id;
+			self._chunkSize = response.chunk_size;
+			store.setItem(self._key, response.id);
+			store.setItem(self._key + ':chunk', response.chunk_size);
+			self._send(0);
+		});
+	},
+	_url : function(id){
+		return this._settings.chunked + id + '/';
+	},
+	_send : function(offset){
+		var self = this, settings = this._settings;
+		
+		settings.onProgress.call(this._owner, this._file, offset, this._blob.size);
+		
+		if (offset >= this._blob.size){
+			return this._finish();
+		}
+		
+		var chunk = sliceBlob(this._blob, offset, Math.min(offset + this._chunkSize, this._blob.size));
+		
+		this._request('POST', this._url(this._id) + '?offset=' + offset, chunk, function(status, response){
+			if (status == 200 || (status == 409 && response && response.offset !== undefined)){
+				// On a 409 the server already has more (or less) than we thought
+				self._failures = status == 200 ? 0 : self._failures + 1;
+				if (self._failures > settings.retries){
+					return self._fail(status, response);
+				}
+				self._send(response.offset);
+			} else {
+				self._retry(status, response);
+			}
+		});
+	},
+	_retry : function(status, response){
+		var self = this;
+		
+		if (++this._failures > this._settings.retries || (status >= 400 && status < 500)){
+			if (status == 404){
+				store.removeItem(this._key);
+			}
+			return this._fail(status, response);
+		}
+		
+		// Back off, then ask the server how far it got
+		setTimeout(function(){
+			self._request('GET', self._url(self._id), null, function(status, response){
+				if (status == 200){
+					self._send(response.offset);
+				} else {
+					self._retry(status, response);
+				}
+			});
+		}, 1000 * Math.pow(2, this._failures - 1));
+	},
+	_finish : function(){
+		var self = this;
+		
+		this._request('POST', this._url(this._id) + 'finish/', '', function(status, response){
+			if (status == 409 && response && response.offset !== undefined && ++self._failures <= self._settings.retries){
+				// Some of the file never made it
+				return self._send(response.offset);
+			} else if (status != 200){
+				return self._retry(status, response);
+			}
+			store.removeItem(self._key);
+			store.removeItem(self._key + ':chunk');
+			self._settings.onComplete.call(self._owner, self._file, response);
+		});
+	},
+	_fail : function(status, response){
+		this._settings.onError.call(this._owner, this._file, status, response);
+	},
+	_request : function(method, url, body, callback){
+		var xhr = new XMLHttpRequest();
+		
+		xhr.open(method, url, true);
+		xhr.setRequestHeader('X-Requested-With', 'XMLHttpRequest');
+		if (method == 'POST'){
+			var token = getCookie('csrftoken');
+			if (token){
+				xhr.setRequestHeader('X-CSRFToken', token);
+			}
+			xhr.setRequestHeader('Content-Type', typeof body == 'string' ?
+				'application/x-www-form-urlencoded' : 'application/octet-stream');
+		}
+		
+		xhr.onreadystatechange = function(){
+			if (xhr.readyState != 4) return;
+			
+			var response = null;
+			try {
+				response = JSON.parse(xhr.responseText);
+			} catch (e){}
+			
+			// A dropped connection has a status of 0
+			callback(xhr.status, response);
+		};
+		xhr.send(body);
+	}
+};
+
 // Please use AjaxUpload , Ajax_upload will be removed in the next version
 Ajax_upload = AjaxUpload = function(button, options){
 	if (button.jquery){
@@ -263,7 +444,17 @@ Ajax_upload = AjaxUpload = function(button, options){
 		onSubmit: function(file, extension){},
 		// Fired when file upload is completed
 		// WARNING! DO NOT USE "FALSE" STRING AS A RESPONSE!
-		onComplete: function(file, response) {}
+		onComplete: function(file, response) {},
+		// Location of the dataforms resumable upload endpoint (e.g. '/dataforms/upload/').
+		// When set, browsers with the File API send the file a chunk at a time,
+		// and pick up where they left off after a dropped connection.
+		chunked: false,
+		// How many times to retry a chunk before giving up
+		retries: 5,
+		// Fired after every chunk of a chunked upload
+		onProgress: function(file, loaded, total) {},
+		// Fired when a chunked upload fails for good
+		onError: function(file, status, response) {}
 	};
 
 	// Merge the users options with our defaults
@@ -462,6 +653,17 @@ AjaxUpload.prototype = {
 
 		// execute user event
 		if (! (settings.onSubmit.call(this, file, getExt(file)) == false)) {
+			if (settings.chunked && supportsChunks(this._input)){
+				var blob = this._input.files[0];
+				
+				d.body.removeChild(this._input);
+				this._input = null;
+				this._createInput();
+				
+				new ChunkedUpload(this, blob, file).start();
+				return;
+			}
+			
 			// Create new iframe for this submission
 			var iframe = this._createIframe();
 			
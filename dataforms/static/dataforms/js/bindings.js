@@ -1,16 +1,41 @@
 var binding_results = {};
 
+// Bindings fetched from the server, keyed on url
+var binding_payloads = {};
+
+function getBindings(value, callback) {
+	// The hidden field holds either the bindings themselves, or their url
+	if (!value || value.charAt(0) == '[') {
+		callback(jQuery.parseJSON(value));
+		return;
+	}
+
+	// The url changes with the bindings, so the browser can cache them,
+	// and a page with the same form many times only asks once
+	if (!binding_payloads[value]) {
+		binding_payloads[value] = $.ajax({ url: value, dataType: 'json', cache: true });
+	}
+	binding_payloads[value]
+		.done(function(bindings) { callback(bindings); })
+		.fail(function() { callback(null); });
+}
+
 function setBindings() {
 	// Create the binding event handlers
 	var binding_selectors = $("input[type='hidden'][name*='js_dataform_bindings']");
 	var bindings = [];
+	var pending = binding_selectors.length;
 
-	// Parse the bindings from the hidden field into a javascript array
+	// Get the bindings of every hidden field, then bind them all at once,
+	// since additional rules can refer to bindings of other forms
 	$.each(binding_selectors, function(index, binding){
-		var binding = jQuery.parseJSON($(this).val());
-		if (binding) {
-			bindings.push(binding);
-		}
+		getBindings($(this).val(), function(binding) {
+			bindings[index] = binding;
+			pending -= 1;
+			if (pending == 0) {
+				applyBindings(bindings);
+			}
+		});
 
 		// Remove values from all hidden fields
 		$.unique($(this).parents('form')).submit(function() {
@@ -18,8 +43,13 @@ function setBindings() {
 		});
 
 	});
+}
 
+function applyBindings(bindings) {
 	$.each(bindings, function(i1, bindingArray){
+		if (!bindingArray) {
+			return;
+		}
 
 		$.each(bindingArray, function(i2, binding){
 
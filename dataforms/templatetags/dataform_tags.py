@@ -0,0 +1,158 @@
+"""
+Dataforms Template Tags
+=======================
+
+``cacheform`` caches the rendered HTML of a form, for forms whose output
+only depends on their definition and their saved answers::
+
+    {% load dataform_tags %}
+
+    {% cacheform form %}
+        {% for field in form %}
+            {{ field.label_tag }} {{ field }}
+        {% endfor %}
+    {% endcacheform %}
+
+An optional timeout, and anything else the fragment depends on, can follow
+the form, just like Django's ``{% cache %}``::
+
+    {% cacheform form 600 request.LANGUAGE_CODE %}
+
+The cache key holds the schema generation, so editing a form's definition
+changes it, and so does saving the form's submission (its last_modified,
+which is cached by slug so that a hit costs no query).
+Answers changed without saving a form (in the admin, say) won't show until
+the fragment expires.  Forms bound to posted data, or with choices from the
+CHOICES_MODULE, are always rendered.  Keep anything request specific, like
+a csrf_token, out of the block.
+"""
+from django import template
+from django.core.cache import cache
+from django.utils.hashcompat import md5_constructor
+from django.utils.http import urlquote
+from dataforms.app_settings import FRAGMENT_CACHE_TIMEOUT
+from dataforms.models import Submission
+from dataforms.utils.cache import get_schema_generation, submission_version_key
+
+register = template.Library()
+
+
+def get_fragment_key(form, vary_on=()):
+    """
+    The cache key of a rendered form, or None if its HTML can't be cached.
+
+    :param form: a form from create_form
+    :param vary_on: anything else the rendered HTML depends on
+    """
+
+    # Posted data and errors are different every time
+    request = getattr(form, 'request', None)
+    if form.is_bound and (not form.readonly or (request is not None and form.data is request.POST)):
+        return None
+
+    # Choices from the CHOICES_MODULE can change from one request to the next
+    if form.choice_providers:
+        return None
+
+    submission = getattr(form, 'submission', None)
+    if submission is None:
+        # Answers passed in without a submission can be anything
+        if form.initial:
+            return None
+        submission_key = ''
+    else:
+        if isinstance(submission, str) or isinstance(submission, unicode):
+            submission_key = get_submission_key(submission)
+        else:
+            submission_key = '%s@%s' % (submission.id, submission.last_modified.isoformat())
+
+    # create_form can override the title and description, and sets the section
+    section = form.meta.get('section')
+    section_key = unicode(getattr(section, 'pk', section) or '')
+
+    args = md5_constructor(u':'.join([
+        form.slug,
+        get_schema_generation(),
+        'readonly' if form.readonly else 'editable',
+        submission_key,
+        urlquote(form.meta.get('title') or ''),
+        urlquote(form.meta.get('description') or ''),
+        urlquote(section_key),
+    ] + [urlquote(var) for var in vary_on]).encode('utf-8'))
+
+    return 'dataforms:fragment:%s:%s' % (form.slug, args.hexdigest())
+
+
+def get_submission_key(slug):
+    """
+    The saved version of a submission given by slug, empty if it doesn't
+    exist yet.  It is cached until the submission is saved again, so that
+    rendering a cached form costs no query.
+    """
+
+    key = submission_version_key(slug)
+    submission_key = cache.get(key)
+
+    if submission_key is None:
+        try:
+            submission = Submission.objects.only('id', 'last_modified').get(slug=slug)
+            submission_key = '%s@%s' % (submission.id, submission.last_modified.isoformat())
+        except Submission.DoesNotExist:
+            submission_key = ''
+        cache.set(key, submission_key, FRAGMENT_CACHE_TIMEOUT)
+
+    return submission_key
+
+
+class CacheFormNode(template.Node):
+
+    def __init__(self, nodelist, form_var, timeout_var, vary_on):
+        self.nodelist = nodelist
+        self.form_var = form_var
+        self.timeout_var = timeout_var
+        self.vary_on = vary_on
+
+    def render(self, context):
+        form = self.form_var.resolve(context)
+
+        key = get_fragment_key(form, [var.resolve(context) for var in self.vary_on])
+        if key is None:
+            return self.nodelist.render(context)
+
+        if self.timeout_var is None:
+            timeout = FRAGMENT_CACHE_TIMEOUT
+        else:
+            try:
+                timeout = int(self.timeout_var.resolve(context))
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError('"cacheform" tag got a non-integer timeout value: %r' % self.timeout_var.var)
+
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, timeout)
+        return value
+
+
+@register.tag
+def cacheform(parser, token):
+    """
+    Cache the rendered contents of the block for the given form.
+
+    Usage::
+
+        {% cacheform form [timeout] [var1 var2 ...] %} ... {% endcacheform %}
+    """
+
+    nodelist = parser.parse(('endcacheform',))
+    parser.delete_first_token()
+
+    tokens = token.split_contents()
+    if len(tokens) < 2:
+        raise template.TemplateSyntaxError(u"'%s' tag requires at least 1 argument." % tokens[0])
+
+    form_var = parser.compile_filter(tokens[1])
+    timeout_var = parser.compile_filter(tokens[2]) if len(tokens) > 2 else None
+    vary_on = [parser.compile_filter(var) for var in tokens[3:]]
+
+    return CacheFormNode(nodelist, form_var, timeout_var, vary_on)
@@ -1,10 +1,15 @@
+from collections import defaultdict
+from django.core.files.storage import FileSystemStorage, Storage
 from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
 from django.db.models import Q
+import time
 from django.test import TestCase, Client
-from forms import _field_for_form, \
+from forms import _field_for_form, clear_form_cache, \
 	get_answers # kind of breaking low coupling here
 from models import Submission, Answer
 from app_settings import BOOLEAN_FIELDS, MULTI_CHOICE_FIELDS, UPLOAD_FIELDS
+from schema import clear_binding_cache
 
 
 class RequestFactory(Client):
@@ -45,8 +50,95 @@ class RequestFactory(Client):
 		environ.update(request)
 		return WSGIRequest(environ)
 
+class SlowStorage(Storage):
+	"""
+	A stand-in for remote storage: files are kept in a local folder, but every
+	call that would be a round trip to the remote end is counted and delayed.
+	Like most remote storages it has no local path().
+	
+	Usage::
+	
+		storage = SlowStorage(location=tempfile.mkdtemp(), latency=0.05)
+		...
+		storage.calls['exists']  # round trips made by exists()
+	"""
+	
+	def __init__(self, location, base_url='/remote/', latency=0, overwrite=False):
+		self.local = FileSystemStorage(location=location, base_url=base_url)
+		self.latency = latency
+		self.overwrite = overwrite
+		self.calls = defaultdict(int)
+	
+	def _round_trip(self, name):
+		self.calls[name] += 1
+		if self.latency:
+			time.sleep(self.latency)
+	
+	@property
+	def round_trips(self):
+		return sum(self.calls.values())
+	
+	def _open(self, name, mode='rb'):
+		self._round_trip('open')
+		return self.local._open(name, mode)
+	
+	def get_available_name(self, name):
+		# Storages that overwrite, S3 for one, save over an existing name
+		if self.overwrite:
+			return name
+		return super(SlowStorage, self).get_available_name(name)
+	
+	def _save(self, name, content):
+		self._round_trip('save')
+		if self.overwrite and self.local.exists(name):
+			self.local.delete(name)
+		return self.local._save(name, content)
+	
+	def delete(self, name):
+		self._round_trip('delete')
+		return self.local.delete(name)
+	
+	def exists(self, name):
+		self._round_trip('exists')
+		return self.local.exists(name)
+	
+	def listdir(self, path):
+		self._round_trip('listdir')
+		return self.local.listdir(path)
+	
+	def size(self, name):
+		self._round_trip('size')
+		return self.local.size(name)
+	
+	def modified_time(self, name):
+		self._round_trip('modified_time')
+		return self.local.modified_time(name)
+	
+	def url(self, name):
+		# Worked out locally, as remote storages do
+		return self.local.url(name)
+
 class CustomTestCase(TestCase):
 	
+	def setUp(self):
+		# Compiled forms and cached bindings outlive the per-test transaction rollback
+		clear_form_cache()
+		clear_binding_cache()
+	
+	def countQueries(self, func, *args, **kwargs):
+		"""
+		Call a function and return how many queries it made
+		"""
+		
+		old_debug_cursor = connection.use_debug_cursor
+		connection.use_debug_cursor = True
+		start = len(connection.queries)
+		try:
+			func(*args, **kwargs)
+			return len(connection.queries) - start
+		finally:
+			connection.use_debug_cursor = old_debug_cursor
+	
 	def assertDictionaryEqual(self, from_post, from_db):
 		"""
 		Just a nicer way to see out dictionary differences
@@ -15,9 +15,17 @@ Usage::
 	
 """
 
+import csv
 import forms
-from models import DataForm, Submission, Answer
-from test_helpers import RequestFactory, CustomTestCase
+from registry import FieldTypeRegistry, field_types
+from schema import load_schema, clear_binding_cache
+from export import export_answers
+from django.utils import simplejson as json
+from django.utils.datastructures import SortedDict
+from django.core.exceptions import ImproperlyConfigured
+from models import DataForm, DataFormField, Submission, Answer, Field, Collection, CollectionDataForm, Section
+from test_helpers import RequestFactory, CustomTestCase, SlowStorage
+from django.test import TransactionTestCase
 from django import template
 rf = RequestFactory()
 
@@ -68,6 +76,16 @@ TEST_COLLECTION_POST_DATA = {
 }
 TEST_COLLECTION_POST_DATA.update(TEST_FORM_POST_DATA)
 
+def create_text_form(slug, count):
+	"""
+	Create a DataForm with `count` text fields, for testing how things scale.
+	"""
+	data_form = DataForm.objects.create(title=slug, slug=slug)
+	for i in range(count):
+		field = Field.objects.create(field_type='TextInput', label='Field %s' % i, slug='%s-field-%s' % (slug, i))
+		DataFormField.objects.create(data_form=data_form, field=field, order=i)
+	return data_form
+
 class FormsTestCase(CustomTestCase):
 	
 	fixtures = ['dataforms_test.json']
@@ -86,6 +104,12 @@ class FormsTestCase(CustomTestCase):
 		request = rf.get('/')
 		form = forms.create_form(request, form="personal-information", submission="myForm")
 		
+		# The querysets of the old query data are still there, built on demand
+		fields = form.query_data['field_query']
+		self.assertEqual([field.slug for field in form.query_data['fields_list']], [field.slug for field in fields])
+		self.assertTrue(form.query_data['choice_query'].count())
+		self.assertFalse(form.query_data['field_query'] is fields)
+		
 	def testCreateBountDataForm(self):
 		request = rf.post('/form/', TEST_FORM_POST_DATA)
 		form = forms.create_form(request, form="personal-information", submission="myForm")
@@ -170,6 +194,73 @@ class FormsTestCase(CustomTestCase):
 		request = rf.get('/')
 		collection = forms.create_collection(request, collection="test-collection", submission="myCollection")
 		
+	def testCollectionQueryBudget(self):
+		section = Section.objects.create(title="Budget", slug="budget")
+		counts = []
+		
+		for size in (1, 40):
+			collection = Collection.objects.create(title="Budget %s" % size, slug="budget-%s" % size)
+			for i in range(size):
+				data_form = create_text_form("budget-%s-%s" % (size, i), 3)
+				CollectionDataForm.objects.create(collection=collection, data_form=data_form, section=section, order=i)
+			
+			forms.clear_form_cache()
+			queries = self.countQueries(lambda: list(forms.create_collection(rf.get('/'), collection="budget-%s" % size, submission="budget-submission")))
+			counts.append(queries)
+		
+		self.assertEqual(counts[0], counts[1])
+		
+		# Sections are unique and in collection order
+		self.assertEqual([s.slug for s in forms.create_sections(Collection.objects.get(slug="test-collection"))],
+			[s.slug for s in forms.create_collection(rf.get('/'), collection="test-collection", submission="myCollection").sections])
+		
+	def testLazyCollection(self):
+		first = Section.objects.create(title="First", slug="first")
+		second = Section.objects.create(title="Second", slug="second")
+		collection = Collection.objects.create(title="Lazy", slug="lazy")
+		for i in range(10):
+			data_form = create_text_form("lazy-%s" % i, 2)
+			CollectionDataForm.objects.create(collection=collection, data_form=data_form, section=first if i < 5 else second, order=i)
+		
+		form = forms.create_form(rf.post('/form/', {'lazy-0__lazy-0-field-0': 'hello'}), form="lazy-0", submission="lazy-submission")
+		form.is_valid()
+		form.save()
+		
+		# Only the collection, section and mappings are read until a form is used
+		self.assertNumQueries(3, forms.create_collection, rf.get('/'), collection="lazy", submission="lazy-submission", section="second")
+		collection = forms.create_collection(rf.get('/'), collection="lazy", submission="lazy-submission", section="first")
+		self.assertEqual(5, len(collection))
+		self.assertEqual(["first", "second"], [section.slug for section in collection.sections])
+		
+		# Building any form builds the section: two queries for the schemas, two for the answers
+		self.assertNumQueries(4, lambda: collection[1])
+		self.assertNumQueries(0, list, collection)
+		self.assertEqual(["lazy-%s" % i for i in range(5)], [form.slug for form in collection])
+		self.assertEqual(collection[0]['lazy-0__lazy-0-field-0'].value(), 'hello')
+		self.assertEqual(collection[-1].slug, "lazy-4")
+		
+		# Forms outside of the section are left alone
+		self.assertEqual([True] * 5 + [False] * 5, [descriptor.form is not None for descriptor in collection._descriptors])
+		
+		self.assertEqual(["lazy-1", "lazy-2"], [form.slug for form in collection[1:3]])
+		
+	def testCollectionSaveQueries(self):
+		section = Section.objects.create(title="Save", slug="save")
+		collection = Collection.objects.create(title="Save", slug="save")
+		data = {}
+		for i in range(10):
+			data_form = create_text_form("save-%s" % i, 3)
+			CollectionDataForm.objects.create(collection=collection, data_form=data_form, section=section, order=i)
+			for j in range(3):
+				data["save-%s__save-%s-field-%s" % (i, i, j)] = "answer %s" % j
+		
+		collection = forms.create_collection(rf.post('/collection/', data), collection="save", submission="save-submission")
+		self.assertTrue(collection.is_valid())
+		
+		# Get and create the submission, then one upsert for all of the answers
+		self.assertNumQueries(3, collection.save)
+		self.assertEqual(30, Answer.objects.filter(submission__slug="save-submission").count())
+		
 	def testCreateFormClassTitle(self):
 		# Create some test name cases
 		data = (
@@ -237,5 +328,837 @@ class FormsTestCase(CustomTestCase):
 		self.assertEqual(answers['other-languages'], u'\u2600')
 		self.assertEqual(answers['biography'], u'Blah blah blah\u2600')
 		
+	def testFormClassCache(self):
+		request = rf.get('/')
+		form = forms.create_form(request, form="personal-information")
+		
+		# The second form is built from the cached class without hitting the DB
+		self.assertNumQueries(0, forms.create_form, request, form="personal-information")
+		cached = forms.create_form(request, form="personal-information")
+		self.assertTrue(form.__class__ is cached.__class__)
+		
+		# Changing a field definition invalidates the cached class
+		field = Field.objects.get(slug="biography")
+		field.label = u"Life story"
+		field.save()
+		form = forms.create_form(request, form="personal-information")
+		self.assertFalse(form.__class__ is cached.__class__)
+		self.assertEqual(form.fields['personal-information__biography'].label, u"Life story")
+		
+		# A hidden form built from its object isn't reachable by slug through the cache
+		hidden = create_text_form('hidden-form', 1)
+		hidden.visible = False
+		hidden.save()
+		forms.create_form(request, form=hidden)
+		self.assertRaises(DataForm.DoesNotExist, forms.create_form, request, form="hidden-form")
+		self.assertRaises(DataForm.DoesNotExist, forms.get_schema, "hidden-form")
+		forms.create_form(request, form=hidden)
+		
+	def testFormClassCacheIsolation(self):
+		request = rf.post('/form/', TEST_FORM_POST_DATA)
+		form = forms.create_form(request, form="personal-information", submission="myForm", readonly=True)
+		form.is_valid(check_required=False)
+		
+		# Per-instance state must not leak in to the next form built from the cached class
+		other = forms.create_form(rf.get('/'), form="personal-information", submission="otherForm")
+		self.assertTrue(form.__class__ is other.__class__)
+		self.assertTrue(other.fields['personal-information__profession'].required)
+		self.assertFalse('readonly' in other.fields['personal-information__profession'].widget.attrs)
+		self.assertTrue(other.fields.has_key('personal-information__js_dataform_bindings'))
+		self.assertEqual(other.meta['submission'], "otherForm")
+		self.assertEqual(form.meta['submission'], "myForm")
+		
+	def testSchemaQueryBudget(self):
+		# A cold schema load is one query each for the form, its fields (with
+		# their choices) and its bindings, however many fields there are.
+		self.assertNumQueries(3, load_schema, "personal-information")
+		# The bindings processed by that load are cached
+		self.assertNumQueries(1, load_schema, DataForm.objects.get(slug="personal-information"))
+		
+		schema = load_schema("personal-information")
+		self.assertEqual(schema.slug, "personal-information")
+		self.assertTrue(schema.fields)
+		self.assertTrue(isinstance(schema.fields, tuple))
+		
+		# Choices come back with their fields, in order
+		languages = [field for field in schema.fields if field.slug == "languages"][0]
+		self.assertTrue(('python', 'Python') in languages.choices)
+		
+		# Building a form from cold costs no more than loading its schema
+		clear_binding_cache()
+		self.assertNumQueries(3, forms.create_form, rf.get('/'), form="personal-information")
+		self.assertEqual(forms.get_bindings("personal-information"), list(schema.bindings))
+		
+	def testBindingPayload(self):
+		from models import Binding
+		from schema import get_binding_payloads
+		from django.utils.html import escape
+		from django.utils.hashcompat import md5_constructor
+		
+		data_form = DataForm.objects.get(slug="personal-information")
+		field = Field.objects.get(slug="profession")
+		binding = Binding.objects.create(data_form=data_form, field=field, operator='equal',
+			value='programmer', true_field=['personal-information__biography'], true_choice=['languages___python'])
+		processed = lambda payload: [b for b in payload.bindings if b['id'] == binding.id][0]
+		
+		# Bindings are processed when they are saved
+		self.assertNumQueries(0, get_binding_payloads, [data_form])
+		payload = get_binding_payloads([data_form])[data_form.id]
+		self.assertEqual(processed(payload)['selector'], "personal-information__profession")
+		self.assertEqual(processed(payload)['true_choice'], [['languages', 'python']])
+		self.assertEqual(json.loads(payload.json), list(payload.bindings))
+		self.assertEqual(payload.html, escape(payload.json))
+		self.assertEqual(payload.hash, md5_constructor(payload.json).hexdigest())
+		
+		# So loading the schema only reads the form and its fields
+		self.assertNumQueries(2, load_schema, "personal-information")
+		schema = forms.create_form(rf.get('/'), form="personal-information").query_data['schema']
+		self.assertEqual(schema.bindings_html, payload.html)
+		self.assertEqual(schema.bindings_hash, payload.hash)
+		
+		# Changing a binding changes its form's payload, and its hash
+		binding.value = 'conquistador'
+		binding.save()
+		changed = get_binding_payloads([data_form])[data_form.id]
+		self.assertEqual(processed(changed)['value'], 'conquistador')
+		self.assertNotEqual(changed.hash, payload.hash)
+		
+		# Saving it again doesn't grow the list of cached payloads
+		from schema import BINDINGS_CACHE_TAG
+		from utils.cache import cache
+		tagged = len(cache.get(BINDINGS_CACHE_TAG))
+		binding.save()
+		self.assertEqual(tagged, len(cache.get(BINDINGS_CACHE_TAG)))
+		
+		# Renaming a field it refers to throws every payload away
+		field.slug = "occupation"
+		field.save()
+		self.assertNumQueries(1, get_binding_payloads, [data_form])
+		
+	def testBindingsEndpoint(self):
+		import views
+		from models import Binding
+		from django.core.urlresolvers import reverse
+		from django.http import Http404
+		
+		data_form = DataForm.objects.get(slug="personal-information")
+		Binding.objects.create(data_form=data_form, field=Field.objects.get(slug="profession"),
+			operator='equal', value='programmer', true_field=['personal-information__biography'])
+		schema = load_schema("personal-information")
+		url = reverse('dataforms_bindings', kwargs={'form': schema.slug, 'bindings_hash': schema.bindings_hash})
+		
+		# The hidden field refers to the bindings, rather than holding them
+		form = forms.create_form(rf.get('/'), form="personal-information")
+		self.assertEqual(form.fields['personal-information__js_dataform_bindings'].initial, url)
+		
+		# Forms without bindings still have them inline
+		create_text_form('unbound-form', 1)
+		form = forms.create_form(rf.get('/'), form="unbound-form")
+		self.assertEqual(form.fields['unbound-form__js_dataform_bindings'].initial, '[]')
+		
+		response = views.bindings(rf.get(url), form=schema.slug, bindings_hash=schema.bindings_hash)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(json.loads(response.content), list(schema.bindings))
+		self.assertEqual(response['ETag'], '"%s"' % schema.bindings_hash)
+		self.assertTrue('max-age=31536000' in response['Cache-Control'])
+		
+		# Browsers that have them already are told so
+		response = views.bindings(rf.get(url, HTTP_IF_NONE_MATCH='"%s"' % schema.bindings_hash),
+			form=schema.slug, bindings_hash=schema.bindings_hash)
+		self.assertEqual(response.status_code, 304)
+		
+		# Pages rendered before the bindings changed are sent to the current ones
+		response = views.bindings(rf.get('/'), form=schema.slug, bindings_hash='0' * 32)
+		self.assertEqual(response.status_code, 302)
+		self.assertTrue(response['Location'].endswith(url))
+		
+		self.assertRaises(Http404, views.bindings, rf.get('/'), form="no-such-form", bindings_hash='0' * 32)
+		
+	def testFieldTypeRegistry(self):
+		# Mappings are resolved to classes up front
+		self.assertTrue('TextInput' in field_types)
+		field = field_types['DateField'].build(required=False)
+		self.assertEqual(field.widget.attrs['class'], 'datepicker')
+		
+		# Building a field must not touch the mapping's widget attrs
+		field = field_types['DateField'].build(widget_attrs={'class': 'datepicker other'})
+		self.assertEqual(field_types['DateField'].widget_attrs['class'], 'datepicker')
+		
+		# Broken mappings fail when the registry is built
+		self.assertRaises(ImproperlyConfigured, FieldTypeRegistry,
+			{'Broken': {'class': 'django.forms.NoSuchField'}})
+		self.assertRaises(ImproperlyConfigured, FieldTypeRegistry,
+			{'Broken': {'class': 'no_such_module.Field'}})
+		
+		# A field whose type isn't mapped says so when its form is built
+		data_form = create_text_form('unmapped', 1)
+		Field.objects.filter(slug='unmapped-field-0').update(field_type='NoSuchType')
+		self.assertRaises(ImproperlyConfigured, forms._create_form, form='unmapped')
+		
+	def testSaveQueryCount(self):
+		# Saving costs the same number of queries however many fields a form has
+		for count in (2, 60):
+			data_form = create_text_form('text-form-%s' % count, count)
+			post = dict(('text-form-%s__text-form-%s-field-%s' % (count, count, i), u'value %s' % i) for i in range(count))
+			submission = Submission.objects.create(slug='text-submission-%s' % count)
+			
+			form = forms.create_form(rf.post('/form/', post), form=data_form.slug, submission=submission)
+			self.assertTrue(form.is_valid())
+			# Touch the submission and upsert the answers
+			self.assertNumQueries(2, form.save)
+			
+			post = dict((key, value + u' changed') for key, value in post.items())
+			form = forms.create_form(rf.post('/form/', post), form=data_form.slug, submission=submission)
+			self.assertTrue(form.is_valid())
+			self.assertNumQueries(2, form.save)
+			self.assertEqual(len(form.changed_answers), count)
+			
+			answers = forms.get_answers(submission)
+			self.assertEqual(len(answers), count)
+			self.assertEqual(answers['text-form-%s-field-1' % count], u'value 1 changed')
+		
+	def testSaveOnlyChangedAnswers(self):
+		submission = Submission.objects.create(slug='changed-submission')
+		request = rf.post('/form/', TEST_FORM_POST_DATA)
+		form = forms.create_form(request, form="personal-information", submission=submission)
+		self.assertTrue(form.is_valid())
+		form.save()
+		last_modified = Submission.objects.get(pk=submission.pk).last_modified
+		
+		# Re-posting the same data writes nothing
+		form = forms.create_form(request, form="personal-information", submission=submission)
+		self.assertTrue(form.is_valid())
+		self.assertNumQueries(0, form.save)
+		self.assertEqual(form.changed_answers, set())
+		self.assertEqual(Submission.objects.get(pk=submission.pk).last_modified, last_modified)
+		
+		# Changing one answer only writes that answer, plus its choices for choice fields
+		data = dict(TEST_FORM_POST_DATA)
+		data[u'personal-information__biography'] = [u'Something else']
+		form = forms.create_form(rf.post('/form/', data), form="personal-information", submission=submission)
+		self.assertTrue(form.is_valid())
+		self.assertNumQueries(2, form.save)
+		self.assertEqual(form.changed_answers, set(['biography']))
+		
+		# The same choices posted in another order are not a change
+		data[u'personal-information__languages'] = [u'other', u'python']
+		form = forms.create_form(rf.post('/form/', data), form="personal-information", submission=submission)
+		self.assertTrue(form.is_valid())
+		self.assertNumQueries(0, form.save)
+		self.assertEqual(form.changed_answers, set())
+		
+		data[u'personal-information__languages'] = [u'python']
+		form = forms.create_form(rf.post('/form/', data), form="personal-information", submission=submission)
+		self.assertTrue(form.is_valid())
+		self.assertNumQueries(3, form.save)
+		self.assertEqual(form.changed_answers, set(['languages']))
+		self.assertValidSave(data=data, submission=submission)
+		
+	def testUpsertFallback(self):
+		# Backends without a native upsert read, then insert or update
+		from utils import sql
+		from django.db import connection
+		
+		data_form = create_text_form('upsert-form', 3)
+		submission = Submission.objects.create(slug='upsert-submission')
+		fields = list(data_form.fields.all())
+		
+		def answers(value):
+			return [Answer(submission=submission, data_form=data_form, field=field, value=value) for field in fields]
+		
+		native = sql.supports_upsert
+		sql.supports_upsert = lambda con: False
+		try:
+			sql.upsert_many(answers(u'one'), ['submission', 'data_form', 'field'], ['value'])
+			sql.upsert_many(answers(u'two'), ['submission', 'data_form', 'field'], ['value'])
+		finally:
+			sql.supports_upsert = native
+		
+		self.assertEqual(list(Answer.objects.filter(submission=submission).values_list('value', flat=True)), [u'two'] * 3)
+		
+		if sql.supports_upsert(connection):
+			sql.upsert_many(answers(u'three'), ['submission', 'data_form', 'field'], ['value'])
+			self.assertEqual(list(Answer.objects.filter(submission=submission).values_list('value', flat=True)), [u'three'] * 3)
+		
+	def testBulkWrites(self):
+		from utils import bulk
+		from django.db import connection
+		from models import Choice
+		
+		# Enough rows to need more than one statement on SQLite
+		count = 1200
+		choices = [Choice(title=u'bulk-%s' % i, value=u'v%s' % i) for i in range(count)]
+		self.assertEqual(count, bulk.bulk_insert(choices, return_ids=True))
+		
+		saved = Choice.objects.filter(title__startswith='bulk-')
+		self.assertEqual(count, saved.count())
+		if bulk.supports_returning(connection):
+			self.assertEqual(dict(saved.values_list('title', 'pk')), dict((c.title, c.pk) for c in choices))
+		else:
+			choices = list(saved)
+		
+		for choice in choices:
+			choice.value = choice.title.upper()
+		self.assertEqual(count, bulk.bulk_update(choices, fields=['value']))
+		self.assertEqual(0, saved.exclude(value__startswith='BULK-').count())
+		
+		self.assertEqual(count, bulk.bulk_delete(choices))
+		self.assertEqual(0, saved.count())
+
+	def testBulkInsertSingleRows(self):
+		# Backends without multi-row VALUES insert through executemany
+		from utils import bulk
+		from models import Choice
+
+		choices = [Choice(title=u'single-%s' % i, value=u'v%s' % i) for i in range(5)]
+		native = bulk.supports_multirow_values
+		bulk.supports_multirow_values = lambda con: False
+		try:
+			self.assertEqual(5, bulk.bulk_insert(choices, return_ids=True))
+		finally:
+			bulk.supports_multirow_values = native
+
+		self.assertEqual(sorted(c.title for c in choices),
+			sorted(Choice.objects.filter(title__startswith='single-').values_list('title', flat=True)))
+
+	def testIterGrouped(self):
+		from utils.sql import iter_grouped, query_to_grouped_dict
+		from django.db import connection
+		
+		sql = """
+			SELECT 1 AS id, 'a' AS name, 'x' AS choice UNION ALL
+			SELECT 1, 'a', 'y' UNION ALL
+			SELECT 1, 'a', 'x' UNION ALL
+			SELECT 2, 'b', NULL UNION ALL
+			SELECT 3, 'c', 'z' UNION ALL
+			SELECT 3, 'c', 'z'
+		"""
+		expected = [
+			{'id': 1, 'name': 'a', 'choice': ['x', 'y']},
+			{'id': 2, 'name': 'b', 'choice': None},
+			{'id': 3, 'name': 'c', 'choice': 'z'},
+		]
+		
+		# Groups that straddle fetches are still merged
+		cursor = connection.cursor()
+		cursor.execute(sql)
+		self.assertEqual(expected, list(iter_grouped(cursor, size=2)))
+		
+		cursor.execute(sql)
+		self.assertEqual(expected, query_to_grouped_dict(cursor))
+		
+	def testLazyExistingFiles(self):
+		import shutil, tempfile
+		from utils import file as file_utils
+		from utils.file import LazyDataFormFile
+		from django.core.files.base import ContentFile
+		
+		storage = SlowStorage(location=tempfile.mkdtemp())
+		file_utils.set_storage(storage)
+		
+		data_form = DataForm.objects.create(title="Files", slug="files")
+		submission = Submission.objects.create(slug="files-submission")
+		for i in range(20):
+			field = Field.objects.create(field_type='FileInput', label='File %s' % i, slug='file-%s' % i, required=False)
+			DataFormField.objects.create(data_form=data_form, field=field, order=i)
+			Answer.objects.create(submission=submission, data_form=data_form, field=field, value='uploads/file-%s.txt' % i)
+		
+		# Only the first file is still there
+		storage.local.save('uploads/file-0.txt', ContentFile('hello'))
+		
+		try:
+			# Rendering makes no round trips to the storage
+			form = forms.create_form(rf.get('/'), form="files", submission="files-submission")
+			form.as_p()
+			self.assertEqual(0, storage.round_trips)
+			
+			initial = form.initial['files__file-0']
+			self.assertTrue(isinstance(initial, LazyDataFormFile))
+			self.assertEqual(initial.url, '/remote/uploads/file-0.txt')
+			self.assertTrue(initial.closed)
+			
+			self.assertEqual(5, initial.size)
+			self.assertEqual('hello', initial.read())
+			initial.close()
+			self.assertTrue(initial.closed)
+			
+			# Binding checks each existing file once, and leaves out the missing ones.
+			# Validating the file that is there needs its size.
+			storage.calls.clear()
+			form = forms.create_form(rf.post('/', {'other': 'x'}), form="files", submission="files-submission")
+			self.assertTrue(form.is_valid())
+			self.assertEqual({'exists': 20, 'size': 1}, dict(storage.calls))
+			self.assertEqual(['files__file-0'], form.files.keys())
+		finally:
+			file_utils.set_storage(None)
+			shutil.rmtree(storage.local.location)
+		
+	def testContentAddressedUploads(self):
+		import os, shutil, tempfile
+		from utils import file as file_utils
+		from django.core.files.storage import FileSystemStorage
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		
+		file_utils.CONTENT_ADDRESSED_UPLOADS = True
+		location = tempfile.mkdtemp()
+		
+		try:
+			# Once on the local filesystem, and once on remote storage
+			storages = (FileSystemStorage(location=location), SlowStorage(location=location, overwrite=True),
+				SlowStorage(location=location, overwrite=False))
+			for storage in storages:
+				file_utils.set_storage(storage)
+				
+				upload = lambda name, content: file_utils.handle_upload({'f': SimpleUploadedFile(name, content)}, 'f')
+				first = upload('report.PDF', 'same content')
+				second = upload('copy.pdf', 'same content')
+				other = upload('other.pdf', 'other content %s' % storage.__class__.__name__)
+				
+				# Identical content is stored once, under its hash
+				self.assertEqual(first, second)
+				self.assertNotEqual(first, other)
+				self.assertTrue(first.endswith('.pdf'))
+				self.assertTrue(os.path.basename(first).startswith(os.path.basename(os.path.dirname(os.path.dirname(first)))))
+				self.assertEqual('same content', storage.open(first).read())
+				self.assertEqual(2, len(os.listdir(os.path.join(location, os.path.dirname(first)))) + len(os.listdir(os.path.join(location, os.path.dirname(other)))))
+				
+				submission, created = Submission.objects.get_or_create(slug='blob-submission')
+				data_form = create_text_form('blob-form', 1) if created else DataForm.objects.get(slug='blob-form')
+				Answer.objects.get_or_create(submission=submission, data_form=data_form, field=data_form.fields.all()[0], value=first)
+				
+				# Recent files are left alone, then only unreferenced ones are collected
+				self.assertEqual([], file_utils.collect_upload_garbage())
+				self.assertEqual([other], file_utils.collect_upload_garbage(grace=-60, dry_run=True))
+				self.assertEqual([other], file_utils.collect_upload_garbage(grace=-60))
+				self.assertFalse(storage.exists(other))
+				self.assertTrue(storage.exists(first))
+				
+				# Storing the same content again refreshes the blob, so it isn't collected
+				fresh = upload('fresh.txt', 'fresh content')
+				for name in (fresh, file_utils._touched_name(fresh)):
+					if os.path.exists(os.path.join(location, name)):
+						os.utime(os.path.join(location, name), (0, 0))
+				self.assertTrue(fresh in file_utils.collect_upload_garbage(dry_run=True))
+				self.assertEqual(fresh, upload('again.txt', 'fresh content'))
+				self.assertFalse(fresh in file_utils.collect_upload_garbage(dry_run=True))
+				self.assertEqual(1, len(os.listdir(os.path.join(location, os.path.dirname(fresh)))))
+				self.assertEqual([fresh], file_utils.collect_upload_garbage(grace=-60))
+		finally:
+			file_utils.CONTENT_ADDRESSED_UPLOADS = False
+			file_utils.set_storage(None)
+			shutil.rmtree(location)
+		
+	def testUploadStorage(self):
+		import shutil, tempfile
+		from utils import file as file_utils
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		
+		storage = SlowStorage(location=tempfile.mkdtemp())
+		file_utils.set_storage(storage)
+		
+		try:
+			first = file_utils.handle_upload({'f': SimpleUploadedFile('notes.txt', 'one')}, 'f', 7)
+			second = file_utils.handle_upload({'f': SimpleUploadedFile('notes.txt', 'two')}, 'f', 7)
+			
+			self.assertTrue(first.startswith('uploads/7/notes'))
+			self.assertNotEqual(first, second)
+			self.assertEqual('two', storage.open(second).read())
+		finally:
+			file_utils.set_storage(None)
+			shutil.rmtree(storage.local.location)
+		
+	def testUploadSizeLimits(self):
+		import os
+		import uploadhandler
+		from StringIO import StringIO
+		from django.core.files.uploadhandler import TemporaryFileUploadHandler
+		
+		data_form = DataForm.objects.create(title="Limits", slug="limits")
+		for i, arguments in enumerate(['{"max_upload_size": 10}', '']):
+			field = Field.objects.create(field_type='FileInput', label='Upload %s' % i, slug='upload-%s' % i, required=False, arguments=arguments)
+			DataFormField.objects.create(data_form=data_form, field=field, order=i)
+		
+		temporary_files = {}
+		class RecordingHandler(TemporaryFileUploadHandler):
+			def new_file(self, *args, **kwargs):
+				super(RecordingHandler, self).new_file(*args, **kwargs)
+				temporary_files[self.field_name] = self.file.temporary_file_path()
+		
+		def upload_request():
+			uploads = []
+			for i in range(2):
+				upload = StringIO('x' * 100)
+				upload.name = 'upload-%s.txt' % i
+				uploads.append(('limits__upload-%s' % i, upload))
+			request = rf.post('/form/', dict(uploads, other='x'))
+			request.upload_handlers = [RecordingHandler(request)]
+			return request
+		
+		# The field's own limit is checked while the file is read, and the partial file removed
+		request = upload_request()
+		form = forms.create_form(request, form="limits", submission="limits-submission")
+		self.assertEqual({'limits__upload-0': 10}, request.rejected_uploads)
+		self.assertEqual(['limits__upload-1'], request.FILES.keys())
+		self.assertFalse(os.path.exists(temporary_files['limits__upload-0']))
+		self.assertFalse(form.is_valid())
+		self.assertEqual(['limits__upload-0'], form.errors.keys())
+		self.assertEqual(form.errors['limits__upload-0'], ['Please keep filesize under 10 bytes.'])
+		request.FILES['limits__upload-1'].close()
+		
+		# The global limit covers every field
+		uploadhandler.MAX_UPLOAD_SIZE = 50
+		try:
+			request = upload_request()
+			form = forms.create_form(request, form="limits", submission="limits-submission")
+			self.assertEqual({'limits__upload-0': 10, 'limits__upload-1': 50}, request.rejected_uploads)
+			self.assertEqual([], request.FILES.keys())
+		finally:
+			uploadhandler.MAX_UPLOAD_SIZE = forms.MAX_UPLOAD_SIZE
+		
+		# Too late for the handler once the request is parsed, the form still says no
+		request = upload_request()
+		request.FILES
+		form = forms.create_form(request, form="limits", submission="limits-submission")
+		self.assertFalse(hasattr(request, 'rejected_uploads'))
+		self.assertFalse(form.is_valid())
+		self.assertEqual(['limits__upload-0'], form.errors.keys())
+		
+		# A part that declares it is too large is skipped without touching the upload before it
+		body = '\r\n'.join([
+			'--limits-boundary',
+			'Content-Disposition: form-data; name="limits__upload-1"; filename="valid.txt"',
+			'Content-Type: text/plain',
+			'',
+			'valid',
+			'--limits-boundary',
+			'Content-Disposition: form-data; name="limits__upload-0"; filename="large.txt"',
+			'Content-Type: text/plain',
+			'Content-Length: 100',
+			'',
+			'x' * 100,
+			'--limits-boundary--',
+			'',
+		])
+		request = rf.post('/form/', body, content_type='multipart/form-data; boundary=limits-boundary')
+		form = forms.create_form(request, form="limits", submission="limits-submission")
+		self.assertEqual({'limits__upload-0': 10}, request.rejected_uploads)
+		self.assertEqual(['limits__upload-1'], request.FILES.keys())
+		self.assertEqual('valid', request.FILES['limits__upload-1'].read())
+		
+	def testChunkedUpload(self):
+		import os, shutil, tempfile
+		import views
+		from utils import file as file_utils
+		from utils.chunked import ChunkedUpload, expire_upload_sessions
+		from django.core.files.storage import FileSystemStorage
+		from django.contrib.auth.models import User, AnonymousUser
+		
+		storage = FileSystemStorage(location=tempfile.mkdtemp())
+		file_utils.set_storage(storage)
+		
+		def call(view, request, *args, **kwargs):
+			if not hasattr(request, 'user'):
+				request.user = User(username='uploader')
+			response = view(request, *args, **kwargs)
+			return response.status_code, json.loads(response.content)
+		
+		def send(upload_id, offset, content):
+			request = rf.post('/?offset=%s' % offset, content, content_type='application/octet-stream')
+			return call(views.upload_chunk, request, upload_id)
+		
+		try:
+			# Anonymous users may not write into the upload storage
+			request = rf.post('/', {'name': 'notes.txt', 'size': 25})
+			request.user = AnonymousUser()
+			self.assertEqual(403, call(views.upload_start, request)[0])
+			
+			status, session = call(views.upload_start, rf.post('/', {'name': '../notes.txt', 'size': 25}))
+			self.assertEqual(200, status)
+			upload_id = session['id']
+			
+			self.assertEqual((200, {'id': upload_id, 'offset': 10}), send(upload_id, 0, 'a' * 10))
+			
+			# A retried chunk, or one past the end, is refused with the offset to resume from
+			status, result = send(upload_id, 0, 'a' * 10)
+			self.assertEqual((409, 10), (status, result['offset']))
+			self.assertEqual(409, send(upload_id, 10, 'b' * 20)[0])
+			self.assertEqual(409, call(views.upload_finish, rf.post('/', {}), upload_id)[0])
+			self.assertEqual((200, {'id': upload_id, 'offset': 10}), call(views.upload_chunk, rf.get('/'), upload_id))
+			
+			self.assertEqual((200, {'id': upload_id, 'offset': 25}), send(upload_id, 10, 'b' * 15))
+			status, result = call(views.upload_finish, rf.post('/', {}), upload_id)
+			self.assertEqual(200, status)
+			self.assertTrue(result['path'].startswith('uploads/notes'))
+			self.assertEqual('a' * 10 + 'b' * 15, storage.open(result['path']).read())
+			self.assertRaises(ChunkedUpload.DoesNotExist, ChunkedUpload.load, upload_id)
+			
+			# Too large to start, and abandoned uploads expire
+			self.assertEqual(413, call(views.upload_start, rf.post('/', {'name': 'huge.bin', 'size': forms.MAX_UPLOAD_SIZE + 1}))[0])
+			upload = ChunkedUpload.start('stale.txt', 10)
+			upload.write_chunk(0, 'stale')
+			self.assertEqual([], expire_upload_sessions())
+			self.assertEqual([upload.id], expire_upload_sessions(max_age=-60))
+			self.assertFalse(os.path.exists(storage.path(upload.path)))
+		finally:
+			file_utils.set_storage(None)
+			shutil.rmtree(storage.location)
+		
+	def testFragmentCache(self):
+		from django.core.cache import cache
+		cache.clear()
+		
+		fragment = template.Template("{% load dataform_tags %}{% cacheform form %}{{ marker }}{% for field in form %}{{ field }}{% endfor %}{% endcacheform %}")
+		render = lambda form, marker: fragment.render(template.Context({'form': form, 'marker': marker}))
+		
+		# Unbound forms are rendered once per schema
+		first = render(forms.create_form(rf.get('/'), form="personal-information"), 'first')
+		self.assertTrue(first.startswith('first<'))
+		self.assertEqual(first, render(forms.create_form(rf.get('/'), form="personal-information"), 'second'))
+		
+		field = Field.objects.get(slug="biography")
+		field.label = "Life story"
+		field.save()
+		self.assertTrue(render(forms.create_form(rf.get('/'), form="personal-information"), 'third').startswith('third<'))
+		
+		# Overridden titles and descriptions, and sections, are cached apart
+		self.assertTrue(render(forms.create_form(rf.get('/'), form="personal-information", title="Other"), 'titled').startswith('titled<'))
+		self.assertTrue(render(forms.create_form(rf.get('/'), form="personal-information", description="Other"), 'described').startswith('described<'))
+		self.assertTrue(render(forms.create_form(rf.get('/'), form="personal-information", section="other"), 'sectioned').startswith('sectioned<'))
+		
+		# Readonly forms are rendered once per saved version of the submission
+		readonly = lambda: forms.create_form(rf.get('/'), form="personal-information", submission="testSubmission", readonly=True)
+		self.assertTrue(render(readonly(), 'readonly').startswith('readonly<'))
+		self.assertTrue(render(readonly(), 'again').startswith('readonly<'))
+		
+		# A hit costs no query, not even to look up the submission's version
+		form = readonly()
+		self.assertNumQueries(0, render, form, 'hit')
+		
+		form = forms.create_form(rf.post('/form/', TEST_FORM_POST_DATA), form="personal-information", submission="testSubmission")
+		form.is_valid()
+		form.save()
+		self.assertTrue(render(readonly(), 'saved').startswith('saved<'))
+		
+		# Posted forms are never cached
+		self.assertTrue(render(form, 'posted').startswith('posted<'))
+		self.assertTrue(render(form, 'posted again').startswith('posted again<'))
+		
+	def testDisplay(self):
+		from display import get_display, render_display
+		
+		answers = forms.get_answers("testSubmission")
+		display = get_display(form="personal-information", submission="testSubmission")
+		schema = load_schema("personal-information")
+		
+		self.assertEqual([field.slug for field in schema.fields if field.field_type != 'HiddenInput'], [field.slug for field in display])
+		for field in display:
+			self.assertEqual(answers.get(field.slug), field.raw_value)
+		
+		# Choices are shown by their titles
+		languages = [field for field in display if field.slug == 'languages'][0]
+		titles = dict(schema.fields[[f.slug for f in schema.fields].index('languages')].choices)
+		self.assertEqual(u', '.join(titles[value] for value in answers['languages']), languages.value)
+		
+		# The schema is cached, so only the answers are read
+		submission = Submission.objects.get(slug="testSubmission")
+		self.assertNumQueries(1, render_display, "personal-information", submission)
+		self.assertEqual(answers, dict((field.slug, field.raw_value) for field in display if field.raw_value is not None))
+		html = render_display("personal-information", answers={'biography': u'<b>bold</b>'})
+		self.assertTrue(u'<dd>&lt;b&gt;bold&lt;/b&gt;</dd>' in html)
+		
+	def testLazyBoundFields(self):
+		form = forms.create_form(rf.post('/form/', TEST_FORM_POST_DATA), form="personal-information", submission="lazy-bound")
+		names = form.fields.keys()
+		
+		# Validating and saving makes no bound fields
+		self.assertTrue(form.is_valid())
+		form.save()
+		self.assertEqual({}, form.bound_fields)
+		
+		# They are made once, and the bindings field removed on validation still renders
+		bound = list(form)
+		self.assertEqual(names, [field.name for field in bound])
+		self.assertTrue(form[names[0]] is bound[0])
+		bound[0].injected = True
+		self.assertTrue(iter(form).next().injected)
+		
+	def testChoiceCache(self):
+		import types
+		import app_settings
+		from utils.choices import cached_choices, invalidate_choices, get_choice_cache_stats
+		
+		calls = []
+		
+		@cached_choices(ttl=60, max_size=2, key=lambda request: request.GET.get('team'))
+		def colour(request):
+			calls.append(request.GET.get('team'))
+			return [('red', 'Red for %s' % request.GET.get('team'))]
+		
+		def shade():
+			calls.append('shade')
+			return [('dark', 'Dark')]
+		
+		choices_module = types.ModuleType('choices')
+		choices_module.colour, choices_module.shade = colour, shade
+		original, forms.choices_module = forms.choices_module, choices_module
+		app_settings.CHOICES_CACHE['shade'] = {'ttl': 60}
+		
+		try:
+			data_form = DataForm.objects.create(title="Palette", slug="palette")
+			for i, slug in enumerate(['colour', 'shade']):
+				DataFormField.objects.create(data_form=data_form, order=i,
+					field=Field.objects.create(field_type='Select', label=slug, slug=slug))
+			
+			build = lambda team: forms.create_form(rf.get('/', {'team': team}), form="palette")
+			
+			# Each team's choices are made once
+			for team in ['a', 'a', 'b', 'a']:
+				form = build(team)
+			self.assertEqual(['a', 'shade', 'b'], calls)
+			self.assertEqual(form.fields['palette__colour'].choices, [('', '--------'), ('red', 'Red for a')])
+			self.assertEqual({'hits': 2, 'misses': 2, 'size': 2}, get_choice_cache_stats()['colour'])
+			self.assertEqual({'hits': 3, 'misses': 1, 'size': 1}, get_choice_cache_stats()['shade'])
+			
+			# Invalidating, or pushing out the least recently used, makes them again
+			invalidate_choices('colour', 'a')
+			build('a')
+			build('c')
+			build('b')
+			self.assertEqual(['a', 'shade', 'b', 'a', 'c', 'b'], calls)
+			invalidate_choices()
+			build('c')
+			self.assertEqual(['a', 'shade', 'b', 'a', 'c', 'b', 'c', 'shade'], calls)
+		finally:
+			forms.choices_module = original
+			del app_settings.CHOICES_CACHE['shade']
+		
+	def testGetAnswersMany(self):
+		submission = Submission.objects.get(slug="testSubmission")
+		
+		for count in (1, 3):
+			saved = []
+			for i in range(count):
+				form = forms.create_form(rf.post('/form/', TEST_FORM_POST_DATA), form="personal-information", submission="many-%s-%s" % (count, i))
+				form.is_valid()
+				saved.append(form.save().slug)
+			
+			# One query to resolve the slugs and one for all of the answers
+			slugs = saved + ["testSubmission", "does-not-exist"]
+			self.assertNumQueries(2, forms.get_answers_many, slugs)
+		
+		answers = forms.get_answers_many(slugs + [submission], for_form=True)
+		self.assertEqual(answers["does-not-exist"], {})
+		for slug in saved + ["testSubmission"]:
+			self.assertEqual(answers[slug], forms.get_answers(slug, for_form=True))
+		self.assertEqual(answers[saved[0]]['personal-information__languages'], [u'python', u'other'])
+		
+		answers = forms.get_answers_many([submission], fields="biography")
+		self.assertEqual(answers, {"testSubmission": {"biography": u'Blah blah blah\u2600'}})
+		
+	def testExport(self):
+		saved = []
+		for i in range(3):
+			form = forms.create_form(rf.post('/form/', TEST_FORM_POST_DATA), form="personal-information", submission="export-%s" % i)
+			form.is_valid()
+			saved.append(form.save().slug)
+		
+		# Read a submission at a time to make sure chunks are joined up correctly
+		rows = list(csv.reader(export_answers(form="personal-information", format="csv", chunk_size=1)))
+		columns = list(DataFormField.objects.filter(data_form__slug="personal-information").order_by('order', 'id').values_list('field__slug', flat=True))
+		self.assertEqual(rows[0], ['submission', 'last_modified'] + columns)
+		
+		records = [json.loads(line, object_pairs_hook=SortedDict) for line in export_answers(form="personal-information", format="jsonl")]
+		self.assertEqual(len(rows) - 1, len(records))
+		
+		for record in records:
+			self.assertEqual(record.keys(), ['submission', 'last_modified'] + columns)
+			answers = forms.get_answers(record['submission'])
+			for slug in columns:
+				self.assertEqual(record[slug], answers.get(slug))
+		
+		exported = dict((row[0], dict(zip(rows[0], row))) for row in rows[1:])
+		for slug in saved:
+			self.assertEqual(exported[slug]['languages'], 'python,other')
+			self.assertEqual(exported[slug]['biography'], u'Not much to say\u2600'.encode('utf-8'))
+		
+		# Collection columns are named after their form
+		header = export_answers(collection="test-collection").next()
+		self.assertTrue(header.startswith('submission,last_modified,personal-information__'))
+		
 	def testValidation(self):
-		self.assertEquals(True, True)
+		import types
+		from django.forms import ValidationError
+		
+		class ValidatedForm(object):
+			@staticmethod
+			def clean_validated_field_0(self):
+				raise ValidationError('Not this one')
+		
+		validation_module = types.ModuleType('validation')
+		validation_module.ValidatedForm = ValidatedForm
+		original, forms.validation_module = forms.validation_module, validation_module
+		
+		try:
+			create_text_form('validated', 2)
+			form = forms.create_form(rf.post('/form/', {'validated__validated-field-0': 'a', 'validated__validated-field-1': 'b'}), form="validated")
+			
+			# Django finds the clean functions under the field names, with no __getattr__ in between
+			self.assertFalse(hasattr(forms.BaseDataForm, '__getattr__'))
+			self.assertTrue('clean_validated__validated-field-0' in type(form).__dict__)
+			self.assertFalse('clean_validated__validated-field-1' in type(form).__dict__)
+			self.assertFalse(form.is_valid())
+			self.assertEqual({'validated__validated-field-0': ['Not this one']}, form.errors)
+		finally:
+			forms.validation_module = original
+		
+class UnitOfWorkTestCase(TransactionTestCase):
+	
+	def setUp(self):
+		forms.clear_form_cache()
+	
+	def testCollectionSaveIsAtomic(self):
+		section = Section.objects.create(title="Atomic", slug="atomic")
+		collection = Collection.objects.create(title="Atomic", slug="atomic")
+		data = {}
+		for i in range(2):
+			data_form = create_text_form("atomic-%s" % i, 2)
+			CollectionDataForm.objects.create(collection=collection, data_form=data_form, section=section, order=i)
+			data["atomic-%s__atomic-%s-field-0" % (i, i)] = "answer"
+		
+		collection = forms.create_collection(rf.post('/collection/', data), collection="atomic", submission="atomic-submission")
+		self.assertTrue(collection.is_valid())
+		
+		# The second form fails after the first has been saved
+		def fail(*args, **kwargs):
+			raise IOError("Disk full")
+		collection[1]._prepare_answer = fail
+		
+		self.assertRaises(IOError, collection.save)
+		self.assertFalse(Submission.objects.filter(slug="atomic-submission").exists())
+		self.assertFalse(Answer.objects.filter(data_form__slug__startswith="atomic-").exists())
+		
+		# A plain retry saves against a new submission
+		del collection[1]._prepare_answer
+		collection.save()
+		self.assertEqual(4, Answer.objects.filter(submission__slug="atomic-submission").count())
+		
+	def testSaveLeavesCallerTransactionAlone(self):
+		from django.db import transaction
+		
+		data_form = create_text_form("managed", 1)
+		transaction.enter_transaction_management()
+		transaction.managed(True)
+		try:
+			Section.objects.create(title="Managed", slug="managed")
+			form = forms.create_form(rf.post('/form/', {'managed__managed-field-0': 'answer'}), form="managed", submission="managed-submission")
+			self.assertTrue(form.is_valid())
+			form.save()
+			self.assertTrue(transaction.is_dirty())
+			
+			# The caller decides, and rolling back undoes its own work and the save
+			transaction.rollback()
+		finally:
+			transaction.leave_transaction_management()
+		
+		self.assertFalse(Section.objects.filter(slug="managed").exists())
+		self.assertFalse(Answer.objects.filter(data_form=data_form).exists())
@@ -0,0 +1,11 @@
+from django.conf.urls.defaults import *
+
+# The resumable upload views write into the upload storage, so they are kept
+# out of dataforms.urls and only served where a site includes them.
+urlpatterns = patterns('',
+    
+    url(r'^$', 'dataforms.views.upload_start', name="dataforms_upload_start"),
+    url(r'^(?P<upload_id>[0-9a-f]{32})/$', 'dataforms.views.upload_chunk', name="dataforms_upload_chunk"),
+    url(r'^(?P<upload_id>[0-9a-f]{32})/finish/$', 'dataforms.views.upload_finish', name="dataforms_upload_finish"),
+    
+)
\ No newline at end of file
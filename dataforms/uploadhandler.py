@@ -0,0 +1,155 @@
+"""
+Dataforms Upload Handler
+========================
+
+Enforces DATAFORMS_MAX_UPLOAD_SIZE, and the per-field ``max_upload_size``
+argument of upload fields, while the request body is still being read.
+An upload is dropped as soon as it crosses its limit, so an oversized
+file is never completely written to memory or disk.
+
+create_form() installs the handler itself when the request has not been
+parsed yet.  Where something reads request.POST before the view does (the
+CSRF middleware, for example) add it to the settings instead::
+
+    FILE_UPLOAD_HANDLERS = (
+        'dataforms.uploadhandler.DataFormUploadHandler',
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    )
+"""
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.utils import simplejson as json
+from app_settings import MAX_UPLOAD_SIZE, UPLOAD_FIELDS, FIELD_DELIMITER
+
+
+# The Field.arguments key holding a field's own size limit, in bytes
+MAX_UPLOAD_SIZE_ARGUMENT = 'max_upload_size'
+
+
+class DataFormUploadHandler(FileUploadHandler):
+    """
+    Drops any upload that is larger than its limit.  It must come before the
+    handlers that store the file, so that they never see the rest of it.
+
+    The limits of dropped uploads are kept in request.rejected_uploads,
+    keyed on field name, for the form to report.
+    """
+
+    def __init__(self, request=None, max_upload_size=None):
+        super(DataFormUploadHandler, self).__init__(request)
+        self.max_upload_size = MAX_UPLOAD_SIZE if max_upload_size is None else max_upload_size
+        self.rejected = {}
+        self.limit = None
+        self.finished_files = set()
+        if request is not None:
+            request.rejected_uploads = self.rejected
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None):
+        super(DataFormUploadHandler, self).new_file(field_name, file_name, content_type, content_length, charset)
+        self.limit = get_upload_limit(field_name, self.max_upload_size)
+
+        # What the later handlers hold now belongs to earlier, complete uploads
+        # (a handler that doesn't take this file keeps its last one)
+        self.finished_files = set()
+        if self.request is not None:
+            self.finished_files = set(id(getattr(handler, 'file', None)) for handler in self.request.upload_handlers)
+
+        # Don't even start on a file the client says is too large.  The later
+        # handlers haven't been told about it yet, what they hold is the
+        # previous, complete upload, so there is nothing of it to throw away.
+        if content_length is not None and content_length > self.limit:
+            self.rejected[self.field_name] = self.limit
+            raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.limit:
+            self.reject()
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Leave it to the next handler to hand back the file
+        return None
+
+    def reject(self):
+        """
+        Throw away what the other handlers have of the current file, and
+        skip the rest of it.  Only call it once every handler has started
+        on the file, from receive_data_chunk.
+        """
+        self.rejected[self.field_name] = self.limit
+
+        if self.request is not None:
+            for handler in self.request.upload_handlers:
+                upload = getattr(handler, 'file', None)
+                if handler is not self and upload is not None and id(upload) not in self.finished_files:
+                    # Closing a TemporaryUploadedFile deletes it
+                    upload.close()
+                    handler.file = None
+
+        raise SkipFile()
+
+
+def get_upload_limit(field_name, max_upload_size=MAX_UPLOAD_SIZE):
+    """
+    The most bytes an upload to a form field may have: its own
+    max_upload_size argument if it has one, under the global limit.
+
+    :param field_name: a form field name, form-slug__field-slug
+    """
+
+    if FIELD_DELIMITER not in field_name:
+        return max_upload_size
+
+    # Avoid a circular import, the form API imports us
+    from models import DataForm
+    from schema import get_schema
+
+    form_slug, field_slug = field_name.split(FIELD_DELIMITER, 1)
+    try:
+        schema = get_schema(form_slug)
+    except DataForm.DoesNotExist:
+        return max_upload_size
+
+    for field in schema.fields:
+        if field.slug == field_slug and field.field_type in UPLOAD_FIELDS:
+            limit = pop_upload_limit(field.arguments)[0]
+            if limit is not None:
+                return min(limit, max_upload_size)
+            break
+
+    return max_upload_size
+
+
+def pop_upload_limit(arguments):
+    """
+    Split a field's max_upload_size out of its arguments.
+
+    :param arguments: the Field.arguments JSON, or the parsed dictionary
+    :return: a tuple of (limit or None, the remaining arguments as a dictionary)
+    """
+
+    if not isinstance(arguments, dict):
+        arguments = json.loads(str(arguments)) if arguments and arguments.strip() else {}
+
+    arguments = dict(arguments)
+    limit = arguments.pop(MAX_UPLOAD_SIZE_ARGUMENT, None)
+    return (int(limit) if limit is not None else None), arguments
+
+
+def install_upload_handler(request):
+    """
+    Put a DataFormUploadHandler in front of the request's upload handlers,
+    unless the request has already been parsed or has one.
+
+    :return: whether the uploads of this request are size checked
+    """
+
+    handlers = request.upload_handlers
+    if [handler for handler in handlers if isinstance(handler, DataFormUploadHandler)]:
+        return True
+
+    if hasattr(request, '_files'):
+        return False
+
+    request.upload_handlers = [DataFormUploadHandler(request)] + list(handlers)
+    return True
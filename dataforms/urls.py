@@ -5,5 +5,8 @@ urlpatterns = patterns('',
     # dataform urls
     url(r'^build/$', 'dataforms.views.build', name="db_build"),
     url(r'^build/field/(?P<field>[\w]+)/$', 'dataforms.views.get_field'),
+    url(r'^export/form/(?P<form>[-\w]+)\.(?P<format>csv|jsonl)$', 'dataforms.views.export', name="dataforms_export_form"),
+    url(r'^export/collection/(?P<collection>[-\w]+)\.(?P<format>csv|jsonl)$', 'dataforms.views.export', name="dataforms_export_collection"),
+    url(r'^bindings/(?P<form>[-\w]+)/(?P<bindings_hash>[0-9a-f]{32})\.json$', 'dataforms.views.bindings', name="dataforms_bindings"),
     
 )
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+Bulk writes that cost one statement per chunk of rows, rather than one per
+row.  Chunks are sized from the backend's limit on bind parameters.
+
+Usage::
+
+    from dataforms.utils.bulk import bulk_insert, bulk_update, bulk_delete
+
+    bulk_insert(answers, return_ids=True)
+    bulk_update(answers, fields=['value'])
+    bulk_delete(answers)
+
+Nothing is committed here: a write of many chunks is only all or nothing
+inside a transaction, so run these in a UnitOfWork or a transaction you
+manage, or commit afterwards yourself.  The insert_many, update_many and
+delete_many wrappers in dataforms.utils.sql commit once at the end.
+"""
+from django.db import connections, models
+
+
+# The most bind parameters a single statement may use, per backend
+MAX_QUERY_PARAMS = {
+    'sqlite': 999,
+    'oracle': 1000,
+}
+DEFAULT_MAX_QUERY_PARAMS = 10000
+
+
+def max_query_params(con):
+    """
+    The most bind parameters a single statement may use on this connection.
+    """
+    return MAX_QUERY_PARAMS.get(con.vendor, DEFAULT_MAX_QUERY_PARAMS)
+
+
+def chunked(items, size):
+    """
+    Split a list into lists of at most size items.
+    """
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def chunk_size(con, params_per_row, extra_params=0):
+    """
+    How many rows fit in one statement, when each row needs params_per_row
+    bind parameters.
+    """
+    return max(1, (max_query_params(con) - extra_params) // max(1, params_per_row))
+
+
+def sqlite_version_info():
+    from django.db.backends.sqlite3.base import Database
+    return Database.sqlite_version_info
+
+
+def supports_multirow_values(con):
+    """
+    Whether an INSERT can take more than one row in its VALUES clause.
+    """
+    return con.vendor != 'oracle'
+
+
+def supports_returning(con):
+    """
+    Whether INSERT ... RETURNING hands back the new primary keys in the
+    order the rows were given.  SQLite has RETURNING since 3.35, but makes
+    no promise about the order of the returned rows, so it isn't used there.
+    """
+    return con.vendor == 'postgresql'
+
+
+def bulk_insert(objects, using="default", return_ids=False):
+    """Insert a list of Django objects with multi-row VALUES statements.
+    Objects must be of the same Django model. Note that save is not called
+    and signals on the model are not raised.
+
+    Backends without multi-row VALUES (Oracle) get one single-row INSERT
+    run through executemany per chunk instead.
+
+    With return_ids, the objects' primary keys are set from INSERT ...
+    RETURNING where the backend supports it.
+
+    :return: the number of rows inserted"""
+    if not objects:
+        return 0
+
+    con = connections[using]
+    qn = con.ops.quote_name
+
+    meta = objects[0]._meta
+    fields = [f for f in meta.fields if not isinstance(f, models.AutoField)]
+    returning = return_ids and supports_returning(con)
+
+    table = qn(meta.db_table)
+    column_names = ",".join(qn(f.column) for f in fields)
+    placeholders = "(%s)" % ",".join(("%s",) * len(fields))
+    suffix = " returning %s" % qn(meta.pk.column) if returning else ""
+
+    cursor = con.cursor()
+
+    if not supports_multirow_values(con):
+        for chunk in chunked(objects, chunk_size(con, len(fields))):
+            cursor.executemany(
+                "insert into %s (%s) values %s" % (table, column_names, placeholders),
+                [[f.get_db_prep_save(f.pre_save(o, True), connection=con) for f in fields] for o in chunk])
+
+        return len(objects)
+
+    for chunk in chunked(objects, chunk_size(con, len(fields))):
+        parameters = []
+        for o in chunk:
+            parameters.extend(f.get_db_prep_save(f.pre_save(o, True), connection=con) for f in fields)
+
+        cursor.execute(
+            "insert into %s (%s) values %s%s" % (table, column_names,
+                ",".join((placeholders,) * len(chunk)), suffix),
+            parameters)
+
+        if returning:
+            for o, row in zip(chunk, cursor.fetchall()):
+                o.pk = row[0]
+
+    return len(objects)
+
+
+def bulk_update(objects, fields=None, using="default"):
+    """Update a list of Django objects, optionally only overwriting the given
+    fields (as names, e.g. fields=["foo"]). Each chunk of rows is one UPDATE,
+    with a CASE on the primary key per column. Objects must be of the same
+    Django model. Note that save is not called and signals on the model are
+    not raised.
+
+    :return: the number of rows updated"""
+    if not objects:
+        return 0
+
+    con = connections[using]
+    qn = con.ops.quote_name
+
+    names = fields
+    meta = objects[0]._meta
+    fields = [f for f in meta.fields if not isinstance(f, models.AutoField) and (not names or f.name in names)]
+
+    if not fields:
+        raise ValueError("No fields to update, field names are %s." % names)
+
+    table = qn(meta.db_table)
+    pk_column = qn(meta.pk.column)
+    updated = 0
+
+    # Every row needs a (pk, value) pair per field, plus its pk in the IN list
+    cursor = con.cursor()
+    for chunk in chunked(objects, chunk_size(con, 2 * len(fields) + 1)):
+        pks = [meta.pk.get_db_prep_value(o.pk, connection=con) for o in chunk]
+        assignments = []
+        parameters = []
+
+        for f in fields:
+            cases = []
+            for pk, o in zip(pks, chunk):
+                cases.append("when %s then %s")
+                parameters.extend([pk, f.get_db_prep_save(f.pre_save(o, False), connection=con)])
+            assignments.append("%s=case %s %s end" % (qn(f.column), pk_column, " ".join(cases)))
+
+        parameters.extend(pks)
+        cursor.execute(
+            "update %s set %s where %s in (%s)" % (table, ",".join(assignments), pk_column,
+                ",".join(("%s",) * len(chunk))),
+            parameters)
+        updated += cursor.rowcount
+
+    return updated
+
+
+def bulk_delete(objects, table=None, using="default"):
+    """Delete a list of Django objects by primary key, with a chunked
+    IN (...) per statement. Note that delete is not called and signals on
+    the model are not raised.
+
+    :param table: delete from this table instead of the model's own
+    :return: the number of rows deleted"""
+    if not objects:
+        return 0
+
+    con = connections[using]
+    qn = con.ops.quote_name
+
+    meta = objects[0]._meta
+    table = qn(table or meta.db_table)
+    pk_column = qn(meta.pk.column)
+    deleted = 0
+
+    cursor = con.cursor()
+    for chunk in chunked([o.pk for o in objects], chunk_size(con, 1)):
+        cursor.execute(
+            "delete from %s where %s in (%s)" % (table, pk_column, ",".join(("%s",) * len(chunk))),
+            chunk)
+        deleted += cursor.rowcount
+
+    return deleted
@@ -1,12 +1,18 @@
 from django.core.cache import cache as cache_backend
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
+from uuid import uuid4
 
 def cache_set_with_tags(key, value, tags=[], timeout=None):
     for tag in tags:
         tag_list = cache_backend.get(tag)
-        if tag_list:
+        if not tag_list:
+            tag_list = [key]
+        elif key not in tag_list:
             tag_list.append(key)
         else:
-            tag_list = [key]
+            # Already tagged, resetting a key mustn't grow its tags' lists
+            continue
         cache_backend.set(tag, tag_list, timeout)
     cache_backend.set(key, value, timeout)
     
@@ -20,4 +26,57 @@ def cache_delete_by_tags(tags=[]):
         
 cache_backend.set_with_tags = cache_set_with_tags
 cache_backend.cache_delete_by_tags = cache_delete_by_tags
-cache = cache_backend
\ No newline at end of file
+cache = cache_backend
+
+
+# Forms are compiled from their database definition and kept per process.
+# Every definition change replaces the schema generation token, so any
+# process holding a class built under an older token rebuilds it.
+SCHEMA_GENERATION_KEY = 'dataforms:schema-generation'
+_schema_generation = {'local': uuid4().hex}
+
+def get_schema_generation():
+    """
+    Return the current schema generation token.  When DATAFORMS_FORM_CACHE_SHARED
+    is set, the token also lives in the Django cache so that every process sees
+    invalidations made by any other process.
+    """
+    from dataforms.app_settings import FORM_CACHE_SHARED
+
+    if FORM_CACHE_SHARED:
+        shared = cache.get(SCHEMA_GENERATION_KEY)
+        if shared is None:
+            # Missing or expired; a fresh token just forces one extra rebuild.
+            cache.add(SCHEMA_GENERATION_KEY, uuid4().hex)
+            shared = cache.get(SCHEMA_GENERATION_KEY)
+        return '%s:%s' % (_schema_generation['local'], shared)
+    return _schema_generation['local']
+
+def invalidate_schema_cache():
+    """
+    Mark every cached form definition as stale.
+    """
+    from dataforms.app_settings import FORM_CACHE_SHARED
+
+    _schema_generation['local'] = uuid4().hex
+
+    if FORM_CACHE_SHARED:
+        cache.set(SCHEMA_GENERATION_KEY, uuid4().hex)
+
+
+# {% cacheform %} keys forms on their submission's saved version.  Looking
+# that up by slug would cost a query on every render, so it is kept here
+# until the submission is saved again.
+SUBMISSION_VERSION_KEY = 'dataforms:submission-version:%s'
+
+def submission_version_key(slug):
+    """
+    Return the cache key of a submission's saved version, safe for any slug.
+    """
+    return SUBMISSION_VERSION_KEY % md5_constructor(smart_str(slug)).hexdigest()
+
+def clear_submission_versions(slugs):
+    """
+    Forget the saved versions of some submissions, once they have changed.
+    """
+    cache.delete_many([submission_version_key(slug) for slug in slugs])
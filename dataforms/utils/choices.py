@@ -0,0 +1,159 @@
+"""
+Caches the results of the choice functions in the CHOICES_MODULE, which
+are otherwise called every time a form with their field is built.
+
+Caching is opt-in, per function, either with the decorator::
+
+    from dataforms.utils.choices import cached_choices
+
+    @cached_choices(ttl=300, max_size=100, key=lambda request: request.user.pk)
+    def assigned_to(request):
+        return [(user.pk, user.get_full_name()) for user in ...]
+
+or, for functions you'd rather not touch, with DATAFORMS_CHOICES_CACHE::
+
+    DATAFORMS_CHOICES_CACHE = {
+        'country': {'ttl': 3600},
+    }
+
+Choice functions that take an argument are given the current request.
+"""
+from collections import OrderedDict
+from inspect import getargspec
+from threading import Lock
+import time
+
+
+# Every cached choice function, keyed on function name
+_caches = {}
+
+
+class ChoiceCache(object):
+    """
+    The cached results of one choice function: at most max_size results,
+    each kept for ttl seconds, the least recently used dropped first.
+
+    :param key: a function of the request, returning what the choices
+        depend on.  Without one the function has a single result.
+    """
+
+    def __init__(self, func, ttl=300, max_size=100, key=None):
+        self.func = func
+        self.name = func.__name__
+        self.ttl = ttl
+        self.max_size = max_size
+        self.key = key
+        self.takes_request = _takes_request(func)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __call__(self, request=None):
+        key = self.key(request) if self.key else None
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > now:
+                # Put it back as the most recently used
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        choices = tuple(self.func(request) if self.takes_request else self.func())
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, choices)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return choices
+
+    def invalidate(self, key=None):
+        """
+        Forget the result for one key, or every result if no key is given.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+def cached_choices(ttl=300, max_size=100, key=None):
+    """
+    Decorate a choice function to cache its results.  See ChoiceCache.
+    """
+
+    def decorator(func):
+        cache = ChoiceCache(func, ttl=ttl, max_size=max_size, key=key)
+        _caches[cache.name] = cache
+        return cache
+    return decorator
+
+
+def get_choice_provider(func):
+    """
+    The function to call for the choices of func: its cache, if it is
+    decorated or listed in DATAFORMS_CHOICES_CACHE, or func itself.
+    """
+
+    from dataforms.app_settings import CHOICES_CACHE
+
+    if isinstance(func, ChoiceCache):
+        return func
+
+    options = CHOICES_CACHE.get(func.__name__)
+    if options is None:
+        return func
+
+    cache = _caches.get(func.__name__)
+    if cache is None or cache.func is not func:
+        cache = _caches[func.__name__] = ChoiceCache(func, **options)
+    return cache
+
+
+def get_choices(func, request=None):
+    """
+    Call a choice function, with the request if it takes one.
+    """
+
+    provider = get_choice_provider(func)
+    if isinstance(provider, ChoiceCache):
+        return provider(request)
+    return tuple(func(request) if _takes_request(func) else func())
+
+
+def invalidate_choices(name=None, key=None):
+    """
+    Forget cached choices.
+
+    :param name: the name of the choice function, or None for every function
+    :param key: the key (as returned by the function's key) to forget, or None for all of them
+    """
+
+    caches = [_caches.get(name)] if name is not None else _caches.values()
+    for cache in filter(None, caches):
+        cache.invalidate(key)
+
+
+def get_choice_cache_stats():
+    """
+    :return: a dictionary of {'hits', 'misses', 'size'} dictionaries, keyed on choice function name
+    """
+    return dict((name, cache.get_stats()) for name, cache in _caches.items())
+
+
+# Whether each plain choice function takes the request, keyed on function
+_takes_request_cache = {}
+
+def _takes_request(func):
+    takes_request = _takes_request_cache.get(func)
+    if takes_request is None:
+        takes_request = _takes_request_cache[func] = len(getargspec(func).args) > 0
+    return takes_request
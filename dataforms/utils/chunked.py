@@ -0,0 +1,284 @@
+"""
+Resumable uploads, sent a chunk at a time.
+
+A client starts an upload session, sends the file in chunks at increasing
+offsets and then finishes the session, which assembles the chunks into an
+upload saved by handle_upload.  If the connection drops, the client asks
+for the session's offset and carries on from there.
+
+Chunks are kept in the upload storage under FILE_UPLOAD_PATH + 'chunks/<id>/',
+one file per chunk, so they work with any storage and any number of workers.
+"""
+from dataforms.app_settings import FILE_UPLOAD_PATH, MAX_UPLOAD_SIZE, CHUNKED_UPLOAD_SIZE, CHUNKED_UPLOAD_EXPIRY
+from dataforms.utils.file import get_storage, handle_upload, _walk
+from django.core.files.base import ContentFile, File
+from django.utils import simplejson as json
+from django.utils.encoding import smart_str
+import datetime
+import os
+import re
+import uuid
+
+# Upload sessions live under FILE_UPLOAD_PATH in this folder
+CHUNK_FOLDER = 'chunks/'
+
+SESSION_FILE = 'session.json'
+
+# Chunk files are named after the bytes they hold, start-end
+CHUNK_NAME = '%012d-%012d'
+CHUNK_NAME_RE = re.compile(r'^(\d{12})-(\d{12})$')
+SESSION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadError(Exception):
+	"""
+	A chunk or an upload session that can't be accepted.
+	"""
+
+	def __init__(self, message, offset=None):
+		super(ChunkedUploadError, self).__init__(message)
+		self.offset = offset
+
+
+class ChunkedUpload(object):
+	"""
+	An upload session.
+
+	Usage::
+
+		upload = ChunkedUpload.start(name='report.pdf', size=5000000)
+		upload.write_chunk(0, first_chunk)
+		...
+		path = ChunkedUpload.load(upload.id).finish()
+	"""
+
+	class DoesNotExist(Exception):
+		pass
+
+
+	def __init__(self, id, name, size, folder=''):
+		self.id = id
+		self.name = name
+		self.size = size
+		self.folder = folder
+		self.path = os.path.join(FILE_UPLOAD_PATH, CHUNK_FOLDER, id)
+
+
+	@classmethod
+	def start(cls, name, size, folder='', field_name=None):
+		"""
+		Start a new upload session.
+
+		:param name: the file name
+		:param size: the size of the whole file, in bytes
+		:param folder: the folder under FILE_UPLOAD_PATH to save the file in
+		:param field_name: the form field the file is for, to use its upload limit
+		"""
+
+		# Avoid a circular import, the form API imports us
+		from dataforms.uploadhandler import get_upload_limit
+
+		limit = get_upload_limit(field_name) if field_name else MAX_UPLOAD_SIZE
+		if size < 0:
+			raise ChunkedUploadError('The upload size must be given.')
+		if size > limit:
+			raise ChunkedUploadError('Please keep filesize under %s bytes.' % limit)
+
+		upload = cls(uuid.uuid4().hex, os.path.basename(smart_str(name).replace('\\', '/')), size, folder)
+		get_storage().save(os.path.join(upload.path, SESSION_FILE), ContentFile(json.dumps({
+			'name': upload.name,
+			'size': upload.size,
+			'folder': upload.folder,
+		})))
+		return upload
+
+
+	@classmethod
+	def load(cls, id):
+		"""
+		Get an upload session that was started earlier.
+		"""
+
+		if not SESSION_ID_RE.match(id):
+			raise cls.DoesNotExist(id)
+
+		storage = get_storage()
+		session_file = os.path.join(FILE_UPLOAD_PATH, CHUNK_FOLDER, id, SESSION_FILE)
+		if not storage.exists(session_file):
+			raise cls.DoesNotExist(id)
+
+		session = storage.open(session_file)
+		try:
+			meta = json.loads(session.read())
+		finally:
+			session.close()
+
+		return cls(id, smart_str(meta['name']), meta['size'], meta['folder'])
+
+
+	def get_chunks(self):
+		"""
+		The names of the chunk files, in order, that make up the file from
+		its start.  Chunks after a gap are left out.
+		"""
+
+		chunks = []
+		for name in get_storage().listdir(self.path)[1]:
+			match = CHUNK_NAME_RE.match(name)
+			if match:
+				chunks.append((int(match.group(1)), int(match.group(2)), name))
+
+		contiguous = []
+		offset = 0
+		for start, end, name in sorted(chunks):
+			if start == offset:
+				contiguous.append(os.path.join(self.path, name))
+				offset = end
+		return contiguous, offset
+
+
+	@property
+	def offset(self):
+		"""
+		How many bytes of the file have been received.
+		"""
+		return self.get_chunks()[1]
+
+
+	def write_chunk(self, offset, content):
+		"""
+		Save the chunk of the file starting at offset.
+
+		:param content: the chunk, as a string
+		:return: the new offset
+		"""
+
+		current = self.offset
+		if offset != current:
+			raise ChunkedUploadError('Expected the chunk at offset %d.' % current, offset=current)
+		if len(content) > CHUNKED_UPLOAD_SIZE:
+			raise ChunkedUploadError('Chunks must be at most %d bytes.' % CHUNKED_UPLOAD_SIZE, offset=current)
+		if offset + len(content) > self.size:
+			raise ChunkedUploadError('The chunk goes past the end of the file.', offset=current)
+		if not content:
+			return current
+
+		end = offset + len(content)
+		get_storage().save(os.path.join(self.path, CHUNK_NAME % (offset, end)), ContentFile(content))
+		return end
+
+
+	def finish(self):
+		"""
+		Join the chunks into the final upload, and end the session.
+
+		:return: the name of the saved file in the storage
+		"""
+
+		chunks, offset = self.get_chunks()
+		if offset != self.size:
+			raise ChunkedUploadError('Only %d of %d bytes have been received.' % (offset, self.size), offset=offset)
+
+		path = handle_upload({'file': ChunkedFile(chunks, self.name, self.size)}, 'file', self.folder)
+		self.delete()
+		return path
+
+
+	def delete(self):
+		_delete_folder(get_storage(), self.path)
+
+
+class ChunkedFile(File):
+	"""
+	The chunks of an upload read back as one file, a chunk at a time, so
+	that assembling a file needs no more memory than one chunk.
+	"""
+
+	def __init__(self, chunk_names, name, size):
+		super(ChunkedFile, self).__init__(None, name)
+		self.chunk_names = list(chunk_names)
+		self.size = size
+		self._reader = None
+
+
+	def chunks(self, chunk_size=None):
+		storage = get_storage()
+		for name in self.chunk_names:
+			chunk = storage.open(name)
+			try:
+				for data in chunk.chunks(chunk_size):
+					yield data
+			finally:
+				chunk.close()
+
+
+	def multiple_chunks(self, chunk_size=None):
+		return True
+
+
+	def read(self, num_bytes=None):
+		# For storages that read rather than iterate over chunks
+		if self._reader is None:
+			self._reader = self.chunks()
+			self._buffer = ''
+
+		while num_bytes is None or len(self._buffer) < num_bytes:
+			try:
+				self._buffer += self._reader.next()
+			except StopIteration:
+				break
+
+		if num_bytes is None:
+			data, self._buffer = self._buffer, ''
+		else:
+			data, self._buffer = self._buffer[:num_bytes], self._buffer[num_bytes:]
+		return data
+
+
+	def seek(self, position):
+		if position != 0:
+			raise IOError('A ChunkedFile can only seek to its start.')
+		self._reader = None
+
+
+	def close(self):
+		self._reader = None
+
+
+def expire_upload_sessions(max_age=CHUNKED_UPLOAD_EXPIRY, dry_run=False):
+	"""
+	Delete the upload sessions that haven't received a chunk in the last
+	max_age seconds.
+
+	:return: a list of the ids of the deleted sessions
+	"""
+
+	storage = get_storage()
+	chunk_dir = os.path.join(FILE_UPLOAD_PATH, CHUNK_FOLDER)
+	cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+
+	if not storage.exists(chunk_dir):
+		return []
+
+	expired = []
+	for id in storage.listdir(chunk_dir)[0]:
+		path = os.path.join(chunk_dir, id)
+		names = list(_walk(storage, path))
+		if names and max(storage.modified_time(name) for name in names) >= cutoff:
+			continue
+		if not dry_run:
+			_delete_folder(storage, path)
+		expired.append(id)
+
+	return expired
+
+
+def _delete_folder(storage, path):
+	for name in list(_walk(storage, path)):
+		storage.delete(name)
+
+	# Storages have no notion of folders, but the local filesystem leaves them behind
+	try:
+		os.rmdir(storage.path(path))
+	except (NotImplementedError, OSError):
+		pass
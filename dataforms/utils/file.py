@@ -1,9 +1,19 @@
-from dataforms.app_settings import FILE_UPLOAD_PATH
+from dataforms.app_settings import FILE_UPLOAD_PATH, FILE_STORAGE, CONTENT_ADDRESSED_UPLOADS, UPLOAD_GC_GRACE
 from django.conf import settings
-from django.core.files.base import File
+from django.core.files.base import File, ContentFile
+from django.core.files.storage import default_storage, get_storage_class
 from django.utils.encoding import smart_str
 from urllib import unquote
+import datetime
+import hashlib
 import os
+import tempfile
+
+# Content addressed uploads live under FILE_UPLOAD_PATH in this folder
+BLOB_FOLDER = 'blobs/'
+# Remote storages can't touch a file, so an empty marker under this folder
+# (of BLOB_FOLDER) records when a stored blob was last uploaded again
+TOUCHED_FOLDER = 'touched/'
 
 
 class DataFormFile(File):
@@ -18,37 +28,282 @@ class DataFormFile(File):
 
 
 	def _get_url(self):
-		return ''.join([settings.MEDIA_URL, self.path_name])
+		return get_storage().url(self.path_name)
 	url = property(_get_url)
 
 
+class LazyDataFormFile(DataFormFile):
+	"""
+	A DataFormFile for an upload that is already saved, which doesn't touch
+	the storage until it has to.  The name and url need no round trip, size
+	asks the storage for just the size, and the file is only opened when it
+	is read.
+	"""
+
+	def __init__(self, name):
+		self.path_name = name
+		self.name = name.split('/')[-1]
+		self.mode = 'rb'
+		self._file = None
+
+
+	def _get_file(self):
+		if self._file is None:
+			self._file = get_storage().open(self.path_name, self.mode)
+		return self._file
+
+	def _set_file(self, file):
+		self._file = file
+	file = property(_get_file, _set_file)
+
+
+	def _get_size(self):
+		if not hasattr(self, '_size'):
+			self._size = get_storage().size(self.path_name)
+		return self._size
+
+	def _set_size(self, size):
+		self._size = size
+	size = property(_get_size, _set_size)
+
+
+	def _get_closed(self):
+		return self._file is None or self._file.closed
+	closed = property(_get_closed)
+
+
+	def exists(self):
+		return get_storage().exists(self.path_name)
+
+
+	def open(self, mode=None):
+		self.close()
+		self.mode = mode or self.mode
+
+
+	def close(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+
+	def __nonzero__(self):
+		return bool(self.path_name)
+
+
+_storage = {}
+
+def get_storage():
+	"""
+	The storage uploads are kept in: an instance of DATAFORMS_FILE_STORAGE,
+	or Django's default storage.
+	"""
+
+	if 'storage' not in _storage:
+		_storage['storage'] = get_storage_class(FILE_STORAGE)() if FILE_STORAGE else default_storage
+	return _storage['storage']
+
+
+def set_storage(storage):
+	"""
+	Keep uploads in the given Storage instance from now on.  Passing None
+	goes back to DATAFORMS_FILE_STORAGE.
+	"""
+
+	_storage.clear()
+	if storage is not None:
+		_storage['storage'] = storage
+
+
 def handle_upload(files, field_key, folder=''):
 	upload = files[field_key]
 	upload_dir = FILE_UPLOAD_PATH + str(folder)
-	upload_full_path = os.path.join(settings.MEDIA_ROOT, upload_dir)
 
 	# If the upload is of type DataFormFile, then we know
 	# that this is a file that already exists, we don't need to upload anything.
-	if upload.__class__.__name__ == 'DataFormFile':
+	if isinstance(upload, DataFormFile):
+		upload.close()
 		return upload.path_name
 
-	# Make sure the upload path exists, and create it if not.
-	# Raises an OSError if the upload path does not exists
-	if not os.path.exists(upload_full_path):
-		os.makedirs(upload_full_path)
-
+	if CONTENT_ADDRESSED_UPLOADS:
+		return store_by_content(upload)
 
 	# Turn urlencodeded characters into normal characters and wrap
 	# it with smart_str for foreign characters
 	upload.name = smart_str(unquote(upload.name))
 
-	# Append an underscore to the given filename until the name is unique
-	while os.path.exists(os.path.join(upload_full_path, upload.name)):
-		upload.name = '_' + upload.name
+	# The storage streams the upload in chunks, and picks a free name
+	return get_storage().save(os.path.join(upload_dir, upload.name), upload)
+
+
+def store_by_content(upload):
+	"""
+	Save an upload under the SHA-1 of its contents, sharded two levels deep
+	(uploads/blobs/ab/cd/abcd....ext).  The upload is hashed while it is
+	streamed to a temporary file.  On a local filesystem storage the file is
+	then renamed into place, so a half written file is never visible.  If
+	the same content is already stored, the new copy is thrown away and the
+	stored one refreshed (touched locally, through a marker file on remote
+	storages), so the garbage collector keeps it until the answer referring
+	to it is saved.
+
+	:return: the name of the stored file in the storage
+	"""
+
+	storage = get_storage()
+
+	# The temporary file has to be on the same filesystem for the rename to be atomic.
+	# Remote storages have no local path, so the system temp folder will do.
+	try:
+		temp_dir = storage.path(os.path.join(FILE_UPLOAD_PATH, BLOB_FOLDER, 'tmp'))
+		_makedirs(temp_dir)
+	except NotImplementedError:
+		temp_dir = None
+
+	digest = hashlib.sha1()
+	fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+
+	try:
+		with os.fdopen(fd, 'wb') as dest:
+			for chunk in upload.chunks():
+				digest.update(chunk)
+				dest.write(chunk)
+
+		key = digest.hexdigest()
+		extension = os.path.splitext(smart_str(unquote(upload.name)))[1].lower()
+		path = os.path.join(FILE_UPLOAD_PATH, BLOB_FOLDER, key[:2], key[2:4], key + extension)
+
+		if temp_dir:
+			full_path = storage.path(path)
+			try:
+				# Already stored, just refresh it so the garbage collector leaves it alone
+				os.utime(full_path, None)
+			except OSError:
+				_makedirs(os.path.dirname(full_path))
+				# mkstemp makes files only the owner can read
+				os.chmod(temp_path, getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None) or 0644)
+				os.rename(temp_path, full_path)
+				temp_path = None
+		else:
+			# Refresh it before looking, so the garbage collector can't take it in between
+			_touch_blob(storage, path)
+			if not storage.exists(path):
+				with open(temp_path, 'rb') as temp_file:
+					saved = storage.save(path, File(temp_file))
+				# Another worker stored the same content first
+				if saved != path:
+					storage.delete(saved)
+	finally:
+		if temp_path and os.path.exists(temp_path):
+			os.remove(temp_path)
+
+	return path
+
+
+def collect_upload_garbage(grace=UPLOAD_GC_GRACE, dry_run=False):
+	"""
+	Delete content addressed uploads that no answer refers to any more.
+	Files modified (or uploaded again) in the last `grace` seconds are kept,
+	since their answers may not be saved yet.
+
+	:return: a list of the names of the files that were deleted
+	"""
+
+	# Avoid a circular import
+	from dataforms.models import Answer
+	from dataforms.utils.sql import chunked, max_query_params
+	from django.db import connection
+
+	storage = get_storage()
+	blob_dir = os.path.join(FILE_UPLOAD_PATH, BLOB_FOLDER)
+	temp_dir = os.path.join(blob_dir, 'tmp')
+	touched_dir = os.path.join(blob_dir, TOUCHED_FOLDER)
+	cutoff = datetime.datetime.now() - datetime.timedelta(seconds=grace)
+
+	if not storage.exists(blob_dir):
+		return []
+
+	candidates = [name for name in _walk(storage, blob_dir)
+		if not name.startswith(touched_dir) and _last_stored(storage, name) < cutoff]
+
+	# Count the answers referring to each blob.  Abandoned temporary files have none.
+	references = dict((name, 0) for name in candidates if not name.startswith(temp_dir))
+	for chunk in chunked(references.keys(), max_query_params(connection)):
+		for value in Answer.objects.filter(value__in=chunk).values_list('value', flat=True):
+			references[value] += 1
+
+	deleted = []
+	for name in candidates:
+		if references.get(name):
+			continue
+		if not dry_run:
+			# An upload of the same content may have refreshed it since
+			try:
+				if _last_stored(storage, name) >= cutoff:
+					continue
+			except (OSError, IOError):
+				continue
+			storage.delete(name)
+			_delete_if_exists(storage, _touched_name(name))
+		deleted.append(name)
+
+	# Markers left behind by blobs that are gone
+	if not dry_run and storage.exists(touched_dir):
+		for marker in list(_walk(storage, touched_dir)):
+			blob = os.path.join(blob_dir, marker[len(touched_dir):])
+			if not storage.exists(blob) and storage.modified_time(marker) < cutoff:
+				storage.delete(marker)
+
+	return deleted
+
+
+def _touched_name(name):
+	"""
+	The name of the marker recording when a blob was last uploaded again.
+	"""
+	blob_dir = os.path.join(FILE_UPLOAD_PATH, BLOB_FOLDER)
+	return os.path.join(blob_dir, TOUCHED_FOLDER, name[len(blob_dir):])
+
+
+def _touch_blob(storage, name):
+	"""
+	Mark a blob as just uploaded, without saving it again under a new name.
+	"""
+	marker = _touched_name(name)
+	_delete_if_exists(storage, marker)
+	storage.save(marker, ContentFile(''))
+
+
+def _last_stored(storage, name):
+	"""
+	When a blob was last stored: its own modified time, or the time it was
+	last uploaded again, whichever is later.
+	"""
+	modified = storage.modified_time(name)
+	marker = _touched_name(name)
+	if storage.exists(marker):
+		modified = max(modified, storage.modified_time(marker))
+	return modified
+
+
+def _delete_if_exists(storage, name):
+	if storage.exists(name):
+		storage.delete(name)
+
+
+def _walk(storage, path):
+	dirs, files = storage.listdir(path)
+	for name in files:
+		yield os.path.join(path, name)
+	for name in dirs:
+		for child in _walk(storage, os.path.join(path, name)):
+			yield child
 
-	# Write the uploaded file
-	with open(os.path.join(upload_full_path, upload.name), 'wb') as dest:
-		for chunk in upload.chunks():
-			dest.write(chunk)
 
-	return os.path.join(upload_dir, upload.name)
+def _makedirs(path):
+	try:
+		os.makedirs(path)
+	except OSError:
+		# Already there, or another worker made it first
+		if not os.path.isdir(path):
+			raise
@@ -1,6 +1,61 @@
 from collections import defaultdict
 from django.db import connections, models, transaction
-from itertools import groupby
+from bulk import bulk_insert, bulk_update, bulk_delete, chunked, chunk_size, \
+    max_query_params, sqlite_version_info, MAX_QUERY_PARAMS, DEFAULT_MAX_QUERY_PARAMS
+
+# How many rows to read from a cursor at a time
+FETCH_SIZE = 500
+
+
+def iter_grouped(cursor, groupid='id', size=FETCH_SIZE):
+    """
+    Reads a cursor query a chunk of rows at a time, and yields a dictionary
+    per group of consecutive rows sharing the same key, usually the primary
+    key.  This is used primarily when doing left joins to group rows together.
+
+    Where the rows of a group differ on a column, the column's value becomes
+    a list of the distinct values, in the order they were read.  Only one
+    group is held in memory at a time, so the query should be ordered on the
+    group key.
+
+    :arg cursor: a cursor object 'ie - cursor.execute('select *....')
+    :arg groupid: the name of the column to group on
+    :arg size: how many rows to fetch at a time
+    :return: a generator of dictionaries with keys based on the DB's column names
+    """
+
+    columns = [col[0] for col in cursor.description]
+    group_index = columns.index(groupid)
+
+    result = None
+    seen = None
+
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+
+        for row in rows:
+            if result is None or row[group_index] != result[groupid]:
+                if result is not None:
+                    yield result
+                result = dict(zip(columns, row))
+                # The distinct values of the columns that became lists
+                seen = {}
+                continue
+
+            for key, value in zip(columns, row):
+                if key in seen:
+                    if value not in seen[key]:
+                        seen[key].add(value)
+                        result[key].append(value)
+                elif value != result[key]:
+                    seen[key] = set([result[key], value])
+                    result[key] = [result[key], value]
+
+    if result is not None:
+        yield result
+
 
 def query_to_grouped_dict(cursor, groupid='id'):
     """
@@ -13,34 +68,12 @@ def query_to_grouped_dict(cursor, groupid='id'):
     :arg group_key: a int representing the element in the list 'keys' that to group on
     :return: a list of dictionaries with keys based on the DB's column names
         which are grouped where dicts are the same but their values may not be.
+
+    Prefer iter_grouped, which doesn't read the whole result set at once.
     """
     
-    desc = cursor.description
-    cursor_list = [dict(zip([col[0] for col in desc], row)) for row in cursor.fetchall()]
-    compare_list = []
-    
-    results = []
-    compare_list.extend(cursor_list)
-    
-    for index, group in groupby(cursor_list, lambda x: x[groupid]):
-        
-        result_dict = {}
-        
-        for dic in group:
-            if not result_dict:
-                result_dict.update(dic)
-            else:
-                for key, value in dic.iteritems():
-                    if value != result_dict[key]:
-                        if isinstance(result_dict[key], list):
-                            if value not in result_dict[key]:
-                                result_dict[key].append(value)
-                        else:
-                            result_dict[key] = [result_dict[key], value]
-    
-        results.append(result_dict)
+    return list(iter_grouped(cursor, groupid))
 
-    return results
 
 def dictfetchall(cursor): 
     "Returns all rows from a cursor as a dict" 
@@ -51,70 +84,114 @@ def dictfetchall(cursor):
 def insert_many(objects, using="default"):
     """Insert list of Django objects in one SQL query. Objects must be
     of the same Django model. Note that save is not called and signals
-    on the model are not raised."""
-    if not objects:
-        return
-
-    con = connections[using]
-    
-    model = objects[0].__class__
-    fields = [f for f in model._meta.fields if not isinstance(f, models.AutoField)]
-    parameters = []
-    for o in objects:
-        parameters.append(tuple(f.get_db_prep_save(f.pre_save(o, True), connection=con) for f in fields))
+    on the model are not raised.
 
-    table = model._meta.db_table
-    column_names = ",".join(con.ops.quote_name(f.column) for f in fields)
-    placeholders = ",".join(("%s",) * len(fields))
-    con.cursor().executemany(
-        "insert into %s (%s) values (%s)" % (table, column_names, placeholders),
-        parameters)
-    transaction.commit_unless_managed()
+    Kept for backwards compatibility, see bulk.bulk_insert.  Commits
+    once every chunk is written, unless the transaction is managed."""
+    bulk_insert(objects, using=using)
+    transaction.commit_unless_managed(using=using)
 
 
 def update_many(objects, fields=[], using="default"):
     """Update list of Django objects in one SQL query, optionally only
     overwrite the given fields (as names, e.g. fields=["foo"]).
     Objects must be of the same Django model. Note that save is not
-    called and signals on the model are not raised."""
+    called and signals on the model are not raised.
+
+    Kept for backwards compatibility, see bulk.bulk_update.  Commits
+    once every chunk is written, unless the transaction is managed."""
+    bulk_update(objects, fields=fields, using=using)
+    transaction.commit_unless_managed(using=using)
+    
+    
+def delete_many(objects, table=None, using="default"):
+    """Kept for backwards compatibility, see bulk.bulk_delete.  Commits
+    once every chunk is written, unless the transaction is managed."""
+    bulk_delete(objects, table=table, using=using)
+    transaction.commit_unless_managed(using=using)
+
+
+def supports_upsert(con):
+    """
+    Whether the backend can insert-or-update in a single statement.
+    """
+    if con.vendor == 'sqlite':
+        # ON CONFLICT ... DO UPDATE arrived in SQLite 3.24
+        return sqlite_version_info() >= (3, 24, 0)
+    return con.vendor in ('postgresql', 'mysql')
+
+
+def upsert_many(objects, conflict_fields, update_fields, using="default"):
+    """Insert a list of Django objects, updating update_fields on the rows
+    that already exist with the same conflict_fields. The conflict_fields
+    must be covered by a unique constraint. Objects must be of the same
+    Django model. Note that save is not called and signals on the model
+    are not raised.
+
+    Uses INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite and
+    INSERT ... ON DUPLICATE KEY UPDATE on MySQL, one statement per chunk.
+    Other backends read the existing rows and insert or update them.
+
+    Nothing is committed, run it in a UnitOfWork or a managed transaction."""
     if not objects:
         return
 
     con = connections[using]
 
-    names = fields
+    if not supports_upsert(con):
+        return _upsert_many_fallback(objects, conflict_fields, update_fields, using)
+
+    qn = con.ops.quote_name
     meta = objects[0]._meta
-    fields = [f for f in meta.fields if not isinstance(f, models.AutoField) and (not names or f.name in names)]
+    fields = [f for f in meta.fields if not isinstance(f, models.AutoField)]
+    conflict_columns = ",".join(qn(meta.get_field(name).column) for name in conflict_fields)
+    update_columns = [qn(meta.get_field(name).column) for name in update_fields]
 
-    if not fields:
-        raise ValueError("No fields to update, field names are %s." % names)
-    
-    fields_with_pk = fields + [meta.pk]
-    parameters = []
+    if con.vendor == 'mysql':
+        conflict = "on duplicate key update %s" % ",".join(
+            "%s=values(%s)" % (column, column) for column in update_columns)
+    else:
+        conflict = "on conflict (%s) do update set %s" % (conflict_columns, ",".join(
+            "%s=excluded.%s" % (column, column) for column in update_columns))
+
+    table = qn(meta.db_table)
+    column_names = ",".join(qn(f.column) for f in fields)
+    placeholders = "(%s)" % ",".join(("%s",) * len(fields))
+    cursor = con.cursor()
+    for chunk in chunked(objects, chunk_size(con, len(fields))):
+        parameters = []
+        for o in chunk:
+            parameters.extend(f.get_db_prep_save(f.pre_save(o, True), connection=con) for f in fields)
+
+        cursor.execute(
+            "insert into %s (%s) values %s %s" % (table, column_names,
+                ",".join((placeholders,) * len(chunk)), conflict),
+            parameters)
+
+
+def _upsert_many_fallback(objects, conflict_fields, update_fields, using="default"):
+    """Read the primary keys of the rows that already exist, then insert
+    the new objects and update the others."""
+    model = objects[0].__class__
+    attnames = [model._meta.get_field(name).attname for name in conflict_fields]
+
+    # Narrow the read down to the values we have, then match exactly in Python
+    lookup = {}
+    for name, attname in zip(conflict_fields, attnames):
+        lookup['%s__in' % name] = list(set(getattr(o, attname) for o in objects))
+    rows = model._default_manager.using(using).filter(**lookup).values_list('pk', *conflict_fields)
+    existing = dict((tuple(row[1:]), row[0]) for row in rows)
+
+    new_objects = []
+    existing_objects = []
     for o in objects:
-        parameters.append(tuple(f.get_db_prep_save(f.pre_save(o, True), connection=con) for f in fields_with_pk))
-
-    table = meta.db_table
-    assignments = ",".join(("%s=%%s" % con.ops.quote_name(f.column)) for f in fields)
-    con.cursor().executemany(
-        "update %s set %s where %s=%%s" % (table, assignments, con.ops.quote_name(meta.pk.column)),
-        parameters)
-    transaction.commit_unless_managed()
-    
-    
-def delete_many(objects, table=None, using="default"):
-    
-    con = connections[using]
-    
-    fields = [(o.id,) for o in objects]   
-    meta = objects[0]._meta
-    
-    parameters = fields
-    
-    table = table or meta.db_table
-    con.cursor().executemany(
-        "delete from %s where %s=%%s" % (table, con.ops.quote_name(meta.pk.column)),
-        parameters)
-    transaction.commit_unless_managed()
-    
-    
\ No newline at end of file
+        pk = existing.get(tuple(getattr(o, attname) for attname in attnames))
+        if pk is None:
+            new_objects.append(o)
+        else:
+            o.pk = pk
+            existing_objects.append(o)
+
+    bulk_insert(new_objects, using=using)
+    bulk_update(existing_objects, fields=update_fields, using=using)
+
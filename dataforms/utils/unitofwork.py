@@ -0,0 +1,164 @@
+"""
+Collects the answer writes of one or more form saves and writes them
+together, in a single transaction with a single commit.
+
+Usage::
+
+    from dataforms.utils.unitofwork import UnitOfWork
+
+    with UnitOfWork() as uow:
+        for form in forms:
+            form.save(uow=uow)
+
+If anything raises inside the block, nothing is written, and the forms
+get back the submission slug or object they had before.
+
+When the caller already manages the transaction (TransactionMiddleware,
+commit_on_success and the like), the unit of work writes inside a savepoint
+instead, and leaves the commit or rollback of the transaction to the caller.
+"""
+from django.db import transaction
+from cache import clear_submission_versions
+from sql import upsert_many
+
+
+class UnitOfWork(object):
+
+    def __init__(self, using="default"):
+        self.using = using
+        self.answers = []
+        self.choice_deletes = []
+        self.touched_submissions = {}
+        self.touched_slugs = set()
+        self.created_submissions = set()
+        self.originals = []
+
+    def __enter__(self):
+        self.savepoint = None
+        self.originals = []
+        if transaction.is_managed(using=self.using):
+            self.savepoint = transaction.savepoint(using=self.using)
+        else:
+            transaction.enter_transaction_management(using=self.using)
+            transaction.managed(True, using=self.using)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.savepoint is not None:
+            return self._exit_savepoint(exc_type)
+
+        try:
+            if exc_type is None:
+                try:
+                    self.flush()
+                    transaction.commit(using=self.using)
+                except:
+                    transaction.rollback(using=self.using)
+                    self.restore()
+                    raise
+            else:
+                transaction.rollback(using=self.using)
+                self.restore()
+        finally:
+            self.clear()
+            self.originals = []
+            transaction.leave_transaction_management(using=self.using)
+
+    def _exit_savepoint(self, exc_type):
+        """
+        Leave a unit of work nested in a transaction someone else manages.
+        """
+        try:
+            if exc_type is None:
+                try:
+                    self.flush()
+                    transaction.savepoint_commit(self.savepoint, using=self.using)
+                except:
+                    transaction.savepoint_rollback(self.savepoint, using=self.using)
+                    self.restore()
+                    raise
+            else:
+                transaction.savepoint_rollback(self.savepoint, using=self.using)
+                self.restore()
+        finally:
+            self.clear()
+            self.originals = []
+            self.savepoint = None
+
+    def remember(self, obj, name):
+        """
+        Note the value an attribute had before this unit of work changed it,
+        to put it back if the writes are rolled back.  Only the first value
+        of each attribute is kept.
+        """
+        for kept, kept_name, value in self.originals:
+            if kept is obj and kept_name == name:
+                return
+        self.originals.append((obj, name, getattr(obj, name)))
+
+    def restore(self):
+        """
+        Put back the attributes noted by remember(), so that objects don't
+        keep referring to rows that were rolled back.
+        """
+        for obj, name, value in reversed(self.originals):
+            setattr(obj, name, value)
+        self.originals = []
+
+    def add_answers(self, answers):
+        """
+        Queue answers to be inserted, or updated where they already exist.
+        """
+        self.answers.extend(answers)
+
+    def delete_choices(self, submission_id, data_form_id, field_ids):
+        """
+        Queue the removal of the AnswerChoice rows of some fields.
+        """
+        self.choice_deletes.append((submission_id, data_form_id, field_ids))
+
+    def submission_created(self, submission):
+        """
+        Note a submission created in this unit of work, its last_modified
+        is already current.
+        """
+        self.created_submissions.add(submission.pk)
+
+    def touch_submission(self, submission, when):
+        """
+        Queue an update of a submission's last_modified.
+        """
+        if submission.pk not in self.created_submissions:
+            self.touched_submissions[submission.pk] = when
+            self.touched_slugs.add(submission.slug)
+
+    def flush(self):
+        """
+        Write everything queued so far.  Inside the with block this is
+        still part of the one transaction.
+        """
+
+        # Avoid a circular import, models use the sql helpers
+        from dataforms.models import AnswerChoice, Submission
+
+        if self.touched_submissions:
+            Submission.objects.filter(pk__in=self.touched_submissions.keys()).update(
+                last_modified=max(self.touched_submissions.values()))
+            # update() sends no signals, forget their cached versions here
+            clear_submission_versions(self.touched_slugs)
+
+        for submission_id, data_form_id, field_ids in self.choice_deletes:
+            AnswerChoice.objects.delete_for_submission(submission_id, data_form_id, field_ids)
+
+        # Answers are unique per submission, form and field
+        upsert_many(self.answers, conflict_fields=['submission', 'data_form', 'field'],
+                    update_fields=['value'], using=self.using)
+
+        self.clear()
+
+    def clear(self):
+        self.answers = []
+        self.choice_deletes = []
+        self.touched_submissions = {}
+        self.touched_slugs = set()
+        self.created_submissions = set()
@@ -1,10 +1,33 @@
-from django.http import Http404
-from django.shortcuts import render
-from app_settings import FIELD_MAPPINGS, REMOTE_JQUERY_JS, REMOTE_JQUERY_CSS
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse
+from django.utils.functional import wraps
+from django.utils.importlib import import_module
+from django.shortcuts import render, redirect
+from django.utils import simplejson as json
+from django.views.decorators.http import require_GET, require_POST, require_http_methods, condition
+from app_settings import REMOTE_JQUERY_JS, REMOTE_JQUERY_CSS, CHUNKED_UPLOAD_SIZE, BINDINGS_CACHE_TIMEOUT, \
+    UPLOAD_PERMISSION
+from registry import field_types
+from export import export_answers
+from models import DataForm, Collection, Field
+from schema import get_schema
+from utils.chunked import ChunkedUpload, ChunkedUploadError
+from utils.file import get_storage
+
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    # Older Djangos stream any iterator given to HttpResponse
+    from django.http import HttpResponse as StreamingHttpResponse
+
+EXPORT_CONTENT_TYPES = {
+    'csv' : 'text/csv',
+    'jsonl' : 'application/x-ndjson',
+}
 
 def build(request):
     
-    fields = FIELD_MAPPINGS
+    fields = field_types.keys()
     context = {
         'fields' : fields,
         'media_js' : REMOTE_JQUERY_JS,
@@ -17,30 +40,12 @@ def build(request):
 def get_field(request, field):
     
     field_str = field
-    field = FIELD_MAPPINGS.get(field, None)
+    field_type = field_types.get(field, None)
     
-    if not field:
+    if not field_type:
         raise Http404
     
-    # Replace the string arguments with the actual modules or classes
-    for key in ('class', 'widget'):
-        if not field.has_key(key):
-            continue
-        
-        value = field[key]
-        if isinstance(value, str) or isinstance(value, unicode):
-            name = value.split(".")
-            module_name = ".".join(name[:-1])
-            class_name = name[-1]
-            module = __import__(module_name, fromlist=[class_name])
-            # Replace the string with a class pointer
-            field[key] = getattr(module, class_name)
-    
-    field_kwargs={}
-    if field.has_key('widget'):
-        field_kwargs['widget'] = field['widget']()
-    
-    final_field = field['class'](**field_kwargs)
+    final_field = field_type.build()
     rendered_field = final_field.widget.render(field_str, '')
                
     context = {
@@ -49,4 +54,162 @@ def get_field(request, field):
     }
     
     return render(request, 'dataforms/get_field.html', context)
-    
\ No newline at end of file
+
+
+@staff_member_required
+def export(request, format, form=None, collection=None):
+    """
+    Stream every submission to a form or collection as CSV or JSON lines.
+    """
+
+    try:
+        lines = export_answers(form=form, collection=collection, format=format)
+    except (DataForm.DoesNotExist, Collection.DoesNotExist):
+        raise Http404
+
+    response = StreamingHttpResponse(lines, content_type=EXPORT_CONTENT_TYPES[format])
+    response['Content-Disposition'] = 'attachment; filename=%s.%s' % (form or collection, format)
+
+    return response
+
+
+def _get_bindings_schema(form):
+    try:
+        return get_schema(form)
+    except (DataForm.DoesNotExist, Field.DoesNotExist):
+        return None
+
+
+def _bindings_etag(request, form, bindings_hash):
+    schema = _get_bindings_schema(form)
+    return schema.bindings_hash if schema else None
+
+
+@require_GET
+@condition(etag_func=_bindings_etag)
+def bindings(request, form, bindings_hash):
+    """
+    The bindings of a form as JSON.  Their hash is in the url, so browsers
+    can keep them until the bindings change.
+    """
+
+    schema = _get_bindings_schema(form)
+    if schema is None:
+        raise Http404
+
+    if bindings_hash != schema.bindings_hash:
+        # The bindings changed since the page was rendered
+        return redirect('dataforms_bindings', form=form, bindings_hash=schema.bindings_hash)
+
+    response = HttpResponse(schema.bindings_json, content_type='application/json')
+    response['Cache-Control'] = 'public, max-age=%d' % BINDINGS_CACHE_TIMEOUT
+    return response
+
+
+def _json_response(data, status=200):
+    return HttpResponse(json.dumps(data), content_type='application/json', status=status)
+
+
+def _get_upload(upload_id):
+    try:
+        return ChunkedUpload.load(upload_id)
+    except ChunkedUpload.DoesNotExist:
+        raise Http404
+
+
+def _may_upload(request):
+    """
+    Whether the request may use the resumable upload views, as decided by
+    DATAFORMS_UPLOAD_PERMISSION.
+    """
+
+    if UPLOAD_PERMISSION:
+        module_name, function_name = UPLOAD_PERMISSION.rsplit('.', 1)
+        return getattr(import_module(module_name), function_name)(request)
+
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated()
+
+
+def upload_permission_required(view):
+    """
+    Refuse requests DATAFORMS_UPLOAD_PERMISSION doesn't let in with a 403.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _may_upload(request):
+            return _json_response({'error': 'You may not upload files.'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_POST
+@upload_permission_required
+def upload_start(request):
+    """
+    Start a resumable upload.  POST the file's name and size, and the
+    field it is for, if any.
+    """
+
+    try:
+        upload = ChunkedUpload.start(
+            name=request.POST.get('name', ''),
+            size=int(request.POST.get('size', -1)),
+            field_name=request.POST.get('field') or None)
+    except ValueError:
+        return _json_response({'error': 'The upload size must be a number.'}, status=400)
+    except ChunkedUploadError, e:
+        return _json_response({'error': unicode(e)}, status=413)
+
+    return _json_response({'id': upload.id, 'offset': 0, 'chunk_size': CHUNKED_UPLOAD_SIZE})
+
+
+@require_http_methods(['GET', 'POST'])
+@upload_permission_required
+def upload_chunk(request, upload_id):
+    """
+    GET the offset to resume a resumable upload from, or POST the chunk at
+    ?offset= as the raw request body.
+    """
+
+    upload = _get_upload(upload_id)
+
+    if request.method == 'GET':
+        return _json_response({'id': upload.id, 'offset': upload.offset})
+
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        offset = int(request.GET.get('offset', -1))
+    except ValueError:
+        return _json_response({'error': 'The offset must be a number.'}, status=400)
+
+    # Don't read more than one chunk into memory
+    if content_length > CHUNKED_UPLOAD_SIZE:
+        return _json_response({'error': 'Chunks must be at most %d bytes.' % CHUNKED_UPLOAD_SIZE,
+            'offset': upload.offset}, status=413)
+
+    try:
+        offset = upload.write_chunk(offset, request.raw_post_data)
+    except ChunkedUploadError, e:
+        # The client is out of step, tell it where to carry on from
+        return _json_response({'error': unicode(e), 'offset': e.offset}, status=409)
+
+    return _json_response({'id': upload.id, 'offset': offset})
+
+
+@require_POST
+@upload_permission_required
+def upload_finish(request, upload_id):
+    """
+    Assemble a resumable upload once every chunk is in.
+    """
+
+    upload = _get_upload(upload_id)
+
+    try:
+        path = upload.finish()
+    except ChunkedUploadError, e:
+        return _json_response({'error': unicode(e), 'offset': e.offset}, status=409)
+
+    return _json_response({'path': path, 'url': get_storage().url(path)})
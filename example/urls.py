@@ -10,6 +10,8 @@ urlpatterns = patterns('views',
 	url(r'^$', 'index', name="index"),
 	url(r'^collection/$', 'form_collection', name="form_collection"),
 	url(r'^upload/$', 'upload', name="upload"),
+	(r'^dataforms/upload/', include('dataforms.upload_urls')),
+	(r'^dataforms/', include('dataforms.urls')),
 	(r'^admin/', include(admin.site.urls)),
 )
 